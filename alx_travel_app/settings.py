@@ -43,7 +43,9 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['localhost', '127.0.0.1', '[:
 
 if not DEBUG:
     # Security settings for production
-    SECURE_SSL_REDIRECT = True
+    # can be turned off where a proxy in front already redirects to HTTPS,
+    # or for load tests against a local server (bench_payment_servers)
+    SECURE_SSL_REDIRECT = env.bool('SECURE_SSL_REDIRECT', default=True)
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
     SECURE_BROWSER_XSS_FILTER = True
@@ -77,9 +79,12 @@ INSTALLED_APPS = [
 CORS_ALLOW_ALL_ORIGINS = env.bool('CORS_ALLOW_ALL_ORIGINS', default=True)
 
 MIDDLEWARE = [
+    # outermost, so request timings cover every other middleware
+    'listings.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'listings.replicas.ReplicaPinMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'alx_travel_app.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -119,9 +124,91 @@ DATABASES = {
     )
 }
 
+# Read replicas (see listings/replicas.py): comma-separated database
+# URLs, configured as replica1, replica2, ...
+DATABASE_REPLICAS = []
+for number, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica{number}'] = dj_database_url.parse(url, conn_max_age=600)
+    # the test database is replicated by sharing it
+    DATABASES[f'replica{number}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['listings.replicas.PrimaryReplicaRouter']
+# how long a client's reads stay on the primary after it writes; keep it above the replica lag
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=5)
+
+# Django REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'listings.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': env.int('API_PAGE_SIZE', default=20),
+    # bulk endpoints report errors keyed by the index of each failing item
+    'LIST_SERIALIZER_ERRORS_AS_DICT': True,
+    # orjson for JSON bodies; the browsable API renders through it as well
+    'DEFAULT_RENDERER_CLASSES': [
+        'listings.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'listings.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+API_MAX_PAGE_SIZE = env.int('API_MAX_PAGE_SIZE', default=100)
+# Largest list accepted by the listings/bookings bulk endpoints
+BULK_MAX_BATCH_SIZE = env.int('BULK_MAX_BATCH_SIZE', default=1000)
+# Largest radius accepted by the nearby listings search
+NEARBY_MAX_RADIUS_KM = env.float('NEARBY_MAX_RADIUS_KM', default=100.0)
+# Longest date range and most listings one booking calendar request may ask for
+CALENDAR_MAX_DAYS = env.int('CALENDAR_MAX_DAYS', default=366)
+CALENDAR_MAX_LISTINGS = env.int('CALENDAR_MAX_LISTINGS', default=1000)
+
+# Cache: Redis when REDIS_URL is set, otherwise per-process memory
+REDIS_URL = env('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Seconds a cached listing response may live (writes invalidate it sooner)
+LISTING_CACHE_TIMEOUT = env.int('LISTING_CACHE_TIMEOUT', default=300)
+
 # Chapa Payment Gateway Configuration
 CHAPA_SECRET_KEY = env('CHAPA_SECRET_KEY', default='')
 CHAPA_BASE_URL = env('CHAPA_BASE_URL', default='https://api.chapa.co/v1')
+# Gateway client tuning: per-process connection pool, verify retries and circuit breaker
+CHAPA_TIMEOUT = env.float('CHAPA_TIMEOUT', default=15.0)
+CHAPA_POOL_SIZE = env.int('CHAPA_POOL_SIZE', default=10)
+CHAPA_MAX_RETRIES = env.int('CHAPA_MAX_RETRIES', default=3)
+CHAPA_BREAKER_THRESHOLD = env.int('CHAPA_BREAKER_THRESHOLD', default=5)
+CHAPA_BREAKER_RESET_TIMEOUT = env.float('CHAPA_BREAKER_RESET_TIMEOUT', default=30.0)
+# Run initialize/verify gateway calls in Celery and answer 202 immediately
+CHAPA_ASYNC = env.bool('CHAPA_ASYNC', default=False)
+# Upper bound (seconds) for long-polling the payment status endpoint under ASGI
+CHAPA_STATUS_MAX_WAIT = env.float('CHAPA_STATUS_MAX_WAIT', default=10.0)
+# The same bound for the sync view, where every waiting client holds a worker
+CHAPA_STATUS_SYNC_MAX_WAIT = env.float('CHAPA_STATUS_SYNC_MAX_WAIT', default=1.0)
+# Serve the payment endpoints with async views; only worth it under an ASGI server, e.g.
+#   uvicorn alx_travel_app.asgi:application --workers 4
+ASGI_PAYMENT_VIEWS = env.bool('ASGI_PAYMENT_VIEWS', default=False)
+# Connections each ASGI worker's async gateway client may hold open
+CHAPA_ASYNC_POOL_SIZE = env.int('CHAPA_ASYNC_POOL_SIZE', default=100)
+
+# Request instrumentation (see listings/metrics.py)
+# Requests at least this slow are logged with their slowest queries
+SLOW_REQUEST_MS = env.float('SLOW_REQUEST_MS', default=500.0)
+# Recent requests per route kept for the p50/p95/p99 gauges
+METRICS_WINDOW = env.int('METRICS_WINDOW', default=1000)
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+# Bearer token for Prometheus scrapes of /api/metrics/ (staff users can always read it)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
 
 
 # Password validation
@@ -172,6 +259,74 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-pending-payments': {
+        'task': 'listings.tasks.reconcile_pending_payments',
+        'schedule': env.float('PAYMENT_RECONCILE_INTERVAL', default=600.0),
+    },
+    'prune-webhook-events': {
+        'task': 'listings.tasks.prune_webhook_events',
+        'schedule': env.float('WEBHOOK_PRUNE_INTERVAL', default=3600.0),
+    },
+}
+# email drains get their own worker: celery -A alx_travel_app worker -Q email --concurrency 1
+CELERY_TASK_ROUTES = {
+    'listings.tasks.drain_email_queue': {'queue': 'email'},
+}
+
+# Email
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = env('EMAIL_HOST', default='localhost')
+EMAIL_PORT = env.int('EMAIL_PORT', default=25)
+EMAIL_USE_TLS = env.bool('EMAIL_USE_TLS', default=False)
+EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
+EMAIL_TIMEOUT = env.float('EMAIL_TIMEOUT', default=30.0)
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+# Outgoing email queues (see listings/mail.py): messages per second and
+# the most one drain sends over a single SMTP connection
+EMAIL_QUEUES = {
+    'transactional': {
+        'rate': env.float('EMAIL_TRANSACTIONAL_RATE', default=10.0),
+        'batch_size': env.int('EMAIL_TRANSACTIONAL_BATCH_SIZE', default=100),
+    },
+}
+# how long a newly queued message waits for others to share its drain
+EMAIL_BATCH_WINDOW = env.float('EMAIL_BATCH_WINDOW', default=2.0)
+EMAIL_MAX_ATTEMPTS = env.int('EMAIL_MAX_ATTEMPTS', default=5)
+EMAIL_RETRY_BACKOFF = env.float('EMAIL_RETRY_BACKOFF', default=30.0)
+EMAIL_RETRY_MAX_DELAY = env.float('EMAIL_RETRY_MAX_DELAY', default=3600.0)
+# beat sweep that sends messages whose retry has come due
+CELERY_BEAT_SCHEDULE.update({
+    f'drain-email-{name}': {
+        'task': 'listings.tasks.drain_email_queue',
+        'schedule': env.float('EMAIL_RETRY_SWEEP_INTERVAL', default=60.0),
+        'args': (name,),
+    }
+    for name in EMAIL_QUEUES
+})
+
+# Payment event outbox (see listings/outbox.py), relayed to Celery by
+# manage.py relay_outbox. Events go to OUTBOX_PARTITIONS queues named
+# payment-events.<n> by booking reference; give each queue one worker with
+# --concurrency 1 to keep each booking's events in order.
+OUTBOX_PARTITIONS = env.int('OUTBOX_PARTITIONS', default=1)
+OUTBOX_RELAY_BATCH_SIZE = env.int('OUTBOX_RELAY_BATCH_SIZE', default=500)
+# how long the relay sleeps when it finds nothing to publish
+OUTBOX_RELAY_INTERVAL = env.float('OUTBOX_RELAY_INTERVAL', default=0.5)
+# published events are deleted after this many hours
+OUTBOX_RETENTION_HOURS = env.int('OUTBOX_RETENTION_HOURS', default=72)
+# the window the relay lag and throughput metrics cover
+OUTBOX_METRICS_WINDOW = env.int('OUTBOX_METRICS_WINDOW', default=300)
+
+# Pending payment reconciliation (see listings/reconciliation.py)
+PAYMENT_RECONCILE_AFTER_MINUTES = env.int('PAYMENT_RECONCILE_AFTER_MINUTES', default=15)
+PAYMENT_RECONCILE_CHUNK_SIZE = env.int('PAYMENT_RECONCILE_CHUNK_SIZE', default=200)
+PAYMENT_RECONCILE_CONCURRENCY = env.int('PAYMENT_RECONCILE_CONCURRENCY', default=8)
+
+# Chapa webhook deliveries are kept this long to reject replays (see listings/webhooks.py)
+WEBHOOK_EVENT_RETENTION_HOURS = env.int('WEBHOOK_EVENT_RETENTION_HOURS', default=168)
 
 # Swagger Configuration
 SWAGGER_SETTINGS = {
@@ -188,3 +343,6 @@ SWAGGER_SETTINGS = {
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# User uploads (listing images and their resized variants)
+MEDIA_URL = env('MEDIA_URL', default='/media/')
+MEDIA_ROOT = env('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
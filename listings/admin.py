@@ -1,14 +1,15 @@
 from django.contrib import admin
-from .models import Listing, Review, Booking, Payment
+from . import payment_links, search
+from .models import Listing, Review, Booking, Payment, OutgoingEmail, OutboxEvent
 
 # Register your models here.
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
-    list_display = ('title', 'city', 'state', 'price', 'property_type', 'bedrooms', 'bathrooms', 'created_at')
+    list_display = ('title', 'city', 'state', 'price', 'property_type', 'bedrooms', 'bathrooms', 'rating_avg', 'created_at')
     list_filter = ('property_type', 'city', 'state', 'created_at')
     search_fields = ('title', 'description', 'address', 'city', 'state')
-    readonly_fields = ('property_id', 'created_at', 'updated_at')
+    readonly_fields = ('property_id', 'review_count', 'rating_sum', 'rating_avg', 'created_at', 'updated_at')
     ordering = ('-created_at',)
     
     fieldsets = (
@@ -16,31 +17,59 @@ class ListingAdmin(admin.ModelAdmin):
             'fields': ('property_id', 'title', 'description', 'listing_image', 'host_id')
         }),
         ('Location', {
-            'fields': ('address', 'city', 'state')
+            'fields': ('address', 'city', 'state', 'latitude', 'longitude')
         }),
         ('Property Details', {
             'fields': ('property_type', 'bedrooms', 'bathrooms', 'price', 'pricetag')
         }),
+        ('Ratings', {
+            'fields': ('review_count', 'rating_sum', 'rating_avg')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # served by the full-text index instead of icontains over five columns
+        if not search.parse_terms(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return search.search_listings(queryset, search_term), False
+
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('review_id', 'property_id', 'user_id', 'rating', 'created_at')
+    # property_id/user_id columns render the related objects' __str__
+    list_select_related = ('property_id', 'user_id')
     list_filter = ('rating', 'created_at')
     search_fields = ('comment', 'user_id__username', 'property_id__title')
     readonly_fields = ('review_id', 'created_at')
     ordering = ('-created_at',)
 
 
+class PaidFilter(admin.SimpleListFilter):
+    title = 'paid'
+    parameter_name = 'paid'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'), ('no', 'No'))
+
+    def queryset(self, request, queryset):
+        # an anti-join on payment_booking_status_idx rather than matching booking_reference text
+        if self.value() == 'yes':
+            return queryset.filter(payment_links.is_paid())
+        if self.value() == 'no':
+            return payment_links.unpaid_bookings(queryset)
+        return queryset
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('booking_id', 'property_id', 'user_id', 'start_date', 'end_date', 'total_price', 'created_at')
-    list_filter = ('start_date', 'end_date', 'created_at')
+    list_select_related = ('property_id', 'user_id')
+    list_filter = (PaidFilter, 'start_date', 'end_date', 'created_at')
     search_fields = ('user_id__username', 'property_id__title')
     readonly_fields = ('booking_id', 'created_at')
     ordering = ('-created_at',)
@@ -49,15 +78,18 @@ class BookingAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ('booking_reference', 'amount', 'currency', 'status', 'chapa_tx_ref', 'created_at')
+    list_display = ('booking_reference', 'booking_id', 'amount', 'currency', 'status', 'chapa_tx_ref', 'created_at')
+    # the booking column renders Booking.__str__, which reads its user and listing
+    list_select_related = ('booking_id__user_id', 'booking_id__property_id')
     list_filter = ('status', 'currency', 'created_at')
     search_fields = ('booking_reference', 'chapa_tx_id', 'chapa_tx_ref')
     readonly_fields = ('chapa_tx_id', 'chapa_tx_ref', 'created_at', 'updated_at')
+    raw_id_fields = ('booking_id',)
     ordering = ('-created_at',)
     
     fieldsets = (
         ('Booking Information', {
-            'fields': ('booking_reference', 'amount', 'currency')
+            'fields': ('booking_reference', 'booking_id', 'amount', 'currency')
         }),
         ('Chapa Transaction', {
             'fields': ('chapa_tx_id', 'chapa_tx_ref', 'status')
@@ -72,3 +104,20 @@ class PaymentAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'template', 'queue', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('queue', 'status', 'template')
+    search_fields = ('to',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'key', 'created_at', 'published_at', 'handled_at')
+    list_filter = ('event_type',)
+    search_fields = ('key',)
+    readonly_fields = ('key', 'event_type', 'payload', 'created_at', 'published_at', 'handled_at')
+    ordering = ('-id',)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from . import metrics, signals  # noqa: F401
+
+        post_migrate.connect(signals.ensure_search_index, sender=self)
+        connection_created.connect(metrics.install_query_timer, dispatch_uid="listings.metrics.query_timer")
@@ -0,0 +1,136 @@
+"""
+Read-through response cache for the listing endpoints.
+
+Cache keys embed a generation counter per data scope ("listings",
+"bookings"). Writes bump the generation (see listings.signals), which
+orphans every entry built from the old data in O(1); orphans simply
+expire. Entries carry an ETag so a conditional GET that matches is
+answered with 304 straight from the cache.
+"""
+import hashlib
+import json
+import time
+
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import renderers, replicas
+
+KEY_PREFIX = "listings-api"
+
+
+def _generation_key(scope):
+    return f"{KEY_PREFIX}:generation:{scope}"
+
+
+def generation(scope):
+    key = _generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        # seed from the clock so an evicted counter never restarts at an old value
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _written_key(scope):
+    return f"{KEY_PREFIX}:written:{scope}"
+
+
+def invalidate(scope):
+    key = _generation_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+    if settings.DATABASE_REPLICAS:
+        cache.set(_written_key(scope), time.time(), timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def written_recently(scopes):
+    """Whether any of the scopes changed within REPLICA_PIN_SECONDS, i.e. the replicas may not have it yet."""
+    return bool(cache.get_many([_written_key(scope) for scope in scopes]))
+
+
+def invalidate_on_commit(scope):
+    """
+    Bump now so this request never reads stale data, and again once the
+    write commits so an entry rebuilt from pre-commit data is orphaned too.
+    """
+    invalidate(scope)
+    transaction.on_commit(lambda: invalidate(scope))
+
+
+def response_cache_key(request, scopes):
+    generations = [generation(scope) for scope in scopes]
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    raw = json.dumps([request.path, params, request.accepted_renderer.format, generations])
+    return f"{KEY_PREFIX}:response:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def etag_for(data):
+    body = renderers.dumps(data, orjson.OPT_SORT_KEYS)
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+class CachedResponseMixin:
+    """
+    Viewset mixin serving list/retrieve (and any action listed in
+    cached_actions) from the cache. cache_scopes maps an action to the data
+    scopes its response depends on.
+    """
+
+    cached_actions = ("list", "retrieve")
+    cache_scopes = {}
+    default_cache_scopes = ("listings",)
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_cached(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_cached(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_cache_status", None):
+            response["X-Cache"] = self._cache_status
+        return response
+
+    def dispatch_cached(self, request, build):
+        if request.method != "GET" or self.action not in self.cached_actions:
+            return build()
+
+        scopes = self.cache_scopes.get(self.action, self.default_cache_scopes)
+        key = response_cache_key(request, scopes)
+        entry = cache.get(key)
+        if entry is None:
+            self._cache_status = "MISS"
+            if replicas.reading_from_replicas() and written_recently(scopes):
+                # a replica may predate the write that bumped the generation
+                with replicas.replica_reads(False):
+                    response = build()
+            else:
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {"etag": etag_for(response.data), "data": response.data}
+            cache.set(key, entry, settings.LISTING_CACHE_TIMEOUT)
+        else:
+            self._cache_status = "HIT"
+            response = Response(entry["data"])
+
+        if etag_matches(request, entry["etag"]):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = entry["etag"]
+        return response
@@ -0,0 +1,404 @@
+"""
+Chapa gateway client shared by the payment views and the Celery tasks.
+
+Every process keeps one pooled keep-alive requests.Session, so repeated
+payment calls reuse TCP/TLS connections. Idempotent verify calls are
+retried with jittered exponential backoff, a circuit breaker fails fast
+while Chapa is degraded, and per-endpoint latency histograms are kept in
+memory for the metrics endpoint.
+
+AsyncChapaClient applies the same rules on top of a pooled
+httpx.AsyncClient, for the async payment views served over ASGI.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import outbox
+from .metrics import LatencyHistogram, record_gateway_time
+from .models import Payment
+
+
+class ChapaUnavailable(requests.RequestException):
+    """Raised without calling Chapa while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures, rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open)
+    to decide whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a call that says nothing about Chapa's health, freeing the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+# endpoint name -> LatencyHistogram, shared by every client in the process
+latency_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record_latency(endpoint, seconds):
+    with _histograms_lock:
+        histogram = latency_histograms.setdefault(endpoint, LatencyHistogram())
+    histogram.observe(seconds)
+    record_gateway_time(seconds)
+
+
+def latency_snapshot():
+    with _histograms_lock:
+        items = list(latency_histograms.items())
+    return {endpoint: histogram.snapshot() for endpoint, histogram in items}
+
+
+class ChapaClient:
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, secret_key, timeout=15, pool_size=10, max_retries=3,
+                 backoff_base=0.2, backoff_cap=2.0, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.secret_key = secret_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {secret_key}",
+            "Content-Type": "application/json"
+        })
+
+    def initialize(self, payload):
+        # initialize is not idempotent on Chapa's side, so it is never retried
+        return self._request("initialize", "POST", "transaction/initialize", retries=0, json=payload)
+
+    def verify(self, reference):
+        # Note: some Chapa docs use /transaction/verify?tx_ref= or path-based; check your docs.
+        return self._request("verify", "GET", f"transaction/verify/{reference}", retries=self.max_retries)
+
+    def backoff(self, attempt):
+        # "full jitter": spread retries from many workers instead of synchronising them
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _request(self, endpoint, method, path, retries, **kwargs):
+        url = f"{self.base_url}/{path}"
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ChapaUnavailable(f"Chapa circuit breaker is open, not calling {endpoint}")
+
+            started = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_latency(endpoint, time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                # e.g. InvalidURL or TooManyRedirects: not retried, but a
+                # half-open trial must not stay claimed and keep the breaker open
+                self.breaker.release()
+                raise
+            else:
+                record_latency(endpoint, time.perf_counter() - started)
+                if resp.status_code in self.RETRY_STATUSES:
+                    self.breaker.record_failure()
+                    error = requests.HTTPError(f"{resp.status_code} from Chapa {endpoint}", response=resp)
+                else:
+                    # 4xx are our mistakes, not a sign that Chapa is unhealthy
+                    self.breaker.record_success()
+                    resp.raise_for_status()
+                    return resp.json()
+
+            if attempt >= retries:
+                raise error
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+class AsyncChapaClient:
+    """
+    asyncio counterpart of ChapaClient. One event loop can keep hundreds of
+    gateway calls in flight over the pooled connections. Gateway errors
+    surface as the same requests exceptions, so callers handle both
+    clients alike.
+    """
+
+    RETRY_STATUSES = ChapaClient.RETRY_STATUSES
+    backoff = ChapaClient.backoff
+
+    def __init__(self, base_url, secret_key, timeout=15, pool_size=100, max_retries=3,
+                 backoff_base=0.2, backoff_cap=2.0, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        headers = {"Content-Type": "application/json"}
+        # httpx rejects the malformed "Bearer " header that an unset key would produce
+        if secret_key:
+            headers["Authorization"] = f"Bearer {secret_key}"
+        self.session = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers=headers,
+        )
+
+    async def initialize(self, payload):
+        return await self._request("initialize", "POST", "transaction/initialize", retries=0, json=payload)
+
+    async def verify(self, reference):
+        return await self._request("verify", "GET", f"transaction/verify/{reference}", retries=self.max_retries)
+
+    async def _request(self, endpoint, method, path, retries, **kwargs):
+        url = f"{self.base_url}/{path}"
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ChapaUnavailable(f"Chapa circuit breaker is open, not calling {endpoint}")
+
+            started = time.perf_counter()
+            try:
+                resp = await self.session.request(method, url, **kwargs)
+            except httpx.TimeoutException as e:
+                record_latency(endpoint, time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = requests.Timeout(str(e) or f"Chapa {endpoint} timed out")
+            except httpx.TransportError as e:
+                record_latency(endpoint, time.perf_counter() - started)
+                self.breaker.record_failure()
+                error = requests.ConnectionError(str(e) or f"could not reach Chapa {endpoint}")
+            except BaseException:
+                # e.g. TooManyRedirects, or CancelledError when the ASGI client
+                # disconnects: a half-open trial must not stay claimed
+                self.breaker.release()
+                raise
+            else:
+                record_latency(endpoint, time.perf_counter() - started)
+                if resp.status_code in self.RETRY_STATUSES:
+                    self.breaker.record_failure()
+                    error = requests.HTTPError(f"{resp.status_code} from Chapa {endpoint}")
+                else:
+                    self.breaker.record_success()
+                    if resp.is_error:
+                        raise requests.HTTPError(f"{resp.status_code} from Chapa {endpoint}")
+                    return resp.json()
+
+            if attempt >= retries:
+                raise error
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide client. Rebuilt after a fork (gunicorn/celery prefork)
+    so children never share the parent's pooled sockets.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = ChapaClient(
+                settings.CHAPA_BASE_URL,
+                settings.CHAPA_SECRET_KEY,
+                timeout=settings.CHAPA_TIMEOUT,
+                pool_size=settings.CHAPA_POOL_SIZE,
+                max_retries=settings.CHAPA_MAX_RETRIES,
+                breaker=CircuitBreaker(settings.CHAPA_BREAKER_THRESHOLD, settings.CHAPA_BREAKER_RESET_TIMEOUT),
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+# event loop -> AsyncChapaClient; httpx connections can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """The client for the running event loop (one per ASGI worker process)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncChapaClient(
+            settings.CHAPA_BASE_URL,
+            settings.CHAPA_SECRET_KEY,
+            timeout=settings.CHAPA_TIMEOUT,
+            pool_size=settings.CHAPA_ASYNC_POOL_SIZE,
+            max_retries=settings.CHAPA_MAX_RETRIES,
+            breaker=CircuitBreaker(settings.CHAPA_BREAKER_THRESHOLD, settings.CHAPA_BREAKER_RESET_TIMEOUT),
+        )
+    return client
+
+
+def reset_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+    # their loops may be gone, so just drop them; pooled sockets close with the loop
+    _async_clients.clear()
+
+
+def checkout_url_from(chapa_resp):
+    # typical chapa initialize response contains data and checkout_url
+    data = (chapa_resp or {}).get("data") or {}
+    return data.get("checkout_url") or data.get("authorization_url") or data.get("payment_url")
+
+
+def record_initialize_failure(payment, error):
+    payment.status = Payment.STATUS_FAILED
+    payment.metadata = {"error": str(error)}
+
+
+def record_initialize_response(payment, chapa_resp):
+    data = chapa_resp.get("data") or {}
+
+    # store chapa transaction id if present (many responses include 'id' or 'transaction_id')
+    chapa_tx_id = data.get("id") or data.get("transaction_id")
+    if chapa_tx_id:
+        payment.chapa_tx_id = chapa_tx_id
+    payment.metadata = chapa_resp
+
+
+def initialize_payment(payment, payload):
+    """
+    Call Chapa's initialize endpoint for payment and record the outcome.
+    Returns the Chapa response; on a gateway error the payment is marked
+    failed and the requests exception is re-raised.
+    """
+    try:
+        chapa_resp = get_client().initialize(payload)
+    except requests.RequestException as e:
+        # update payment as failed and return error
+        previous_status = payment.status
+        record_initialize_failure(payment, e)
+        outbox.save_status_change(payment, previous_status, ["status", "metadata"])
+        raise
+
+    record_initialize_response(payment, chapa_resp)
+    payment.save()
+    return chapa_resp
+
+
+async def ainitialize_payment(payment, payload):
+    """initialize_payment() for async views."""
+    try:
+        chapa_resp = await get_async_client().initialize(payload)
+    except requests.RequestException as e:
+        previous_status = payment.status
+        record_initialize_failure(payment, e)
+        await sync_to_async(outbox.save_status_change)(payment, previous_status, ["status", "metadata"])
+        raise
+
+    record_initialize_response(payment, chapa_resp)
+    await payment.asave()
+    return chapa_resp
+
+
+def verify_transaction(reference):
+    """
+    Fetch the transaction status for a tx_ref or Chapa transaction id.
+    Raises requests.RequestException on gateway errors.
+    """
+    return get_client().verify(reference)
+
+
+async def averify_transaction(reference):
+    return await get_async_client().verify(reference)
+
+
+def status_from_verify_response(chapa_resp, current_status=None):
+    """Map a verify response onto one of the Payment statuses."""
+    # typical success: chapa_resp['status'] or chapa_resp['data']['status'] etc.
+    data = chapa_resp.get("data") or {}
+    payment_status = data.get("status") or chapa_resp.get("status") or None
+
+    if payment_status and payment_status.lower() == "success":
+        return Payment.STATUS_COMPLETED
+    if payment_status and payment_status.lower() in ("failed", "cancelled"):
+        return Payment.STATUS_FAILED
+    # if uncertain, keep pending but record response
+    return current_status or Payment.STATUS_PENDING
+
+
+def apply_verify_response(payment, chapa_resp):
+    """
+    Store a verify response on payment if its row is still Pending, and
+    reload payment otherwise. Like the webhook, the write is a conditional
+    UPDATE, so a verify that raced a webhook (or another verify) can't move
+    a settled payment back. Returns whether the row was written.
+    """
+    payment.status = status_from_verify_response(chapa_resp, Payment.STATUS_PENDING)
+    payment.metadata = chapa_resp
+    return outbox.save_status_change(payment, Payment.STATUS_PENDING, ["status", "metadata"])
+
+
+async def aapply_verify_response(payment, chapa_resp):
+    return await sync_to_async(apply_verify_response)(payment, chapa_resp)
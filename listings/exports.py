@@ -0,0 +1,168 @@
+"""
+Streaming CSV/NDJSON exports of bookings and payments for finance.
+
+Rows come off a server-side cursor (QuerySet.iterator) as plain tuples and
+are encoded into ~64KB blocks as they arrive, optionally gzipped on the
+fly, so an export holds one cursor chunk and one block in memory however
+many rows it covers, and the first bytes leave before the query finishes.
+Used by ExportView and the export_records management command.
+
+Under ASGI, Django buffers a StreamingHttpResponse over a sync iterator
+into a list before sending it, so ExportView serves aexport_blocks()
+there instead: the same blocks, each produced in the sync thread and
+sent as soon as it is ready.
+"""
+import csv
+import zlib
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Booking, Payment
+
+CHUNK_SIZE = 2000
+BLOCK_BYTES = 64 * 1024
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# kind -> model and (column header, ORM path) pairs, in output order
+EXPORTS = {
+    "bookings": {
+        "model": Booking,
+        "columns": [
+            ("booking_id", "booking_id"),
+            ("listing_id", "property_id_id"),
+            ("listing_title", "property_id__title"),
+            ("user_id", "user_id_id"),
+            ("username", "user_id__username"),
+            ("start_date", "start_date"),
+            ("end_date", "end_date"),
+            ("total_price", "total_price"),
+            ("created_at", "created_at"),
+        ],
+        "statuses": (),
+    },
+    "payments": {
+        "model": Payment,
+        "columns": [
+            ("id", "id"),
+            ("booking_reference", "booking_reference"),
+            ("booking_id", "booking_id_id"),
+            ("listing_id", "booking_id__property_id_id"),
+            ("amount", "amount"),
+            ("currency", "currency"),
+            ("status", "status"),
+            ("chapa_tx_ref", "chapa_tx_ref"),
+            ("chapa_tx_id", "chapa_tx_id"),
+            ("created_at", "created_at"),
+            ("updated_at", "updated_at"),
+        ],
+        "statuses": tuple(value for value, _label in Payment.STATUS_CHOICES),
+    },
+}
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+
+
+def export_rows(kind, since=None, until=None, status=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream value tuples for kind created in [since, until) (dates, either
+    optional), oldest first. The (created_at, pk) indexes serve the order.
+    """
+    spec = EXPORTS[kind]
+    queryset = spec["model"].objects.all()
+    if since:
+        queryset = queryset.filter(created_at__gte=day_start(since))
+    if until:
+        queryset = queryset.filter(created_at__lt=day_start(until))
+    if status:
+        queryset = queryset.filter(status=status)
+    paths = [path for _header, path in spec["columns"]]
+    return queryset.order_by("created_at", "pk").values_list(*paths).iterator(chunk_size=chunk_size)
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that just collects what it is given."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+
+def csv_blocks(headers, rows):
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    # the header goes out on its own, before the query has produced a row
+    yield buffer.parts.pop().encode()
+    size = 0
+    for row in rows:
+        writer.writerow(row)
+        size += len(buffer.parts[-1])
+        if size >= BLOCK_BYTES:
+            yield "".join(buffer.parts).encode()
+            buffer.parts.clear()
+            size = 0
+    if buffer.parts:
+        yield "".join(buffer.parts).encode()
+
+
+def ndjson_blocks(headers, rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    parts = []
+    size = 0
+    for row in rows:
+        line = encoder.encode(dict(zip(headers, row)))
+        parts.append(line)
+        size += len(line) + 1
+        if size >= BLOCK_BYTES:
+            yield ("\n".join(parts) + "\n").encode()
+            parts.clear()
+            size = 0
+    if parts:
+        yield ("\n".join(parts) + "\n").encode()
+
+
+def gzip_blocks(blocks):
+    # wbits=31 writes a gzip header; a sync flush per block keeps bytes moving
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_blocks(kind, file_format, gzip=False, **filters):
+    """Encoded (and optionally gzipped) byte blocks for an export."""
+    headers = [header for header, _path in EXPORTS[kind]["columns"]]
+    encode = csv_blocks if file_format == "csv" else ndjson_blocks
+    blocks = encode(headers, export_rows(kind, **filters))
+    return gzip_blocks(blocks) if gzip else blocks
+
+
+async def aexport_blocks(kind, file_format, gzip=False, **filters):
+    """export_blocks() as an async iterator, for responses served over ASGI."""
+    blocks = export_blocks(kind, file_format, gzip=gzip, **filters)
+    # thread-sensitive: the cursor stays on the one thread that opened it
+    next_block = sync_to_async(next)
+    done = object()
+    try:
+        while (block := await next_block(blocks, done)) is not done:
+            yield block
+    finally:
+        # closes the server-side cursor when the client goes away early
+        await sync_to_async(blocks.close)()
+
+
+def export_filename(kind, file_format, gzip=False, since=None, until=None, **_filters):
+    span = "-".join(str(day) for day in (since, until) if day) or "all"
+    return f"{kind}-{span}.{file_format}" + (".gz" if gzip else "")
@@ -0,0 +1,115 @@
+"""
+A local stand-in for the Chapa API, used by the tests and the benchmark
+commands so they never touch the real gateway.
+
+    with FakeChapaServer(latency=0.05) as server:
+        settings.CHAPA_BASE_URL = server.base_url
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # one handler instance per TCP connection
+        self.server.fake.record_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        fake.record_request(self.command, self.path)
+
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake.fail_status:
+            return self._reply(fake.fail_status, {"message": "unavailable", "status": "failed"})
+
+        if self.command == "POST" and self.path.endswith("/transaction/initialize"):
+            tx_ref = body.get("tx_ref", "")
+            return self._reply(200, {
+                "message": "Hosted Link",
+                "status": "success",
+                "data": {"checkout_url": f"https://checkout.chapa.test/{tx_ref}", "id": f"CH-{tx_ref}"},
+            })
+        if self.command == "GET" and "/transaction/verify/" in self.path:
+            reference = self.path.rsplit("/", 1)[-1]
+            return self._reply(200, {
+                "message": "Payment details",
+                "status": "success",
+                "data": {"status": fake.verify_status(reference), "tx_ref": reference},
+            })
+        return self._reply(404, {"message": "not found"})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default listen backlog of 5 drops connections when load tests open hundreds at once
+    request_queue_size = 1024
+
+
+class FakeChapaServer:
+    def __init__(self, latency=0.0, fail_status=None, verify_status="success"):
+        self.latency = latency
+        self.fail_status = fail_status
+        self._verify_status = verify_status
+        self.connections = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def verify_status(self, reference):
+        if callable(self._verify_status):
+            return self._verify_status(reference)
+        return self._verify_status
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record_request(self, method, path):
+        with self._lock:
+            self.requests.append((method, path))
+
+    def start(self):
+        self._httpd = _Server(("127.0.0.1", 0), _Handler)
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,119 @@
+"""
+A local SMTP sink, used by the tests so they never deliver real email.
+It accepts every message (unless told to refuse a recipient) and keeps
+it in memory.
+
+    with FakeSMTPServer(connect_latency=0.05) as server:
+        settings.EMAIL_HOST, settings.EMAIL_PORT = server.host, server.port
+"""
+import email
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line.rstrip(b"\r\n") == b".":
+                return b"".join(lines)
+            # undo the client's dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+    def handle(self):
+        fake = self.server.fake
+        fake.record_connection()
+        if fake.connect_latency:
+            # a real relay's TCP + TLS handshake and greeting
+            time.sleep(fake.connect_latency)
+        self.reply("220 fake-smtp ESMTP")
+
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 fake-smtp")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip().strip("<>")
+                if address in fake.refuse:
+                    self.reply("550 mailbox unavailable")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self.read_data()
+                if fake.latency:
+                    time.sleep(fake.latency)
+                fake.record_message(recipients, data)
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSMTPServer:
+    def __init__(self, latency=0.0, connect_latency=0.0, refuse=()):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.refuse = set(refuse)
+        self.connections = 0
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record_message(self, recipients, data):
+        with self._lock:
+            self.messages.append((recipients, email.message_from_bytes(data)))
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,151 @@
+"""
+Proximity search over Listing.latitude/longitude.
+
+nearby() narrows candidates to the bounding box of the search circle: it
+lists the 0.1 degree grid cells (Listing.geo_cell, a generated column)
+under the box and range-checks the coordinates inside the
+(geo_cell, latitude, longitude) index, so only rows in the box ever have
+the exact haversine distance computed before the sort. A plain
+(latitude, longitude) index would scan the whole latitude band, which
+crosses several cities. Coordinates come from the local gazetteer (see
+geocode_listings); nothing here calls out to the network.
+"""
+import csv
+from math import asin, cos, degrees, floor, pi, radians, sin, sqrt
+from pathlib import Path
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * pi / 180
+
+# must match the Listing.geo_cell expression
+CELLS_PER_DEGREE = 10
+CELL_ROW_WIDTH = 4000
+# beyond this many cells (boxes around the poles) the IN list costs more than it saves
+MAX_CELLS = 2000
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.csv"
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) enclosing the circle. Longitudes
+    may fall outside [-180, 180] when the circle crosses the antimeridian.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        # the circle covers a pole, so every longitude is in range
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    # widest longitude span of the circle, reached at latitude asin(sin(lat) / cos(dlat))
+    dlng = degrees(asin(min(1.0, sin(radians(dlat)) / cos(radians(lat)))))
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+
+def geo_cell(lat, lng):
+    return (
+        (floor(lat * CELLS_PER_DEGREE) + 90 * CELLS_PER_DEGREE) * CELL_ROW_WIDTH
+        + floor(lng * CELLS_PER_DEGREE) + 180 * CELLS_PER_DEGREE
+    )
+
+
+def cells_covering(min_lat, max_lat, min_lng, max_lng):
+    """Every grid cell id overlapping the box, wrapping longitudes past +/-180."""
+    cells = []
+    full_circle = 360 * CELLS_PER_DEGREE
+    lng_first = floor(min_lng * CELLS_PER_DEGREE)
+    lng_last = min(floor(max_lng * CELLS_PER_DEGREE), lng_first + full_circle - 1)
+    for row in range(floor(min_lat * CELLS_PER_DEGREE), floor(max_lat * CELLS_PER_DEGREE) + 1):
+        for column in range(lng_first, lng_last + 1):
+            column = (column + 180 * CELLS_PER_DEGREE) % full_circle
+            cells.append((row + 90 * CELLS_PER_DEGREE) * CELL_ROW_WIDTH + column)
+            if column == 0:
+                # longitude 180 lands in its own column, one past the last
+                cells.append((row + 90 * CELLS_PER_DEGREE) * CELL_ROW_WIDTH + full_circle)
+    return cells
+
+
+def bounding_box_filter(lat, lng, radius_km):
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    condition = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    cells = cells_covering(min_lat, max_lat, min_lng, max_lng)
+    if len(cells) <= MAX_CELLS:
+        condition &= Q(geo_cell__in=cells)
+    if min_lng < -180:
+        return condition & (Q(longitude__gte=min_lng + 360) | Q(longitude__lte=max_lng))
+    if max_lng > 180:
+        return condition & (Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng - 360))
+    return condition & Q(longitude__gte=min_lng, longitude__lte=max_lng)
+
+
+def distance_km(lat, lng):
+    """Haversine distance from (lat, lng) to each row, as a database expression."""
+    dlat = Radians(F("latitude")) - Value(radians(lat))
+    dlng = Radians(F("longitude")) - Value(radians(lng))
+    a = (
+        Power(Sin(dlat / 2), 2)
+        + Value(cos(radians(lat))) * Cos(Radians(F("latitude"))) * Power(Sin(dlng / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def nearby(queryset, lat, lng, radius_km):
+    """Listings within radius_km of (lat, lng), annotated with distance_km."""
+    return (
+        queryset.filter(bounding_box_filter(lat, lng, radius_km))
+        .annotate(distance_km=distance_km(lat, lng))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+def page_radius(queryset, lat, lng, radius_km, start_km, needed):
+    """
+    Smallest radius, doubling out from start_km, whose circle holds `needed`
+    listings further than start_km. A page that starts at start_km never
+    has to look further, and dense areas are far cheaper to sort this way
+    than the whole requested circle.
+    """
+    step = radius_km / 16
+    probe = start_km + step
+    while probe < radius_km:
+        beyond_start = nearby(queryset, lat, lng, probe).filter(distance_km__gt=start_km)
+        if beyond_start[:needed].count() >= needed:
+            return probe
+        step *= 2
+        probe = start_km + step
+    return radius_km
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """
+    Read a name,state,latitude,longitude CSV into {(name, state): (lat, lng)}
+    with lowercase keys. Names that are unique in the file are also keyed
+    as (name, None) so listings without a matching state still resolve.
+    """
+    places = {}
+    by_name = {}
+    with open(path, newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            name = row["name"].strip().lower()
+            coords = (float(row["latitude"]), float(row["longitude"]))
+            places[(name, row["state"].strip().lower())] = coords
+            by_name.setdefault(name, []).append(coords)
+    for name, matches in by_name.items():
+        if len(matches) == 1:
+            places[(name, None)] = matches[0]
+    return places
+
+
+def lookup(gazetteer, city, state):
+    city = (city or "").strip().lower()
+    state = (state or "").strip().lower()
+    return gazetteer.get((city, state)) or gazetteer.get((city, None))
@@ -0,0 +1,105 @@
+"""
+Resized WebP/JPEG variants of listing images.
+
+Variant names are derived from the original's storage name, width and
+format only, so a rerun finds the files it already wrote and skips them,
+and a re-upload (which gets a new storage name) never collides with the
+old set. build_variants() touches storage only, never the database, so the
+backfill command can fan it out over a process pool; callers record the
+returned map in Listing.image_variants.
+"""
+import hashlib
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANTS_DIR = "listing_images/variants"
+# extension -> Pillow save options
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def variant_name(original, width, ext):
+    digest = hashlib.sha1(original.encode()).hexdigest()[:12]
+    stem = PurePosixPath(original).stem
+    return f"{VARIANTS_DIR}/{digest}/{stem}-{width}w.{ext}"
+
+
+def target_widths(original_width, widths=VARIANT_WIDTHS):
+    """Widths to render: never upscale, but always produce at least one variant."""
+    fitting = [width for width in widths if width <= original_width]
+    return fitting or [original_width]
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; composite transparent images onto white
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, ext):
+    if ext == "jpeg":
+        image = _flatten(image)
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    buffer = BytesIO()
+    image.save(buffer, **VARIANT_FORMATS[ext])
+    return buffer.getvalue()
+
+
+def build_variants(original, storage=None, overwrite=False):
+    """
+    Render every variant of the image stored at `original` and return
+    {ext: {str(width): storage name}}. Existing variant files are reused
+    unless overwrite is set.
+    """
+    storage = storage or default_storage
+    with storage.open(original, "rb") as handle:
+        image = Image.open(handle)
+        image = ImageOps.exif_transpose(image)
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        image.load()
+
+    variants = {ext: {} for ext in VARIANT_FORMATS}
+    # largest first, each resize starting from the original for quality
+    for width in sorted(target_widths(image.width), reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        resized = None
+        for ext in VARIANT_FORMATS:
+            name = variant_name(original, width, ext)
+            if storage.exists(name):
+                if not overwrite:
+                    variants[ext][str(width)] = name
+                    continue
+                storage.delete(name)
+            if resized is None:
+                resized = image if width == image.width else image.resize(
+                    (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+                )
+            variants[ext][str(width)] = storage.save(name, ContentFile(_encode(resized, ext)))
+    return variants
+
+
+def srcset(variants, build_url):
+    """
+    {ext: {width: url}} plus a ready-made srcset string per format, e.g.
+    {"webp": {"urls": {"320": ...}, "srcset": "... 320w, ... 640w"}}.
+    """
+    result = {}
+    for ext, names in (variants or {}).items():
+        urls = {width: build_url(name) for width, name in sorted(names.items(), key=lambda item: int(item[0]))}
+        result[ext] = {
+            "urls": urls,
+            "srcset": ", ".join(f"{url} {width}w" for width, url in urls.items()),
+        }
+    return result
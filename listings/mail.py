@@ -0,0 +1,202 @@
+"""
+Outgoing email, queued in the database and sent in batches.
+
+enqueue() stores an OutgoingEmail row in the caller's transaction and,
+once that commits, schedules a drain of its queue EMAIL_BATCH_WINDOW
+seconds out; everything queued in the meantime rides along with it.
+drain() claims up to the queue's batch_size due messages and sends them
+over one SMTP connection, paced to the queue's rate limit, instead of a
+connect/EHLO/QUIT round per message. Drains run on their own Celery
+queue ("email"), so a single worker with --concurrency 1 holds every
+queue to its rate. A message that fails is retried with exponential
+backoff up to EMAIL_MAX_ATTEMPTS; when the connection itself can't be
+opened the whole batch backs off. Templates are compiled once per
+process.
+"""
+import logging
+import random
+import smtplib
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Min
+from django.template.loader import get_template
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+PAYMENTS_QUEUE = "transactional"
+# how long a drain may hold claimed messages before another drain can take them
+CLAIM_SECONDS = 300
+
+
+def _scheduled_key(queue):
+    return f"listings-mail:drain-scheduled:{queue}"
+
+
+def enqueue(queue, to, template, context):
+    """Queue one message; it goes out with the next drain of its queue."""
+    if queue not in settings.EMAIL_QUEUES:
+        raise ValueError(f"unknown email queue {queue!r}")
+    message = OutgoingEmail.objects.create(queue=queue, to=to, template=template, context=context)
+    transaction.on_commit(lambda: schedule_drain(queue, settings.EMAIL_BATCH_WINDOW))
+    return message
+
+
+def queue_payment_confirmation(to_email, booking_reference, amount):
+    return enqueue(PAYMENTS_QUEUE, to_email, "payment_confirmation", {
+        "booking_reference": booking_reference,
+        "amount": str(amount),
+    })
+
+
+def schedule_drain(queue, countdown):
+    # at most one drain waiting per queue; the drain clears the flag as it starts
+    if not cache.add(_scheduled_key(queue), True, timeout=countdown + CLAIM_SECONDS):
+        return
+    from .tasks import drain_email_queue
+
+    try:
+        drain_email_queue.apply_async((queue,), countdown=countdown)
+    except OperationalError:
+        # the message is stored; the beat sweep sends it once the broker is back
+        cache.delete(_scheduled_key(queue))
+        logger.warning("couldn't schedule a drain of email queue %s", queue, exc_info=True)
+
+
+@lru_cache(maxsize=None)
+def _templates(name):
+    return get_template(f"listings/email/{name}_subject.txt"), get_template(f"listings/email/{name}.txt")
+
+
+def render(message):
+    subject_template, body_template = _templates(message.template)
+    # a header can't span lines
+    subject = " ".join(subject_template.render(message.context).split())
+    return EmailMessage(subject, body_template.render(message.context), settings.DEFAULT_FROM_EMAIL, [message.to])
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(settings.EMAIL_RETRY_MAX_DELAY, settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(queue, limit):
+    """Take up to limit due messages, oldest first, away from concurrent drains."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutgoingEmail.objects.filter(
+            queue=queue, status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now
+        ).order_by("next_attempt_at", "pk")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        messages = list(due[:limit])
+        OutgoingEmail.objects.filter(pk__in=[message.pk for message in messages]).update(
+            next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+        )
+    return messages
+
+
+def _record_failure(message, error, now):
+    message.attempts += 1
+    message.last_error = f"{type(error).__name__}: {error}"
+    if message.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        message.status = OutgoingEmail.STATUS_FAILED
+        logger.error("giving up on email %s to %s: %s", message.pk, message.to, message.last_error)
+    else:
+        message.next_attempt_at = now + timedelta(seconds=retry_delay(message.attempts))
+
+
+def send_batch(messages, rate):
+    """
+    Send over one connection at most rate messages per second; returns
+    (sent, [(message, error)]). Raises if the server can't be reached.
+    """
+    sent, failed = [], []
+    interval = 1 / rate if rate else 0
+    smtp = get_connection()
+    smtp.open()
+    try:
+        next_send = time.monotonic()
+        for index, message in enumerate(messages):
+            try:
+                email = render(message)
+            except Exception as e:  # a broken template mustn't hold up the rest of the batch
+                failed.append((message, e))
+                continue
+
+            pause = next_send - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            next_send = max(next_send, time.monotonic()) + interval
+            try:
+                smtp.send_messages([email])
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # refused by the server; the session itself is still usable
+                failed.append((message, e))
+            except OSError as e:
+                failed.append((message, e))
+                # the connection dropped: reconnect once for the rest of the batch,
+                # else send_messages() would open and close one per message
+                try:
+                    smtp.close()
+                except OSError:
+                    pass
+                try:
+                    smtp.open()
+                except OSError as e:
+                    # the server is gone; the rest backs off with this batch
+                    failed.extend((rest, e) for rest in messages[index + 1:])
+                    break
+            else:
+                sent.append(message)
+    finally:
+        try:
+            smtp.close()
+        except OSError:
+            pass
+    return sent, failed
+
+
+def drain(queue):
+    """
+    Send one batch of the queue's due messages. Returns the number sent,
+    the number that failed, and how many seconds until the next message
+    is due (0 when more are waiting, None when the queue is empty).
+    """
+    cache.delete(_scheduled_key(queue))
+    options = settings.EMAIL_QUEUES[queue]
+    messages = claim(queue, options["batch_size"])
+
+    sent, failed = [], []
+    if messages:
+        try:
+            sent, failed = send_batch(messages, options["rate"])
+        except OSError as e:
+            # couldn't connect at all (smtplib's errors are OSErrors too)
+            failed = [(message, e) for message in messages]
+
+        now = timezone.now()
+        OutgoingEmail.objects.filter(pk__in=[message.pk for message in sent]).update(
+            status=OutgoingEmail.STATUS_SENT, sent_at=now, next_attempt_at=now,
+        )
+        for message, error in failed:
+            _record_failure(message, error, now)
+        OutgoingEmail.objects.bulk_update(
+            [message for message, _ in failed], ["attempts", "last_error", "status", "next_attempt_at"]
+        )
+
+    next_due = OutgoingEmail.objects.filter(
+        queue=queue, status=OutgoingEmail.STATUS_PENDING
+    ).aggregate(next_due=Min("next_attempt_at"))["next_due"]
+    next_in = None if next_due is None else max(0.0, (next_due - timezone.now()).total_seconds())
+    return len(sent), len(failed), next_in
@@ -0,0 +1,315 @@
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from listings import cache, chapa
+from listings.fake_chapa import FakeChapaServer
+from listings.geo import load_gazetteer
+from listings.management.commands.seed import CITIES, USERNAME_PREFIX
+from listings.models import Listing, Booking, Payment
+
+User = get_user_model()
+
+BENCH_USER = "bench-api-guest"
+BENCH_REF_PREFIX = "bench-api-"
+# far past the seeded stays, so benchmark bookings never clash with them
+BOOKING_EPOCH = date(2035, 1, 1)
+SEARCH_TERMS = ["beach", "cozy villa", "lagos", "modern loft", "garden", "quiet", "luxury apartment", "cabin"]
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+# metric -> whether a higher value is worse; compared against the baseline on every run
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "throughput_rps": False,
+    "queries_per_request": True,
+}
+# cache hits make the average wobble a little between runs
+QUERIES_NOISE = 0.5
+
+
+def percentile(ordered, q):
+    return statistics.quantiles(ordered, n=100)[q - 1] if len(ordered) > 1 else ordered[0]
+
+
+def summarize(samples, elapsed):
+    """Aggregate (latency_ms, status_code, queries) samples from one scenario."""
+    latencies = sorted(latency for latency, _code, _queries in samples)
+    errors = sum(1 for _latency, code, _queries in samples if code >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round(sum(queries for _latency, _code, queries in samples) / len(samples), 2),
+    }
+
+
+def combine(runs):
+    """Median of each metric over repeated runs of a scenario."""
+    return {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+
+
+def compare(baseline, results, max_regression, min_delta_ms=0.0):
+    """
+    Messages for every scenario metric more than max_regression percent worse
+    than the baseline. Latency changes under min_delta_ms are ignored, as a
+    few milliseconds on a fast cached endpoint are noise, not a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            old, new = base[metric], result[metric]
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            worse = change if higher_is_worse else -change
+            if metric.endswith("_ms") and abs(new - old) < min_delta_ms:
+                continue
+            if metric == "queries_per_request" and abs(new - old) < QUERIES_NOISE:
+                continue
+            if worse > max_regression:
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1f}%)")
+    return regressions
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Seed a sized dataset, stub Chapa with a local fake server and drive the listing, booking "
+        "and payment endpoints at a fixed concurrency; compare the results with a JSON baseline"
+    )
+
+    # each name has a request_<name>(i, rng) -> (method, path, body) builder below
+    SCENARIOS = (
+        "listing_list", "listing_detail", "listing_available", "listing_search", "listing_nearby",
+        "booking_create", "payment_initiate", "payment_verify",
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=20)
+        parser.add_argument("--guests", type=int, default=200)
+        parser.add_argument("--listings", type=int, default=5000)
+        parser.add_argument("--bookings", type=int, default=50_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--requests", type=int, default=300, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Timed runs per scenario; the median of each metric is reported")
+        parser.add_argument("--chapa-latency", type=float, default=0.02,
+                            help="Seconds the fake Chapa server takes per call")
+        parser.add_argument("--scenario", action="append", choices=self.SCENARIOS, dest="scenarios",
+                            help="Run only these scenarios (repeatable)")
+        parser.add_argument("--baseline", default=str(Path(settings.BASE_DIR) / "benchmarks" / "api_baseline.json"))
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Record this run as the new baseline instead of comparing")
+        parser.add_argument("--max-regression", type=float, default=20.0,
+                            help="Fail when a metric is this many percent worse than the baseline")
+        parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                            help="Ignore latency changes smaller than this")
+        parser.add_argument("--output", help="Also write this run's results as JSON here")
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a previous run")
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            call_command(
+                "seed", hosts=options["hosts"], guests=options["guests"], listings=options["listings"],
+                bookings=options["bookings"], reviews=options["bookings"] // 2, seed=options["seed"],
+                flush=True, stdout=self.stdout,
+            )
+        self.listing_ids = [
+            str(pk) for pk in Listing.objects.filter(host_id__username__startswith=USERNAME_PREFIX)
+            .order_by("pk").values_list("pk", flat=True)
+        ]
+        if not self.listing_ids:
+            raise CommandError("No seeded listings; run without --skip-seed first")
+        self.user, _ = User.objects.get_or_create(username=BENCH_USER, defaults={"email": "bench@example.com"})
+        self.gazetteer = list(load_gazetteer().values())
+        self.seed = options["seed"]
+
+        config = {
+            key: options[key]
+            for key in (
+                "hosts", "guests", "listings", "bookings", "seed", "requests", "concurrency", "repeat", "chapa_latency",
+            )
+        }
+        config["vendor"] = connection.vendor
+        results = {}
+        try:
+            with FakeChapaServer(latency=options["chapa_latency"]) as server, override_settings(
+                CHAPA_BASE_URL=server.base_url, CHAPA_ASYNC=False, SERVER_TIMING=True,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "localhost"],
+            ):
+                chapa.reset_client()
+                for name in options["scenarios"] or self.SCENARIOS:
+                    results[name] = self.run_scenario(name, options)
+                    self.report(name, results[name])
+        finally:
+            chapa.reset_client()
+            self.cleanup()
+
+        run = {"config": config, "scenarios": results}
+        if options["output"]:
+            self.write(options["output"], run)
+        if any(result["errors"] for result in results.values()):
+            raise CommandError("Some requests failed; results are not comparable")
+        self.check_baseline(run, options)
+
+    def run_scenario(self, name, options):
+        prepare = getattr(self, f"prepare_{name}", None)
+        total = options["warmup"] + options["requests"] * options["repeat"]
+        if prepare:
+            prepare(total)
+        build = getattr(self, f"request_{name}")
+        # every scenario starts cold; the warmup requests then fill the response cache
+        cache.invalidate("listings")
+        cache.invalidate("bookings")
+
+        self.drive(name, build, range(options["warmup"]), options["concurrency"])
+        runs = []
+        for first in range(options["warmup"], total, options["requests"]):
+            started = time.perf_counter()
+            samples = self.drive(name, build, range(first, first + options["requests"]), options["concurrency"])
+            runs.append(summarize(samples, time.perf_counter() - started))
+        return combine(runs)
+
+    def drive(self, name, build, indexes, concurrency):
+        """Closed loop: `concurrency` threads, each sending its next request as soon as one returns."""
+        pending = iter(indexes)
+        lock = threading.Lock()
+        samples = []
+
+        def worker():
+            # outside the test runner "testserver" isn't an allowed host
+            client = APIClient(HTTP_HOST="localhost")
+            client.force_authenticate(self.user)
+            try:
+                while True:
+                    with lock:
+                        i = next(pending, None)
+                    if i is None:
+                        return
+                    # a per-request generator keeps runs identical whatever the thread interleaving
+                    method, path, body = build(i, random.Random(f"{self.seed}:{name}:{i}"))
+                    started = time.perf_counter()
+                    if method == "GET":
+                        response = client.get(path)
+                    else:
+                        response = client.post(path, body, format="json")
+                    latency = (time.perf_counter() - started) * 1000
+                    match = QUERIES_RE.search(response.get("Server-Timing", ""))
+                    with lock:
+                        samples.append((latency, response.status_code, int(match.group(1)) if match else 0))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    def request_listing_list(self, i, rng):
+        return "GET", f"/api/listings/?min_rating={rng.choice([0, 1, 2, 3, 4])}", None
+
+    def request_listing_detail(self, i, rng):
+        return "GET", f"/api/listings/{rng.choice(self.listing_ids)}/", None
+
+    def request_listing_available(self, i, rng):
+        city, _state = rng.choice(CITIES)
+        start = date(2026, 1, 1) + timedelta(days=rng.randrange(365))
+        end = start + timedelta(days=rng.randint(1, 7))
+        return "GET", f"/api/listings/available/?city={city}&start_date={start}&end_date={end}", None
+
+    def request_listing_search(self, i, rng):
+        return "GET", f"/api/listings/search/?q={rng.choice(SEARCH_TERMS)}", None
+
+    def request_listing_nearby(self, i, rng):
+        latitude, longitude = rng.choice(self.gazetteer)
+        return "GET", f"/api/listings/nearby/?lat={latitude}&lng={longitude}&radius_km={rng.choice([2, 5, 10])}", None
+
+    def request_booking_create(self, i, rng):
+        # walk listings first, then dates, so no two requests ask for the same nights
+        listing_id = self.listing_ids[i % len(self.listing_ids)]
+        start = BOOKING_EPOCH + timedelta(days=3 * (i // len(self.listing_ids)))
+        return "POST", "/api/bookings/", {
+            "property_id": listing_id,
+            "user_id": self.user.pk,
+            "start_date": str(start),
+            "end_date": str(start + timedelta(days=2)),
+        }
+
+    def request_payment_initiate(self, i, rng):
+        return "POST", "/api/chapa/initiate/", {
+            "booking_reference": f"{BENCH_REF_PREFIX}{i}",
+            "amount": rng.randrange(50, 500),
+            "email": "bench@example.com",
+        }
+
+    def prepare_payment_verify(self, count):
+        Payment.objects.bulk_create(
+            Payment(booking_reference=f"{BENCH_REF_PREFIX}verify-{i}", amount=Decimal("100.00"),
+                    status=Payment.STATUS_PENDING, chapa_tx_ref=f"{BENCH_REF_PREFIX}verify-{i}")
+            for i in range(count)
+        )
+
+    def request_payment_verify(self, i, rng):
+        return "POST", "/api/chapa/verify/", {"tx_ref": f"{BENCH_REF_PREFIX}verify-{i}"}
+
+    def cleanup(self):
+        # leave the seeded dataset exactly as it was so the next run starts from the same state
+        Booking.objects.filter(user_id=self.user).delete()
+        Payment.objects.filter(booking_reference__startswith=BENCH_REF_PREFIX).delete()
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<18} {result['throughput_rps']:>8.1f} req/s  p50={result['p50_ms']:.1f}ms "
+            f"p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms  "
+            f"{result['queries_per_request']:.1f} queries/req  errors={result['errors']}"
+        )
+
+    def write(self, path, run):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(run, indent=2, sort_keys=True) + "\n")
+
+    def check_baseline(self, run, options):
+        path = Path(options["baseline"])
+        if options["update_baseline"] or not path.exists():
+            self.write(path, run)
+            self.stdout.write(self.style.SUCCESS(f"Wrote baseline to {path}"))
+            return
+
+        baseline = json.loads(path.read_text())
+        if baseline["config"] != run["config"]:
+            raise CommandError(
+                f"Baseline {path} was recorded with different options ({baseline['config']}); "
+                "rerun with the same options or pass --update-baseline"
+            )
+        regressions = compare(baseline["scenarios"], run["scenarios"], options["max_regression"], options["min_delta_ms"])
+        if regressions:
+            raise CommandError(
+                f"Regressed more than {options['max_regression']}% against {path}:\n  " + "\n  ".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regression beyond {options['max_regression']}% against {path}."))
@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from listings.models import Listing, Booking
+
+User = get_user_model()
+
+CITIES = ["Lagos", "Abuja", "Ibadan", "Kano", "Port Harcourt", "Enugu", "Calabar", "Jos", "Benin City", "Kaduna"]
+PROPERTY_TYPES = ["Apartment", "House", "Villa", "Cabin", "Studio"]
+BENCH_HOST = "bench-availability-host"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+
+    help = "Seed a large dataset and measure latency of the listing availability search"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100_000)
+        parser.add_argument("--bookings", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--target-p95-ms", type=float, default=100.0)
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a previous run")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark rows afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        host, _ = User.objects.get_or_create(username=BENCH_HOST)
+
+        if not options["skip_seed"]:
+            self.seed(host, rng, options)
+
+        timings = self.run_queries(rng, options)
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{len(timings)} queries on {connection.vendor}: "
+            f"p50={p50:.1f}ms p95={p95:.1f}ms max={max(timings):.1f}ms"
+        )
+
+        if options["cleanup"]:
+            Listing.objects.filter(host_id=host).delete()
+            host.delete()
+
+        if p95 > options["target_p95_ms"]:
+            raise CommandError(f"p95 {p95:.1f}ms is above the {options['target_p95_ms']}ms target")
+        self.stdout.write(self.style.SUCCESS("Availability search is within target."))
+
+    def seed(self, host, rng, options):
+        batch_size = options["batch_size"]
+        n_listings = options["listings"]
+        per_listing = max(1, options["bookings"] // max(1, n_listings))
+
+        def listings():
+            for i in range(n_listings):
+                yield Listing(
+                    listing_image="listing_images/bench.jpg",
+                    host_id=host,
+                    title=f"Bench listing {i}",
+                    description="Benchmark listing",
+                    price=Decimal(rng.randrange(20, 500)),
+                    address=f"{i} Bench Road",
+                    city=rng.choice(CITIES),
+                    state="Bench",
+                    pricetag="per night",
+                    bedrooms=rng.randint(1, 6),
+                    bathrooms=Decimal(rng.randint(1, 4)),
+                    property_type=rng.choice(PROPERTY_TYPES),
+                )
+
+        listing_ids = []
+        with transaction.atomic():
+            for chunk in chunked(listings(), batch_size):
+                Listing.objects.bulk_create(chunk, batch_size=batch_size)
+                listing_ids.extend(obj.pk for obj in chunk)
+        self.stdout.write(f"Seeded {len(listing_ids)} listings")
+
+        def bookings():
+            base = date.today()
+            for listing_id in listing_ids:
+                # walk forward through the year so a listing's stays never overlap
+                day = base + timedelta(days=rng.randint(0, 10))
+                for _ in range(per_listing):
+                    nights = rng.randint(1, 7)
+                    yield Booking(
+                        property_id_id=listing_id,
+                        user_id=host,
+                        start_date=day,
+                        end_date=day + timedelta(days=nights),
+                        total_price=Decimal(nights * 100),
+                    )
+                    day += timedelta(days=nights + rng.randint(0, 20))
+
+        created = 0
+        with transaction.atomic():
+            for chunk in chunked(bookings(), batch_size):
+                Booking.objects.bulk_create(chunk, batch_size=batch_size)
+                created += len(chunk)
+        self.stdout.write(f"Seeded {created} bookings")
+
+    def run_queries(self, rng, options):
+        page_size = options["page_size"]
+        timings = []
+        for _ in range(options["queries"]):
+            start = date.today() + timedelta(days=rng.randint(0, 300))
+            end = start + timedelta(days=rng.randint(1, 14))
+            queryset = Listing.objects.filter(
+                city=rng.choice(CITIES),
+                property_type=rng.choice(PROPERTY_TYPES),
+                price__lte=Decimal(rng.randrange(100, 500)),
+            ).available_between(start, end).order_by("-created_at", "-property_id")
+
+            began = time.perf_counter()
+            list(queryset[:page_size + 1])
+            timings.append((time.perf_counter() - began) * 1000)
+        return timings
@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.test import APIClient
+
+from listings.models import Listing, Booking
+
+User = get_user_model()
+
+BENCH_USER = "bench-booking-contention"
+
+
+class Command(BaseCommand):
+
+    help = "Hammer a few listings with overlapping booking requests and count double bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--slots", type=int, default=50,
+                            help="Distinct two-night windows per listing; fewer slots means more contention")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCH_USER)
+        listings = [
+            Listing.objects.create(
+                listing_image="listing_images/bench.jpg", host_id=user, title=f"Contention bench {i}",
+                description="Benchmark listing", price=Decimal("100.00"), address="1 Bench Road",
+                city="Bench", state="Bench", pricetag="per night", bedrooms=1,
+                bathrooms=Decimal("1.00"), property_type="Apartment",
+            )
+            for i in range(options["listings"])
+        ]
+        base = date.today() + timedelta(days=1)
+        slots = options["slots"]
+
+        def attempt(n):
+            # consecutive requests land on the same window of the same listing, and
+            # every other window shifts by a night so it overlaps both neighbours
+            listing = listings[n % len(listings)]
+            start = base + timedelta(days=(n // len(listings)) % slots)
+            body = {
+                "property_id": str(listing.pk),
+                "user_id": user.pk,
+                "start_date": str(start),
+                "end_date": str(start + timedelta(days=2)),
+            }
+            try:
+                # outside the test runner "testserver" isn't an allowed host
+                client = APIClient(HTTP_HOST="localhost")
+                client.force_authenticate(user)
+                return client.post("/api/bookings/", body, format="json").status_code
+            finally:
+                connections.close_all()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                codes = list(pool.map(attempt, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+            double_booked = self.count_double_bookings(listings)
+        finally:
+            for listing in listings:
+                listing.delete()
+
+        created = codes.count(201)
+        rejected = codes.count(400)
+        self.stdout.write(
+            f"{len(codes)} requests in {elapsed:.2f}s ({len(codes) / elapsed:.0f} req/sec, "
+            f"{created / elapsed:.0f} bookings/sec)"
+        )
+        self.stdout.write(f"created={created} rejected={rejected} other={len(codes) - created - rejected}")
+        style = self.style.SUCCESS if not double_booked else self.style.ERROR
+        self.stdout.write(style(f"double bookings: {double_booked}"))
+
+    def count_double_bookings(self, listings):
+        clashes = 0
+        for listing in listings:
+            stays = list(Booking.objects.filter(property_id=listing).order_by("start_date")
+                         .values_list("start_date", "end_date"))
+            clashes += sum(1 for previous, current in zip(stays, stays[1:]) if current[0] < previous[1])
+        return clashes
@@ -0,0 +1,77 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from listings.models import Listing, Booking
+
+User = get_user_model()
+
+BENCH_USER = "bench-bulk-import"
+
+
+class Command(BaseCommand):
+
+    help = "Compare importing bookings one request per row against the bulk endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--batch-size", type=int, default=settings.BULK_MAX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        batch_size = min(options["batch_size"], settings.BULK_MAX_BATCH_SIZE)
+        user, _ = User.objects.get_or_create(username=BENCH_USER)
+        listing = Listing.objects.create(
+            listing_image="listing_images/bench.jpg", host_id=user, title="Bulk import bench",
+            description="Benchmark listing", price=Decimal("100.00"), address="1 Bench Road",
+            city="Bench", state="Bench", pricetag="per night", bedrooms=1,
+            bathrooms=Decimal("1.00"), property_type="Apartment",
+        )
+        # outside the test runner "testserver" isn't an allowed host
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(user)
+
+        try:
+            per_row = self.run_per_row(client, listing, user, rows)
+            Booking.objects.filter(property_id=listing).delete()
+            bulk = self.run_bulk(client, listing, user, rows, batch_size)
+        finally:
+            listing.delete()
+
+        self.stdout.write(f"per-row: {rows} bookings in {per_row:.2f}s ({rows / per_row:.0f} rows/sec)")
+        self.stdout.write(f"bulk:    {rows} bookings in {bulk:.2f}s ({rows / bulk:.0f} rows/sec, batch={batch_size})")
+        self.stdout.write(self.style.SUCCESS(f"bulk import is {per_row / bulk:.1f}x faster"))
+
+    def items(self, listing, user, rows):
+        base = date.today()
+        for i in range(rows):
+            # two nights each, back to back, so no two bookings overlap
+            start = base + timedelta(days=2 * i)
+            yield {
+                "property_id": str(listing.pk),
+                "user_id": user.pk,
+                "start_date": str(start),
+                "end_date": str(start + timedelta(days=2)),
+            }
+
+    def run_per_row(self, client, listing, user, rows):
+        started = time.perf_counter()
+        for item in self.items(listing, user, rows):
+            response = client.post("/api/bookings/", item, format="json")
+            if response.status_code != 201:
+                raise CommandError(f"per-row import failed: {response.content[:500]}")
+        return time.perf_counter() - started
+
+    def run_bulk(self, client, listing, user, rows, batch_size):
+        items = list(self.items(listing, user, rows))
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            response = client.post("/api/bookings/bulk/", items[offset:offset + batch_size], format="json")
+            if response.status_code != 201:
+                raise CommandError(f"bulk import failed: {response.content[:500]}")
+        return time.perf_counter() - started
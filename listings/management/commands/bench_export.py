@@ -0,0 +1,94 @@
+import time
+import tracemalloc
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from listings import exports
+from listings.models import Payment
+
+BENCH_REF_PREFIX = "bench-export-"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+
+    help = "Seed payments and measure time-to-first-byte, throughput and peak memory of a streaming export"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payments", type=int, default=5_000_000)
+        parser.add_argument("--format", dest="file_format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--max-first-byte-ms", type=float, default=1000.0)
+        parser.add_argument("--trace-memory", action="store_true",
+                            help="Report peak Python memory during the export (several times slower)")
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a previous run")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark rows afterwards")
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            self.seed(options)
+
+        if options["trace_memory"]:
+            tracemalloc.start()
+        started = time.perf_counter()
+        first_byte = None
+        written = 0
+        lines = 0
+        for block in exports.export_blocks("payments", options["file_format"], gzip=options["gzip"]):
+            if first_byte is None and block:
+                first_byte = time.perf_counter() - started
+            written += len(block)
+            if not options["gzip"]:
+                lines += block.count(b"\n")
+        elapsed = time.perf_counter() - started
+        memory = ""
+        if options["trace_memory"]:
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory = f", peak traced memory {peak / 1e6:.1f}MB"
+
+        rows = lines - (1 if options["file_format"] == "csv" else 0) if not options["gzip"] else None
+        rate = f", {rows / elapsed:.0f} rows/sec" if rows is not None else ""
+        self.stdout.write(
+            f"{connection.vendor}: first byte after {first_byte * 1000:.0f}ms, "
+            f"{written / 1e6:.1f}MB in {elapsed:.1f}s{rate}{memory}"
+        )
+
+        if options["cleanup"]:
+            Payment.objects.filter(booking_reference__startswith=BENCH_REF_PREFIX).delete()
+
+        if first_byte * 1000 > options["max_first_byte_ms"]:
+            raise CommandError(f"first byte took {first_byte * 1000:.0f}ms")
+        self.stdout.write(self.style.SUCCESS("Export streamed within target."))
+
+    def seed(self, options):
+        statuses = [Payment.STATUS_COMPLETED] * 8 + [Payment.STATUS_PENDING, Payment.STATUS_FAILED]
+
+        def payments():
+            for i in range(options["payments"]):
+                yield Payment(
+                    booking_reference=f"{BENCH_REF_PREFIX}{i}",
+                    amount=Decimal(100 + i % 900),
+                    currency="ETB",
+                    status=statuses[i % len(statuses)],
+                )
+
+        started = time.perf_counter()
+        created = 0
+        for chunk in chunked(payments(), options["batch_size"]):
+            with transaction.atomic():
+                Payment.objects.bulk_create(chunk, batch_size=options["batch_size"])
+            created += len(chunk)
+        self.stdout.write(f"Seeded {created} payments in {time.perf_counter() - started:.1f}s")
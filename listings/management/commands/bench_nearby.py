@@ -0,0 +1,134 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from listings.geo import distance_km, load_gazetteer, nearby, page_radius
+from listings.models import Listing
+
+User = get_user_model()
+
+BENCH_HOST = "bench-nearby-host"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+
+    help = "Seed geocoded listings and measure nearby-search latency against a full haversine scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--scan-queries", type=int, default=5,
+                            help="Queries for the no-bounding-box baseline (slow on big tables)")
+        parser.add_argument("--max-radius-km", type=float, default=25.0)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--target-p95-ms", type=float, default=50.0)
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a previous run")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark rows afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        places = sorted(set(load_gazetteer().values()))
+        host, _ = User.objects.get_or_create(username=BENCH_HOST)
+
+        if not options["skip_seed"]:
+            self.seed(host, rng, places, options)
+
+        queries = []
+        for _ in range(options["queries"]):
+            lat, lng = rng.choice(places)
+            radius = rng.uniform(1, options["max_radius_km"])
+            queries.append((lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05), radius))
+
+        page_size = options["page_size"]
+        queryset = Listing.objects.defer("search_vector")
+        # first page the way the nearby endpoint serves it: widen from a small circle until it fills
+        timings = self.time_queries(
+            lambda lat, lng, radius: nearby(
+                queryset, lat, lng, page_radius(queryset, lat, lng, radius, 0.0, page_size + 1)
+            ).order_by("distance_km", "property_id"),
+            queries, page_size,
+        )
+        # what proximity search costs without the indexed bounding box
+        scan = self.time_queries(
+            lambda lat, lng, radius: queryset.annotate(distance_km=distance_km(lat, lng))
+            .filter(distance_km__lte=radius).order_by("distance_km", "property_id"),
+            queries[:options["scan_queries"]], page_size,
+        )
+
+        p95 = self.report("bounding box", timings)
+        if scan:
+            self.report("full scan", scan)
+
+        if options["cleanup"]:
+            Listing.objects.filter(host_id=host).delete()
+            host.delete()
+
+        if p95 > options["target_p95_ms"]:
+            raise CommandError(f"p95 {p95:.1f}ms is above the {options['target_p95_ms']}ms target")
+        self.stdout.write(self.style.SUCCESS("Nearby search is within target."))
+
+    def report(self, name, timings):
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{name:>12}: {len(timings)} queries on {connection.vendor}: "
+            f"p50={p50:.1f}ms p95={p95:.1f}ms max={max(timings):.1f}ms"
+        )
+        return p95
+
+    def seed(self, host, rng, places, options):
+        batch_size = options["batch_size"]
+
+        def listings():
+            for i in range(options["listings"]):
+                lat, lng = rng.choice(places)
+                yield Listing(
+                    listing_image="listing_images/bench.jpg",
+                    host_id=host,
+                    title=f"Bench listing {i}",
+                    description="Benchmark listing",
+                    price=Decimal(rng.randrange(20, 500)),
+                    address=f"{i} Bench Road",
+                    city="Bench",
+                    state="Bench",
+                    pricetag="per night",
+                    bedrooms=rng.randint(1, 6),
+                    bathrooms=Decimal(rng.randint(1, 4)),
+                    property_type="Apartment",
+                    # metro areas: dense near each centre, thinning out over ~50km
+                    latitude=lat + rng.gauss(0, 0.25),
+                    longitude=lng + rng.gauss(0, 0.25),
+                )
+
+        created = 0
+        started = time.perf_counter()
+        for chunk in chunked(listings(), batch_size):
+            with transaction.atomic():
+                Listing.objects.bulk_create(chunk, batch_size=batch_size)
+            created += len(chunk)
+        self.stdout.write(f"Seeded {created} listings in {time.perf_counter() - started:.1f}s")
+
+    def time_queries(self, build, queries, page_size):
+        timings = []
+        for lat, lng, radius in queries:
+            began = time.perf_counter()
+            list(build(lat, lng, radius)[:page_size + 1])
+            timings.append((time.perf_counter() - began) * 1000)
+        return timings
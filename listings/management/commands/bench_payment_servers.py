@@ -0,0 +1,158 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.fake_chapa import FakeChapaServer
+from listings.models import Payment
+
+BENCH_REF_PREFIX = "bench-pay-"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Load-test the payment endpoints against a slow local Chapa stub, served once by gunicorn "
+        "sync workers (sync views) and once by uvicorn (async views), and compare throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes for each server")
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--chapa-latency", type=float, default=0.25,
+                            help="Seconds the fake Chapa server takes per call")
+        parser.add_argument("--endpoint", choices=["verify", "initiate"], default="verify")
+        parser.add_argument("--min-speedup", type=float, default=2.0,
+                            help="Fail unless async throughput is at least this multiple of sync")
+
+    def handle(self, *args, **options):
+        results = {}
+        with FakeChapaServer(latency=options["chapa_latency"]) as chapa_server:
+            try:
+                for mode in ("sync", "async"):
+                    with self.serve(mode, chapa_server.base_url, options) as base_url:
+                        results[mode] = asyncio.run(self.load(base_url, options))
+                    self.report(mode, results[mode])
+            finally:
+                Payment.objects.filter(booking_reference__startswith=BENCH_REF_PREFIX).delete()
+
+        speedup = results["async"]["throughput"] / results["sync"]["throughput"]
+        self.stdout.write(f"async/sync throughput: {speedup:.1f}x")
+        if speedup < options["min_speedup"]:
+            raise CommandError(f"async views were only {speedup:.1f}x faster (wanted {options['min_speedup']}x)")
+        self.stdout.write(self.style.SUCCESS("Async payment views are within target."))
+
+    def serve(self, mode, chapa_url, options):
+        port = free_port()
+        env = dict(
+            os.environ,
+            CHAPA_BASE_URL=chapa_url,
+            CHAPA_ASYNC="False",
+            # production settings, minus the HTTPS redirect a plain local socket can't follow
+            DEBUG="False",
+            SECURE_SSL_REDIRECT="False",
+            # every request queues behind the others, so the slow log would be all noise
+            SLOW_REQUEST_MS="600000",
+            ASGI_PAYMENT_VIEWS=str(mode == "async"),
+            ALLOWED_HOSTS="127.0.0.1",
+            # one gateway connection per in-flight request on either server
+            CHAPA_POOL_SIZE=str(options["concurrency"]),
+            CHAPA_ASYNC_POOL_SIZE=str(options["concurrency"]),
+        )
+        if mode == "sync":
+            command = [sys.executable, "-m", "gunicorn", "alx_travel_app.wsgi:application",
+                       "--workers", str(options["workers"]), "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "alx_travel_app.asgi:application",
+                       "--workers", str(options["workers"]), "--port", str(port),
+                       "--log-level", "warning", "--no-access-log"]
+        return _Server(command, env, port, cwd=settings.BASE_DIR)
+
+    async def load(self, base_url, options):
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        latencies = []
+        codes = []
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            async def one(i):
+                if options["endpoint"] == "verify":
+                    path, body = "/api/chapa/verify/", {"tx_ref": f"{BENCH_REF_PREFIX}{i}"}
+                else:
+                    path = "/api/chapa/initiate/"
+                    body = {"booking_reference": f"{BENCH_REF_PREFIX}{i}", "amount": "100.00",
+                            "email": "bench@example.com"}
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post(path, json=body)
+                    except httpx.TransportError:
+                        # an overloaded server dropping connections counts against it
+                        codes.append(None)
+                    else:
+                        codes.append(response.status_code)
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(options["requests"])))
+            elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "throughput": len(latencies) / elapsed,
+            "p50": statistics.median(latencies),
+            "p95": statistics.quantiles(latencies, n=100)[94] if len(latencies) > 1 else latencies[0],
+            "errors": sum(1 for code in codes if code is None or code >= 400),
+        }
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f"{mode:<5} {result['throughput']:>8.1f} req/s  p50={result['p50']:.0f}ms "
+            f"p95={result['p95']:.0f}ms  errors={result['errors']}"
+        )
+
+
+class _Server:
+    """Runs a server subprocess for the duration of a with block, once it accepts requests."""
+
+    def __init__(self, command, env, port, cwd):
+        self.command = command
+        self.env = env
+        self.port = port
+        self.cwd = cwd
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, env=self.env, cwd=self.cwd)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{self.command[2]} exited with status {self.process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return f"http://127.0.0.1:{self.port}"
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"{self.command[2]} didn't start within 30s")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
@@ -0,0 +1,72 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from listings import chapa
+from listings.fake_chapa import FakeChapaServer
+from listings.models import OutboxEvent, Payment
+from listings.reconciliation import reconcile_pending_payments
+
+
+class Command(BaseCommand):
+
+    help = "Reconcile seeded stale Pending payments against a local Chapa stand-in and report throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payments", type=int, default=2000)
+        parser.add_argument("--chunk-size", type=int, default=settings.PAYMENT_RECONCILE_CHUNK_SIZE)
+        parser.add_argument("--concurrency", type=int, default=settings.PAYMENT_RECONCILE_CONCURRENCY)
+        parser.add_argument("--latency", type=float, default=0.05,
+                            help="Seconds the stand-in waits before answering")
+
+    def handle(self, *args, **options):
+        # only the rows seeded by this run are reconciled, and all of them are removed afterwards
+        prefix = f"BENCH-RECON-{uuid.uuid4().hex[:8]}-"
+        seeded = Payment.objects.filter(booking_reference__startswith=prefix)
+        older_than = settings.PAYMENT_RECONCILE_AFTER_MINUTES
+        try:
+            self.seed(prefix, options["payments"], older_than)
+            with FakeChapaServer(latency=options["latency"]) as server, override_settings(
+                CHAPA_BASE_URL=server.base_url,
+                # size the pool to the thread count so every worker keeps its connection
+                CHAPA_POOL_SIZE=max(options["concurrency"], settings.CHAPA_POOL_SIZE),
+            ):
+                chapa.reset_client()
+                try:
+                    stats = reconcile_pending_payments(
+                        older_than_minutes=older_than,
+                        chunk_size=options["chunk_size"],
+                        concurrency=options["concurrency"],
+                        payments=seeded,
+                    )
+                finally:
+                    chapa.reset_client()
+        finally:
+            OutboxEvent.objects.filter(key__startswith=prefix).delete()
+            seeded.delete()
+
+        self.stdout.write(
+            f"checked={stats['checked']} completed={stats['completed']} failed={stats['failed']} "
+            f"pending={stats['pending']} errors={stats['errors']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {stats['checked']} payments in {stats['elapsed']:.2f}s "
+            f"({stats['per_second']:.1f} payments/sec, concurrency={options['concurrency']})"
+        ))
+
+    def seed(self, prefix, count, older_than):
+        Payment.objects.bulk_create(
+            (
+                Payment(booking_reference=f"{prefix}{i}", amount=Decimal("100.00"), chapa_tx_ref=f"{prefix}{i}-ref")
+                for i in range(count)
+            ),
+            batch_size=1000,
+        )
+        # created_at is auto_now_add, so age the rows after inserting them
+        stale = timezone.now() - timedelta(minutes=older_than + 1)
+        Payment.objects.filter(booking_reference__startswith=prefix).update(created_at=stale)
@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from listings.models import Listing
+from listings.search import parse_terms, search_listings
+
+User = get_user_model()
+
+BENCH_HOST = "bench-search-host"
+CITIES = ["Lagos", "Abuja", "Ibadan", "Kano", "Port Harcourt", "Enugu", "Calabar", "Jos", "Benin City", "Kaduna"]
+ADJECTIVES = ["Modern", "Cozy", "Luxury", "Quiet", "Sunny", "Spacious", "Charming", "Rustic", "Elegant", "Breezy"]
+FEATURES = ["Beach House", "Mountain Cabin", "City Apartment", "Garden Villa", "Lakeside Retreat", "Loft",
+            "Harbour Suite", "Country Cottage", "Studio Flat", "Penthouse"]
+STREETS = ["Allen Avenue", "Adeola Odeku", "Awolowo Road", "Herbert Macaulay Way", "Ahmadu Bello Way"]
+AMENITIES = ["pool", "gym", "parking", "generator", "wifi", "balcony", "garden", "sea view", "fireplace", "kitchen"]
+# broad queries match a tenth of the table; selective ones a handful of rows
+BROAD_QUERIES = ["beach", "lagos loft", "cozy cab", "sea view pool", "harb", "quiet garden villa", "ahmadu", "penth"]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def icontains_search(queryset, query):
+    """What ListingAdmin.search_fields did before: every term icontains any text column."""
+    condition = Q()
+    for term in parse_terms(query):
+        condition &= (
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(address__icontains=term)
+            | Q(city__icontains=term) | Q(state__icontains=term)
+        )
+    return queryset.filter(condition).order_by("-created_at", "-property_id")
+
+
+class Command(BaseCommand):
+
+    help = "Seed listings and compare full-text search latency with icontains scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=500_000)
+        parser.add_argument("--queries", type=int, default=40, help="Queries per strategy")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a previous run")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark rows afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        host, _ = User.objects.get_or_create(username=BENCH_HOST)
+
+        if not options["skip_seed"]:
+            self.seed(host, rng, options)
+
+        queryset = Listing.objects.defer("search_vector")
+        page_size = options["page_size"]
+        total = Listing.objects.filter(host_id=host).count()
+        queries = []
+        for _ in range(options["queries"]):
+            queries.append(rng.choice(BROAD_QUERIES))
+            queries.append(f"number {rng.randrange(max(total, 1))}")
+        strategies = {
+            "icontains": lambda q: icontains_search(queryset, q),
+            "full-text": lambda q: search_listings(queryset, q).order_by("-search_rank", "-property_id"),
+        }
+
+        medians = {}
+        for name, build in strategies.items():
+            # the first page is what the API serves; the count is what the admin changelist adds
+            pages, counts = self.time_queries(build, queries, page_size)
+            medians[name] = statistics.median(pages) + statistics.median(counts)
+            self.stdout.write(
+                f"{name:>10} on {connection.vendor}: page p50={statistics.median(pages):.1f}ms "
+                f"p95={self.p95(pages):.1f}ms | count p50={statistics.median(counts):.1f}ms p95={self.p95(counts):.1f}ms"
+            )
+        speedup = medians["icontains"] / medians["full-text"]
+        self.stdout.write(self.style.SUCCESS(f"full-text page+count is {speedup:.1f}x faster at the median"))
+
+        if options["cleanup"]:
+            Listing.objects.filter(host_id=host).delete()
+            host.delete()
+
+    def seed(self, host, rng, options):
+        batch_size = options["batch_size"]
+
+        def listings():
+            for i in range(options["listings"]):
+                city = rng.choice(CITIES)
+                yield Listing(
+                    listing_image="listing_images/bench.jpg",
+                    host_id=host,
+                    title=f"{rng.choice(ADJECTIVES)} {rng.choice(FEATURES)} in {city}",
+                    description="Comes with " + ", ".join(rng.sample(AMENITIES, 3)) + f". Listing number {i}.",
+                    price=Decimal(rng.randrange(20, 500)),
+                    address=f"{rng.randint(1, 400)} {rng.choice(STREETS)}",
+                    city=city,
+                    state="Bench",
+                    pricetag="per night",
+                    bedrooms=rng.randint(1, 6),
+                    bathrooms=Decimal(rng.randint(1, 4)),
+                    property_type="Apartment",
+                )
+
+        created = 0
+        started = time.perf_counter()
+        # the search index is maintained by database triggers, so bulk inserts stay searchable
+        for chunk in chunked(listings(), batch_size):
+            with transaction.atomic():
+                Listing.objects.bulk_create(chunk, batch_size=batch_size)
+            created += len(chunk)
+        self.stdout.write(f"Seeded {created} listings in {time.perf_counter() - started:.1f}s")
+
+    def p95(self, timings):
+        return statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+
+    def time_queries(self, build, queries, page_size):
+        pages, counts = [], []
+        for query in queries:
+            began = time.perf_counter()
+            list(build(query)[:page_size + 1])
+            pages.append((time.perf_counter() - began) * 1000)
+            began = time.perf_counter()
+            build(query).count()
+            counts.append((time.perf_counter() - began) * 1000)
+        return pages, counts
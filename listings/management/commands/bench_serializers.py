@@ -0,0 +1,101 @@
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from listings.models import Listing
+from listings.renderers import ORJSONRenderer
+from listings.serializers import ListingSerializer
+
+SPARSE_FIELDS = "title,price,city"
+
+
+def listings(count):
+    """Unsaved listings shaped like a seeded page, so only serialization is timed."""
+    now = timezone.now()
+    return [
+        Listing(
+            property_id=uuid.uuid4(),
+            listing_image="listing_images/bench.jpg",
+            host_id_id=1,
+            title=f"Cozy Loft number {i}",
+            description="Comes with wifi, parking and a sea view. " * 5,
+            price=Decimal("123.45"),
+            address=f"{i} Allen Avenue",
+            city="Lagos",
+            state="Lagos",
+            pricetag="per night",
+            bedrooms=2,
+            bathrooms=Decimal("1.5"),
+            property_type="Apartment",
+            latitude=6.5,
+            longitude=3.4,
+            review_count=3,
+            rating_sum=12,
+            rating_avg=4.0,
+            created_at=now,
+            updated_at=now,
+            image_variants={"webp": {"320": f"listing_images/variants/{i}_320.webp",
+                                     "640": f"listing_images/variants/{i}_640.webp"}},
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+
+    help = "Compare the time to serialize and render a page of listings with DRF's defaults and the fast read path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per path")
+        parser.add_argument("--host", default=None, help="Host for absolute image URLs (default: first ALLOWED_HOSTS)")
+
+    def handle(self, *args, **options):
+        objs = listings(options["listings"])
+        host = options["host"] or next(
+            (name for name in settings.ALLOWED_HOSTS if name and name[0] not in ".*"), "localhost"
+        )
+        factory = RequestFactory(HTTP_HOST=host)
+        full = Request(factory.get("/api/listings/"))
+        sparse = Request(factory.get("/api/listings/", {"fields": SPARSE_FIELDS}))
+
+        def drf_default():
+            # what every list endpoint did before: DRF's ListSerializer and JSONRenderer
+            context = {"request": full}
+            child = ListingSerializer(context=context)
+            data = serializers.ListSerializer(objs, child=child, context=context).data
+            return JSONRenderer().render(data)
+
+        def fast(request):
+            return lambda: ORJSONRenderer().render(ListingSerializer(objs, many=True, context={"request": request}).data)
+
+        paths = {
+            "drf default": drf_default,
+            "fast path": fast(full),
+            f"?fields={SPARSE_FIELDS}": fast(sparse),
+        }
+        per_thousand = 1000 / max(len(objs), 1)
+        medians = {}
+        for name, render in paths.items():
+            render()  # warm up
+            timings = []
+            for _ in range(options["repeat"]):
+                began = time.perf_counter()
+                body = render()
+                timings.append((time.perf_counter() - began) * 1000)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(
+                f"{name:>24}: {medians[name] * per_thousand:.1f}ms per 1000 listings "
+                f"(min {min(timings) * per_thousand:.1f}ms), {len(body) / max(len(objs), 1):.0f} bytes each"
+            )
+        speedup = medians["drf default"] / medians["fast path"]
+        self.stdout.write(self.style.SUCCESS(f"fast path is {speedup:.1f}x faster than DRF's defaults"))
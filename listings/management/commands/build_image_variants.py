@@ -0,0 +1,72 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from listings import cache, images
+from listings.models import Listing
+
+
+def render(name, overwrite):
+    """Runs in a worker process: storage work only, no database access."""
+    try:
+        return name, images.build_variants(name, overwrite=overwrite), None
+    except Exception as e:  # a bad or missing file shouldn't stop the backfill
+        return name, None, f"{type(e).__name__}: {e}"
+
+
+class Command(BaseCommand):
+
+    help = "Render resized WebP/JPEG variants for existing listing images in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--force", action="store_true",
+                            help="Re-render every image, including ones that already have variants")
+
+    def handle(self, *args, **options):
+        queryset = Listing.objects.exclude(listing_image="")
+        if not options["force"]:
+            queryset = queryset.filter(image_variants={})
+        rows = queryset.order_by("pk").values_list("pk", "listing_image")
+
+        rendered = failed = updated = 0
+        started = time.perf_counter()
+        # workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as pool:
+            last_pk = None
+            while True:
+                page = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+                batch = list(page[:options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+
+                # listings often share an image; render each file once
+                by_name = defaultdict(list)
+                for pk, name in batch:
+                    by_name[name].append(pk)
+                names = list(by_name)
+                for name, variants, error in pool.map(render, names, [options["force"]] * len(names)):
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"{name}: {error}")
+                        continue
+                    rendered += 1
+                    updated += Listing.objects.filter(pk__in=by_name[name], listing_image=name).update(
+                        image_variants=variants
+                    )
+
+        if updated:
+            cache.invalidate("listings")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} images for {updated} listings in {elapsed:.1f}s "
+            f"({rendered / elapsed if elapsed else 0:.1f} images/sec); {failed} failed."
+        ))
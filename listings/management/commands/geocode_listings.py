@@ -0,0 +1,61 @@
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from listings import cache
+from listings.geo import GAZETTEER_PATH, load_gazetteer, lookup
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+
+    help = "Fill listing latitude/longitude from a local gazetteer CSV (name,state,latitude,longitude)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gazetteer", default=str(GAZETTEER_PATH))
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--overwrite", action="store_true", help="Re-geocode listings that already have coordinates")
+
+    def handle(self, *args, **options):
+        try:
+            gazetteer = load_gazetteer(options["gazetteer"])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Can't read gazetteer {options['gazetteer']}: {e}")
+
+        batch_size = options["batch_size"]
+        queryset = Listing.objects.all()
+        if not options["overwrite"]:
+            queryset = queryset.filter(latitude__isnull=True)
+        rows = queryset.order_by("pk").values_list("pk", "city", "state")
+
+        geocoded = 0
+        unmatched = Counter()
+        last_pk = None
+        while True:
+            # seek by pk rather than holding a cursor open over rows being updated
+            page = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            # listings share a handful of places, so write one UPDATE per place per batch
+            by_place = defaultdict(list)
+            for pk, city, state in batch:
+                coords = lookup(gazetteer, city, state)
+                if coords is None:
+                    unmatched[(city, state)] += 1
+                else:
+                    by_place[coords].append(pk)
+            with transaction.atomic():
+                for (latitude, longitude), ids in by_place.items():
+                    geocoded += Listing.objects.filter(pk__in=ids).update(latitude=latitude, longitude=longitude)
+
+        # update() skips the listing signals, so drop cached /nearby/ pages ourselves
+        if geocoded:
+            cache.invalidate("listings")
+        for (city, state), count in unmatched.most_common(10):
+            self.stdout.write(self.style.WARNING(f"no gazetteer entry for {city!r}, {state!r} ({count} listings)"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {geocoded} listings; {sum(unmatched.values())} had no gazetteer match."
+        ))
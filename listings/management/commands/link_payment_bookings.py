@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from listings import payment_links
+from listings.tasks import link_payment_bookings
+
+
+class Command(BaseCommand):
+
+    help = "Link payments created before Payment.booking_id existed to the bookings their references name"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=payment_links.CHUNK_SIZE)
+        parser.add_argument("--background", action="store_true",
+                            help="Queue the backfill as a chain of Celery tasks instead of running it here")
+
+    def handle(self, *args, **options):
+        if options["background"]:
+            link_payment_bookings.delay()
+            self.stdout.write(self.style.SUCCESS("Queued the payment booking backfill."))
+            return
+
+        last_pk = None
+        linked = 0
+        while True:
+            # one short transaction per chunk, so payments keep flowing meanwhile
+            last_pk, count = payment_links.link_chunk(last_pk, options["batch_size"])
+            if last_pk is None:
+                break
+            linked += count
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} payments to their bookings."))
@@ -0,0 +1,30 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from listings import cache, occupancy
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+
+    help = "Recompute the booking calendar occupancy bitmaps of every listing from the booking table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        listing_ids = Listing.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=batch_size)
+        listings = rows = 0
+        while True:
+            batch = list(islice(listing_ids, batch_size))
+            if not batch:
+                break
+            # one transaction per batch keeps the listing locks short
+            rows += occupancy.rebuild(batch)
+            listings += len(batch)
+
+        if rows:
+            cache.invalidate("bookings")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} occupancy bitmaps for {listings} listings."))
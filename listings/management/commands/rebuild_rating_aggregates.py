@@ -0,0 +1,51 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from listings import cache
+from listings.models import Listing, Review
+
+
+class Command(BaseCommand):
+
+    help = "Recompute review_count, rating_sum and rating_avg for every listing from the review table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        stats = (
+            Review.objects.filter(property_id=OuterRef("pk"))
+            .order_by()
+            .values("property_id")
+            .annotate(count=Count("pk"), total=Sum("rating"))
+        )
+
+        listing_ids = Listing.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=batch_size)
+        updated = 0
+        while True:
+            batch = list(islice(listing_ids, batch_size))
+            if not batch:
+                break
+            # one set-based statement per batch keeps row locks short on big tables
+            with transaction.atomic():
+                Listing.objects.filter(pk__in=batch).update(
+                    review_count=Coalesce(Subquery(stats.values("count")), 0),
+                    rating_sum=Coalesce(Subquery(stats.values("total")), 0),
+                )
+                Listing.objects.filter(pk__in=batch).update(
+                    rating_avg=Case(
+                        When(review_count=0, then=Value(0.0)),
+                        default=Cast(F("rating_sum"), FloatField()) / F("review_count"),
+                        output_field=FloatField(),
+                    )
+                )
+            updated += len(batch)
+
+        if updated:
+            cache.invalidate("listings")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} listings."))
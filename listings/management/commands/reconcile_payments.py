@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings.reconciliation import reconcile_pending_payments
+
+
+class Command(BaseCommand):
+
+    help = "Verify stale Pending payments against Chapa and apply the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=settings.PAYMENT_RECONCILE_AFTER_MINUTES,
+                            help="Only payments pending for longer than this many minutes")
+        parser.add_argument("--chunk-size", type=int, default=settings.PAYMENT_RECONCILE_CHUNK_SIZE)
+        parser.add_argument("--concurrency", type=int, default=settings.PAYMENT_RECONCILE_CONCURRENCY)
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+        stats = reconcile_pending_payments(
+            older_than_minutes=options["older_than"],
+            chunk_size=options["chunk_size"],
+            concurrency=options["concurrency"],
+            limit=options["limit"],
+        )
+
+        self.stdout.write(
+            f"checked={stats['checked']} completed={stats['completed']} failed={stats['failed']} "
+            f"pending={stats['pending']} errors={stats['errors']} settled_elsewhere={stats['settled_elsewhere']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {stats['checked']} payments in {stats['elapsed']:.2f}s "
+            f"({stats['per_second']:.1f} payments/sec, concurrency={options['concurrency']})"
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings import outbox
+
+# how often a running relay deletes old published events
+PRUNE_INTERVAL = 300
+
+
+class Command(BaseCommand):
+
+    help = "Publish payment events from the outbox to Celery, in batches and in the order they were written"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_RELAY_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=settings.OUTBOX_RELAY_INTERVAL,
+                            help="Seconds to sleep when there is nothing to publish")
+        parser.add_argument("--once", action="store_true", help="Publish what is waiting, then exit")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        next_prune = 0.0
+        try:
+            while True:
+                published = outbox.relay(batch_size)
+                total += published
+                if options["once"]:
+                    if published < batch_size:
+                        break
+                    continue
+                if time.monotonic() >= next_prune:
+                    outbox.prune()
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+                if published < batch_size:
+                    # caught up, or the broker refused an event and is worth a pause
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Published {total} outbox events."))
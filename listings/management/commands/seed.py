@@ -0,0 +1,260 @@
+import random
+import time
+import uuid
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from listings.geo import load_gazetteer, lookup
+from listings.models import Listing, Review, Booking, Payment
+
+User = get_user_model()
+
+USERNAME_PREFIX = "seed-"
+TX_REF_PREFIX = "seed-"
+
+CITIES = [
+    ("Lagos", "Lagos"), ("Ikeja", "Lagos"), ("Abuja", "FCT"), ("Ibadan", "Oyo"), ("Kano", "Kano"),
+    ("Port Harcourt", "Rivers"), ("Enugu", "Enugu"), ("Calabar", "Cross River"), ("Obudu", "Cross River"),
+    ("Jos", "Plateau"), ("Benin City", "Edo"), ("Abeokuta", "Ogun"), ("Kaduna", "Kaduna"), ("Uyo", "Akwa Ibom"),
+]
+PROPERTY_TYPES = ["Apartment", "House", "Villa", "Cabin", "Studio", "Guest House", "Penthouse"]
+ADJECTIVES = ["Modern", "Cozy", "Luxury", "Quiet", "Sunny", "Spacious", "Charming", "Rustic", "Elegant"]
+FEATURES = ["Beach House", "Mountain Cabin", "City Apartment", "Garden Villa", "Lakeside Retreat", "Loft"]
+STREETS = ["Allen Avenue", "Adeola Odeku", "Awolowo Road", "Herbert Macaulay Way", "Ahmadu Bello Way"]
+COMMENTS = [
+    "Great stay, would book again.", "Clean and comfortable.", "Host was very responsive.",
+    "Location was perfect.", "A bit noisy at night.", "Exactly as described.",
+]
+PAYMENT_STATUSES = [Payment.STATUS_COMPLETED] * 8 + [Payment.STATUS_PENDING, Payment.STATUS_FAILED]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Seed the database with a reproducible dataset of hosts, guests, listings, "
+        "non-overlapping bookings, reviews and payments, streamed in chunked bulk inserts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=5)
+        parser.add_argument("--guests", type=int, default=20)
+        parser.add_argument("--listings", type=int, default=20)
+        parser.add_argument("--bookings", type=int, default=100)
+        parser.add_argument("--reviews", type=int, default=50)
+        parser.add_argument("--payments", type=int, default=None,
+                            help="Defaults to one payment per booking")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same rows")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--flush", action="store_true", help="Delete previously seeded rows first")
+
+    def handle(self, *args, **options):
+        self.seed = options["seed"]
+        self.batch_size = options["batch_size"]
+        self.start_date = date(2026, 1, 1)
+        self.gazetteer = load_gazetteer()
+        if options["payments"] is None:
+            options["payments"] = options["bookings"]
+        if options["hosts"] < 1 and options["listings"]:
+            raise CommandError("--hosts must be at least 1 to create listings")
+        if options["guests"] < 1 and (options["bookings"] or options["reviews"]):
+            raise CommandError("--guests must be at least 1 to create bookings or reviews")
+        if options["payments"] > options["bookings"]:
+            raise CommandError("--payments can't exceed --bookings (each payment belongs to a booking)")
+
+        if options["flush"]:
+            self.flush()
+        elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError("Seeded rows already exist; rerun with --flush to replace them")
+
+        started = time.perf_counter()
+        self.insert("hosts", User, self.users("host", options["hosts"]))
+        self.insert("guests", User, self.users("guest", options["guests"]))
+        # user pks are database-assigned; a compact int array is all we keep per user
+        host_ids = self.user_ids("host")
+        guest_ids = self.user_ids("guest")
+
+        self.insert("listings", Listing, self.listings(options["listings"], host_ids))
+        self.insert("bookings", Booking, self.bookings(options["listings"], options["bookings"], guest_ids))
+        self.insert("reviews", Review, self.reviews(options["listings"], options["reviews"], guest_ids))
+        self.insert("payments", Payment, self.payments(options["listings"], options["bookings"], options["payments"]))
+
+        # bulk_create skips the review signals, so derive the aggregates in one pass
+        call_command("rebuild_rating_aggregates", stdout=self.stdout)
+        # ...and the booking calendar bitmaps from the bookings
+        call_command("rebuild_occupancy", stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Seeded database in {time.perf_counter() - started:.1f}s"))
+
+    def flush(self):
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        listings = Listing.objects.filter(host_id__in=users)
+        # Letting bookings and reviews cascade from the users would load every row
+        # into memory to send its post_delete signal, so delete them first in raw
+        # pk-chunked batches. Those signals only maintain the per-listing rating
+        # and occupancy aggregates, which handle() rebuilds once after seeding.
+        self.purge(Payment.objects.filter(chapa_tx_ref__startswith=TX_REF_PREFIX))
+        for model in (Booking, Review):
+            self.purge(model.objects.filter(Q(property_id__in=listings) | Q(user_id__in=users)))
+        with transaction.atomic():
+            # listings and their occupancy bitmaps cascade from their users
+            users.delete()
+        self.stdout.write("Removed previously seeded rows.")
+
+    def purge(self, queryset):
+        """Delete queryset's rows batch_size at a time without loading them or sending signals."""
+        model = queryset.model
+        pks = queryset.order_by("pk").values_list("pk", flat=True)
+        last = None
+        while True:
+            chunk = list((pks if last is None else pks.filter(pk__gt=last))[:self.batch_size])
+            if not chunk:
+                return
+            with transaction.atomic():
+                if model is Booking:
+                    # what on_delete=SET_NULL would do for payments that outlive the flush
+                    Payment.objects.filter(booking_id__in=chunk).update(booking_id=None)
+                model.objects.filter(pk__in=chunk)._raw_delete(model.objects.db)
+            last = chunk[-1]
+
+    def insert(self, label, model, rows):
+        """Stream rows into the table in batch_size chunks, one transaction per chunk."""
+        started = time.perf_counter()
+        count = 0
+        for chunk in chunked(rows, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.batch_size)
+            count += len(chunk)
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f"{label}: {count} rows in {elapsed:.1f}s ({rate:.0f} rows/sec)")
+
+    def user_ids(self, role):
+        queryset = User.objects.filter(username__startswith=f"{USERNAME_PREFIX}{role}-").order_by("pk")
+        return array("q", queryset.values_list("pk", flat=True).iterator(chunk_size=self.batch_size))
+
+    def rng(self, kind, index):
+        return random.Random(f"{self.seed}:{kind}:{index}")
+
+    def pk(self, kind, *parts):
+        # deterministic ids let later tables reference earlier rows without keeping them in memory
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"alx-travel-seed:{self.seed}:{kind}:" + ":".join(map(str, parts)))
+
+    def users(self, role, count):
+        password = make_password(None)
+        for i in range(count):
+            yield User(
+                username=f"{USERNAME_PREFIX}{role}-{i}",
+                email=f"{role}{i}@example.com",
+                first_name=role.title(),
+                last_name=str(i),
+                password=password,
+            )
+
+    def listing_price(self, i):
+        return Decimal(self.rng("price", i).randrange(2000, 60000)) / 100
+
+    def listing_attrs(self, i, host_ids):
+        rng = self.rng("listing", i)
+        city, state = rng.choice(CITIES)
+        bedrooms = rng.randint(1, 6)
+        latitude, longitude = lookup(self.gazetteer, city, state)
+        return {
+            "property_id": self.pk("listing", i),
+            "listing_image": f"listing_images/seed-{i % 50}.jpg",
+            "host_id_id": host_ids[rng.randrange(len(host_ids))],
+            "title": f"{rng.choice(ADJECTIVES)} {rng.choice(FEATURES)} in {city}",
+            "description": f"A {bedrooms}-bedroom stay close to the heart of {city}.",
+            "price": self.listing_price(i),
+            "address": f"{rng.randint(1, 400)} {rng.choice(STREETS)}",
+            "city": city,
+            "state": state,
+            "pricetag": "per night",
+            "bedrooms": bedrooms,
+            "bathrooms": Decimal(rng.randint(2, 8)) / 2,
+            "property_type": rng.choice(PROPERTY_TYPES),
+            # scatter around the city centre (about +/- 9km) so nearby search has a spread
+            "latitude": round(latitude + rng.uniform(-0.08, 0.08), 6),
+            "longitude": round(longitude + rng.uniform(-0.08, 0.08), 6),
+        }
+
+    def listings(self, count, host_ids):
+        for i in range(count):
+            yield Listing(**self.listing_attrs(i, host_ids))
+
+    def bookings_for(self, listing_index, count):
+        """Yield (booking_id, start, end) for one listing, walking forward so stays never overlap."""
+        rng = self.rng("bookings", listing_index)
+        day = self.start_date + timedelta(days=rng.randint(0, 14))
+        for n in range(count):
+            nights = rng.randint(1, 7)
+            yield self.pk("booking", listing_index, n), day, day + timedelta(days=nights), nights
+            day += timedelta(days=nights + rng.randint(0, 10))
+
+    def per_listing(self, total, listings, listing_index):
+        return total // listings + (1 if listing_index < total % listings else 0)
+
+    def bookings(self, listing_count, total, guest_ids):
+        if not listing_count:
+            return
+        for i in range(listing_count):
+            price = self.listing_price(i)
+            rng = self.rng("booking-guests", i)
+            for booking_id, start, end, nights in self.bookings_for(i, self.per_listing(total, listing_count, i)):
+                yield Booking(
+                    booking_id=booking_id,
+                    property_id_id=self.pk("listing", i),
+                    user_id_id=guest_ids[rng.randrange(len(guest_ids))],
+                    start_date=start,
+                    end_date=end,
+                    total_price=price * nights,
+                )
+
+    def reviews(self, listing_count, total, guest_ids):
+        if not listing_count:
+            return
+        for i in range(listing_count):
+            rng = self.rng("reviews", i)
+            for _ in range(self.per_listing(total, listing_count, i)):
+                yield Review(
+                    property_id_id=self.pk("listing", i),
+                    user_id_id=guest_ids[rng.randrange(len(guest_ids))],
+                    rating=rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 5, 10, 8])[0],
+                    comment=rng.choice(COMMENTS),
+                )
+
+    def payments(self, listing_count, bookings_total, total):
+        if not listing_count:
+            return
+        produced = 0
+        for i in range(listing_count):
+            price = self.listing_price(i)
+            rng = self.rng("payments", i)
+            for booking_id, _start, _end, nights in self.bookings_for(i, self.per_listing(bookings_total, listing_count, i)):
+                if produced >= total:
+                    return
+                yield Payment(
+                    booking_id_id=booking_id,
+                    booking_reference=str(booking_id),
+                    amount=price * nights,
+                    currency="ETB",
+                    chapa_tx_ref=f"{TX_REF_PREFIX}{booking_id.hex}",
+                    status=rng.choice(PAYMENT_STATUSES),
+                )
+                produced += 1
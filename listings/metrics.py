@@ -0,0 +1,321 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request, counts the database queries it
+ran and their total time (through an execute_wrapper installed on every
+database connection as it opens), and adds
+up the time spent waiting on Chapa. Each response gets a Server-Timing
+header. Every route keeps a cumulative histogram plus a rolling window of
+recent durations for p50/p95/p99. Requests slower than SLOW_REQUEST_MS are
+logged with their slowest queries. render() formats it all, along with
+the Chapa gateway histograms, for a Prometheus scrape. Like the gateway
+histograms, everything lives in process memory, so each worker process is
+scraped as its own target.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger("listings.performance")
+
+QUANTILES = (0.5, 0.95, 0.99)
+TOP_QUERIES = 5
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram in seconds, Prometheus-style buckets."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.counts[i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            buckets = OrderedDict((str(bound), n) for bound, n in zip(self.BUCKETS, self.counts))
+            buckets["+Inf"] = self.count
+            return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+def quantile(ordered, q):
+    """Nearest-rank quantile of an already sorted sequence."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class RouteStats(LatencyHistogram):
+    """Request durations for one route, plus DB/Chapa totals and a rolling window."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, window):
+        super().__init__()
+        self.recent = deque(maxlen=window)
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.chapa_seconds = 0.0
+
+    def observe_request(self, seconds, timings):
+        self.observe(seconds)
+        with self._lock:
+            self.recent.append(seconds)
+            self.queries += timings.queries
+            self.db_seconds += timings.db_seconds
+            self.chapa_seconds += timings.chapa_seconds
+
+    def snapshot(self):
+        result = super().snapshot()
+        with self._lock:
+            recent = sorted(self.recent)
+            result.update(queries=self.queries, db_seconds=self.db_seconds, chapa_seconds=self.chapa_seconds)
+        result["quantiles"] = {str(q): quantile(recent, q) for q in QUANTILES}
+        return result
+
+
+class RequestTimings:
+    """What one request spent where."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.chapa_seconds = 0.0
+        # deliberate idling, e.g. a long-poll, which doesn't make a request slow
+        self.wait_seconds = 0.0
+        # min-heap of (seconds, sql) holding the TOP_QUERIES slowest
+        self.slowest = []
+
+    def record_query(self, sql, elapsed):
+        self.queries += 1
+        self.db_seconds += elapsed
+        if len(self.slowest) < TOP_QUERIES:
+            heapq.heappush(self.slowest, (elapsed, sql))
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def top_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def server_timing(self, seconds):
+        parts = [
+            f"app;dur={seconds * 1000:.1f}",
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.chapa_seconds:
+            parts.append(f"chapa;dur={self.chapa_seconds * 1000:.1f}")
+        if self.wait_seconds:
+            parts.append(f"wait;dur={self.wait_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = ContextVar("listings_request_timings", default=None)
+
+# (view name, method) -> RouteStats
+route_stats = {}
+_routes_lock = threading.Lock()
+
+
+def record_gateway_time(seconds):
+    """Charge Chapa time to the request being served, if any (Celery tasks have none)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.chapa_seconds += seconds
+
+
+def record_wait(seconds):
+    """Mark time the current request spent idling on purpose (left out of the slow log)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.wait_seconds += seconds
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    execute_wrapper charging each query to the request being served. It is
+    installed on every connection rather than per request because async
+    views run the ORM in sync_to_async threads, whose connections the
+    middleware on the event loop can't reach; the context variable
+    follows the request into those threads.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # connected to connection_created in ListingsConfig.ready()
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def record_request(view, method, seconds, timings):
+    key = (view, method)
+    with _routes_lock:
+        stats = route_stats.get(key)
+        if stats is None:
+            stats = route_stats[key] = RouteStats(settings.METRICS_WINDOW)
+    stats.observe_request(seconds, timings)
+
+
+def routes_snapshot():
+    with _routes_lock:
+        items = list(route_stats.items())
+    return {key: stats.snapshot() for key, stats in sorted(items)}
+
+
+def reset():
+    with _routes_lock:
+        route_stats.clear()
+
+
+class PerformanceMiddleware:
+    """
+    Outermost middleware, so its timing covers the rest of the stack. The
+    body of a streaming response is produced after it returns and is not
+    included; for those the numbers describe time to the first byte.
+    Runs natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        started = time.perf_counter()
+        with self.measure(timings):
+            response = self.get_response(request)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        started = time.perf_counter()
+        with self.measure(timings):
+            response = await self.get_response(request)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    @contextmanager
+    def measure(self, timings):
+        token = _current.set(timings)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def finish(self, request, response, timings, elapsed):
+        match = request.resolver_match
+        # view names rather than paths keep the label set bounded
+        view = match.view_name if match else "unmatched"
+        record_request(view, request.method, elapsed, timings)
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = timings.server_timing(elapsed)
+        if (elapsed - timings.wait_seconds) * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                "slow request %s %s (%s) %.0fms: %d queries in %.0fms, chapa %.0fms\n%s",
+                request.method, request.path, view, elapsed * 1000, timings.queries,
+                timings.db_seconds * 1000, timings.chapa_seconds * 1000,
+                "\n".join(f"  {seconds * 1000:.1f}ms {sql}" for seconds, sql in timings.top_queries()),
+            )
+        return response
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram(lines, name, snapshot, **labels):
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum']:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+
+
+def render(gateway=None, outbox=None):
+    """
+    Prometheus text exposition of the route stats, the given gateway
+    histograms and the given outbox relay stats (see listings.outbox.stats).
+    """
+    routes = routes_snapshot()
+    lines = [
+        "# HELP http_request_duration_seconds Request wall time by view and method.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (view, method), snapshot in routes.items():
+        _histogram(lines, "http_request_duration_seconds", snapshot, view=view, method=method)
+
+    lines += [
+        "# HELP http_request_duration_recent_seconds Request wall time quantiles over the recent window.",
+        "# TYPE http_request_duration_recent_seconds gauge",
+    ]
+    for (view, method), snapshot in routes.items():
+        for q, value in snapshot["quantiles"].items():
+            if value is not None:
+                lines.append(
+                    f"http_request_duration_recent_seconds{_labels(view=view, method=method, quantile=q)} {value:.6f}"
+                )
+
+    for name, key, help_text in [
+        ("http_request_db_queries_total", "queries", "Database queries run by requests."),
+        ("http_request_db_seconds_total", "db_seconds", "Time requests spent in database queries."),
+        ("http_request_chapa_seconds_total", "chapa_seconds", "Time requests spent waiting on Chapa."),
+    ]:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (view, method), snapshot in routes.items():
+            lines.append(f"{name}{_labels(view=view, method=method)} {snapshot[key]}")
+
+    if gateway:
+        lines += [
+            "# HELP chapa_request_duration_seconds Chapa gateway call latency by endpoint.",
+            "# TYPE chapa_request_duration_seconds histogram",
+        ]
+        for endpoint, snapshot in sorted(gateway.items()):
+            _histogram(lines, "chapa_request_duration_seconds", snapshot, endpoint=endpoint)
+
+    if outbox:
+        for name, key, help_text in [
+            ("outbox_pending_events", "pending", "Outbox events not yet relayed to the broker."),
+            ("outbox_oldest_pending_seconds", "oldest_pending_seconds", "Age of the oldest unrelayed outbox event."),
+            ("outbox_relayed_per_second", "published_per_second", "Outbox events relayed per second over the recent window."),
+        ]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {outbox[key]}"]
+        lines += [
+            "# HELP outbox_relay_lag_seconds Time from an outbox event being written to it being relayed, over the recent window.",
+            "# TYPE outbox_relay_lag_seconds gauge",
+            f"outbox_relay_lag_seconds{_labels(stat='avg')} {outbox['lag_avg_seconds']:.6f}",
+            f"outbox_relay_lag_seconds{_labels(stat='max')} {outbox['lag_max_seconds']:.6f}",
+        ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_chapa_references(apps, schema_editor):
+    """
+    Clear the values the unique constraints below would reject. Blank
+    references become NULL; of the payments sharing one, the oldest settled
+    payment (else the oldest) keeps it and the others move it into
+    metadata["duplicate_<field>"].
+    """
+    Payment = apps.get_model('listings', 'Payment')
+    for field in ('chapa_tx_id', 'chapa_tx_ref'):
+        Payment.objects.filter(**{field: ''}).update(**{field: None})
+        duplicated = list(
+            Payment.objects.filter(**{f'{field}__isnull': False})
+            .order_by().values(field).annotate(count=Count('pk')).filter(count__gt=1)
+            .values_list(field, flat=True)
+        )
+        for value in duplicated:
+            payments = list(Payment.objects.filter(**{field: value}).order_by('pk'))
+            keep = next((payment for payment in payments if payment.status != 'Pending'), payments[0])
+            for payment in payments:
+                if payment.pk == keep.pk:
+                    continue
+                payment.metadata = {**(payment.metadata or {}), f'duplicate_{field}': value}
+                setattr(payment, field, None)
+                payment.save(update_fields=[field, 'metadata'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_payment_status_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('event_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('tx_ref', models.CharField(max_length=256)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # existing duplicates would fail the unique constraints halfway through a deploy
+        migrations.RunPython(dedupe_chapa_references, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='payment',
+            name='chapa_tx_id',
+            field=models.CharField(blank=True, max_length=256, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='chapa_tx_ref',
+            field=models.CharField(blank=True, max_length=256, null=True, unique=True),
+        ),
+    ]
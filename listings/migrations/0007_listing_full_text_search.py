@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:27
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    CREATE FUNCTION listings_listing_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.address, '')), 'C') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER listings_listing_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, address, city, state ON listings_listing
+    FOR EACH ROW EXECUTE FUNCTION listings_listing_search_vector_update()
+    """,
+    # backfill existing rows through the trigger, then index
+    "UPDATE listings_listing SET title = title",
+    "CREATE INDEX listing_search_vector_idx ON listings_listing USING gin (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS listing_search_vector_idx",
+    "DROP TRIGGER IF EXISTS listings_listing_search_vector_trigger ON listings_listing",
+    "DROP FUNCTION IF EXISTS listings_listing_search_vector_update()",
+]
+
+# a frozen copy of listings.search.SQLITE_SCHEMA as of this migration
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_listing_fts USING fts5(
+        title, city, state, address, description,
+        content='listings_listing', content_rowid='rowid', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_insert AFTER INSERT ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(rowid, title, city, state, address, description)
+        VALUES (new.rowid, new.title, new.city, new.state, new.address, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_delete AFTER DELETE ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(listings_listing_fts, rowid, title, city, state, address, description)
+        VALUES ('delete', old.rowid, old.title, old.city, old.state, old.address, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_update
+    AFTER UPDATE OF title, city, state, address, description ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(listings_listing_fts, rowid, title, city, state, address, description)
+        VALUES ('delete', old.rowid, old.title, old.city, old.state, old.address, old.description);
+        INSERT INTO listings_listing_fts(rowid, title, city, state, address, description)
+        VALUES (new.rowid, new.title, new.city, new.state, new.address, new.description);
+    END
+    """,
+    # index the rows that already exist
+    "INSERT INTO listings_listing_fts(listings_listing_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_listing_fts_update",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_insert",
+    "DROP TABLE IF EXISTS listings_listing_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_webhook_dedup_and_unique_tx_refs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # other backends fall back to substring search (see listings.search)
+        # listings.search.ensure_sqlite_index() re-creates the SQLite side after
+        # any later migrate that rebuilds listings_listing
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_occupancy(apps, schema_editor):
+    # the same bit layout as listings.occupancy: bit n is night n of the year
+    Booking = apps.get_model('listings', 'Booking')
+    ListingOccupancy = apps.get_model('listings', 'ListingOccupancy')
+    bitmaps = {}
+    stays = Booking.objects.order_by().values_list('property_id', 'start_date', 'end_date')
+    for listing_id, day, end_date in stays.iterator(chunk_size=5000):
+        while day < end_date:
+            stop = min(end_date, datetime.date(day.year + 1, 1, 1))
+            key = (listing_id, day.year)
+            bitmaps[key] = bitmaps.get(key, 0) | (((1 << (stop - day).days) - 1) << (day.timetuple().tm_yday - 1))
+            day = stop
+    ListingOccupancy.objects.bulk_create(
+        [
+            ListingOccupancy(property_id_id=listing_id, year=year, nights=bits.to_bytes(46, 'little'))
+            for (listing_id, year), bits in bitmaps.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listing_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('nights', models.BinaryField(max_length=46)),
+                ('property_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('property_id', 'year'), name='occupancy_listing_year_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
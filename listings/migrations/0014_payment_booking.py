@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='booking_id',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='listings.booking'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['booking_id', 'status'], name='payment_booking_status_idx'),
+        ),
+    ]
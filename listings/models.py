@@ -1,12 +1,50 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
+from django.db.models.functions import Cast, Floor
+from django.utils import timezone
 import uuid
 
 # Create your models here.
 
+class ListingQuerySet(models.QuerySet):
+    def available_between(self, start_date, end_date):
+        """
+        Listings with no booking overlapping the [start_date, end_date) stay.
+
+        Runs as a single NOT EXISTS anti-join served by the
+        (property_id, start_date, end_date) index on Booking.
+        """
+        overlapping = Booking.objects.filter(
+            property_id=models.OuterRef('pk'),
+            start_date__lt=end_date,
+            end_date__gt=start_date,
+        )
+        return self.filter(~models.Exists(overlapping))
+
+    def apply_rating_delta(self, count_delta, sum_delta):
+        """
+        Shift the rating aggregates in a single UPDATE, computing the new
+        average from the column values the statement itself reads.
+        """
+        new_count = models.F('review_count') + count_delta
+        new_sum = models.F('rating_sum') + sum_delta
+        return self.update(
+            review_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=models.Case(
+                models.When(review_count=-count_delta, then=models.Value(0.0)),
+                default=Cast(new_sum, models.FloatField()) / new_count,
+                output_field=models.FloatField(),
+            ),
+        )
+
+
 class Listing(models.Model):
     property_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     listing_image = models.ImageField(upload_to='listing_images/')
+    # {format: {width: storage name}} of resized copies, see listings.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     host_id = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -18,9 +56,38 @@ class Listing(models.Model):
     bedrooms = models.IntegerField()
     bathrooms = models.DecimalField(max_digits=4, decimal_places=2)
     property_type = models.CharField(max_length=100)
+    # WGS84 degrees; filled from the local gazetteer by geocode_listings
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # 0.1 degree grid cell derived from the coordinates, see listings.geo
+    geo_cell = models.GeneratedField(
+        expression=(Floor(models.F('latitude') * 10) + 900) * 4000 + Floor(models.F('longitude') * 10) + 1800,
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    # denormalized from Review, kept current by listings.signals
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+    # maintained by a database trigger on PostgreSQL, see listings.search
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  
 
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # backs keyset pagination ordered by (created_at, pk)
+            models.Index(fields=['created_at', 'property_id'], name='listing_created_pk_idx'),
+            # backs ?ordering=rating / -rating keyset pagination and min_rating
+            models.Index(fields=['rating_avg', 'property_id'], name='listing_rating_pk_idx'),
+            # backs availability search filters
+            models.Index(fields=['city', 'property_type', 'price'], name='listing_city_type_price_idx'),
+            # nearby search: seek the grid cells under the bounding box, then
+            # range-check the coordinates without leaving the index
+            models.Index(fields=['geo_cell', 'latitude', 'longitude'], name='listing_geo_cell_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -33,6 +100,11 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'review_id'], name='review_created_pk_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user_id.username} for {self.property_id.title}"
 
@@ -45,9 +117,36 @@ class Booking(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'booking_id'], name='booking_created_pk_idx'),
+            # backs the date-range overlap anti-join in ListingQuerySet.available_between
+            models.Index(fields=['property_id', 'start_date', 'end_date'], name='booking_property_dates_idx'),
+        ]
+
     def __str__(self):
         return f"Booking by {self.user_id.username} for {self.property_id.title}"
 
+class ListingOccupancy(models.Model):
+    """
+    Booked nights of one listing in one calendar year as a bitmap, derived
+    from Booking and kept current by listings.occupancy. Years without a
+    booking have no row.
+    """
+    property_id = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='occupancy')
+    year = models.PositiveSmallIntegerField()
+    # bit n (least significant first) is night n of the year, 1 January being night 0
+    nights = models.BinaryField(max_length=46)
+
+    class Meta:
+        constraints = [
+            # also the index behind calendar lookups by listing and year range
+            models.UniqueConstraint(fields=['property_id', 'year'], name='occupancy_listing_year_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id_id} {self.year}"
+
 class Payment(models.Model):
     STATUS_PENDING = "Pending"
     STATUS_COMPLETED = "Completed"
@@ -58,14 +157,107 @@ class Payment(models.Model):
         (STATUS_FAILED, "Failed"),
     ]
     booking_reference = models.CharField(max_length=128, help_text="Booking reference from bookings table", db_index=True)
+    # the booking booking_reference names, when it names one (see listings.payment_links);
+    # payment_booking_status_idx leads with it, so it needs no index of its own
+    booking_id = models.ForeignKey(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='payments', db_index=False
+    )
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10, default="ETB")
-    chapa_tx_id = models.CharField(max_length=256, blank=True, null=True)
-    chapa_tx_ref = models.CharField(max_length=256, blank=True, null=True)  # tx_ref
+    chapa_tx_id = models.CharField(max_length=256, blank=True, null=True, unique=True)
+    chapa_tx_ref = models.CharField(max_length=256, blank=True, null=True, unique=True)  # tx_ref
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     metadata = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # backs the stale Pending scan in listings.reconciliation
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+            # serves the (created_at, pk) order of finance exports
+            models.Index(fields=['created_at', 'id'], name='payment_created_pk_idx'),
+            # a booking's payments by status: unpaid bookings, revenue by listing
+            models.Index(fields=['booking_id', 'status'], name='payment_booking_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.booking_reference} - {self.amount} - {self.status}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Chapa webhook deliveries already processed, keyed by a hash of the
+    payload so a replayed delivery is rejected by the primary key alone.
+    """
+    event_hash = models.CharField(max_length=64, primary_key=True)
+    tx_ref = models.CharField(max_length=256)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the retention sweep, see listings.webhooks
+            models.Index(fields=['received_at'], name='webhook_received_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tx_ref} - {self.event_hash[:12]}"
+
+
+class OutgoingEmail(models.Model):
+    """A message in one of the outgoing email queues, see listings.mail."""
+    STATUS_PENDING = "Pending"
+    STATUS_SENT = "Sent"
+    STATUS_FAILED = "Failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    queue = models.CharField(max_length=50)
+    to = models.EmailField()
+    # rendered from listings/email/<template>_subject.txt and <template>.txt
+    template = models.CharField(max_length=100)
+    context = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # also pushed forward while a drain holds the message, so no other drain sends it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the due-message scan of a drain
+            models.Index(fields=['queue', 'status', 'next_attempt_at'], name='email_queue_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.queue}: {self.template} to {self.to} - {self.status}"
+
+
+class OutboxEvent(models.Model):
+    """
+    An event written in the same transaction as the change it describes
+    and relayed to Celery afterwards, see listings.outbox.
+    """
+    # events sharing a key are delivered in the order they were written
+    key = models.CharField(max_length=128)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    # set by the consumer with its own writes, so a redelivered event is a no-op
+    handled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the relay's scan, which only ever reads the unpublished tail
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='outbox_unpublished_idx'),
+            # relay lag and throughput over the recent window, and pruning
+            models.Index(fields=['published_at'], name='outbox_published_at_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.booking_reference} - {self.amount} - {self.status}"
\ No newline at end of file
+        return f"{self.event_type} {self.key} #{self.pk}"
@@ -0,0 +1,138 @@
+"""
+Occupancy bitmaps behind the booking calendar.
+
+ListingOccupancy keeps one row per listing and calendar year holding a
+bit per night: bit n, least significant first, is set when night n of
+the year (1 January being night 0) is booked. A booking occupies the
+nights from start_date up to but not including end_date. Rows are
+recomputed from the Booking table for just the listings and years a
+write touched, under the listing lock reserve() also takes, so they can't
+drift from the bookings themselves and concurrent writers to one listing
+don't overwrite each other's bitmaps. calendar() answers any number of
+listings over a date range from the bitmaps with a single query.
+"""
+from datetime import date
+
+from django.db import transaction
+from django.db.models import FilteredRelation, Q
+
+from .models import Booking, ListingOccupancy
+from .reservations import lock_listings
+
+# 366 nights, rounded up to whole bytes
+BITMAP_BYTES = 46
+
+
+def year_slices(start, end):
+    """Split the nights of [start, end) at year boundaries into (year, first night, count)."""
+    day = start
+    while day < end:
+        stop = min(end, date(day.year + 1, 1, 1))
+        yield day.year, day.timetuple().tm_yday - 1, (stop - day).days
+        day = stop
+
+
+def add_stay(bitmaps, listing_id, start, end):
+    """OR the nights of one stay into bitmaps, a {(listing id, year): int} dict."""
+    for year, first, count in year_slices(start, end):
+        key = (listing_id, year)
+        bitmaps[key] = bitmaps.get(key, 0) | (((1 << count) - 1) << first)
+
+
+def spans(bookings):
+    """The (listing id, year) pairs the nights of these bookings fall in."""
+    pairs = set()
+    for booking in bookings:
+        if booking.start_date and booking.end_date:
+            for year, _, _ in year_slices(booking.start_date, booking.end_date):
+                pairs.add((booking.property_id_id, year))
+    return pairs
+
+
+def _stored_bitmaps(listing_ids, start=None, end=None):
+    stays = Booking.objects.filter(property_id__in=listing_ids)
+    if start is not None:
+        stays = stays.filter(start_date__lt=end, end_date__gt=start)
+    bitmaps = {}
+    for listing_id, start_date, end_date in stays.values_list("property_id", "start_date", "end_date").iterator():
+        add_stay(bitmaps, listing_id, start_date, end_date)
+    return bitmaps
+
+
+def _rows(bitmaps):
+    return [
+        ListingOccupancy(property_id_id=listing_id, year=year, nights=bits.to_bytes(BITMAP_BYTES, "little"))
+        for (listing_id, year), bits in bitmaps.items()
+        if bits
+    ]
+
+
+def refresh(pairs, locked=False):
+    """
+    Recompute the bitmaps of the given (listing id, year) pairs from the
+    bookings. Pass locked=True when reserve() already locked the listings
+    in the surrounding transaction.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    years = [year for _, year in pairs]
+    with transaction.atomic():
+        listing_ids = {listing_id for listing_id, _ in pairs}
+        if not locked:
+            # a listing deleted meanwhile takes its rows with it
+            listing_ids = set(lock_listings(listing_ids))
+        stored = _stored_bitmaps(listing_ids, date(min(years), 1, 1), date(max(years) + 1, 1, 1))
+        bitmaps = {pair: stored.get(pair, 0) for pair in pairs if pair[0] in listing_ids}
+
+        empty = Q()
+        for (listing_id, year), bits in bitmaps.items():
+            if not bits:
+                empty |= Q(property_id=listing_id, year=year)
+        if empty:
+            ListingOccupancy.objects.filter(empty).delete()
+        ListingOccupancy.objects.bulk_create(
+            _rows(bitmaps), update_conflicts=True, unique_fields=["property_id", "year"], update_fields=["nights"],
+        )
+
+
+def rebuild(listing_ids):
+    """Recompute every year of the given listings; for backfills after bulk loads."""
+    with transaction.atomic():
+        listing_ids = list(lock_listings(listing_ids))
+        ListingOccupancy.objects.filter(property_id__in=listing_ids).delete()
+        rows = _rows(_stored_bitmaps(listing_ids))
+        ListingOccupancy.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def calendar(listings, start, end):
+    """
+    {listing id: nights} for the listings in the given queryset, where
+    nights has one character per night of [start, end), "1" when booked.
+    Listings missing from the queryset are left out.
+    """
+    last_year = date.fromordinal(end.toordinal() - 1).year
+    rows = (
+        listings.order_by()
+        .annotate(stored=FilteredRelation(
+            "occupancy", condition=Q(occupancy__year__gte=start.year, occupancy__year__lte=last_year),
+        ))
+        .values_list("pk", "stored__year", "stored__nights")
+    )
+    bitmaps = {}
+    for listing_id, year, nights in rows:
+        bitmaps.setdefault(listing_id, {})
+        if year is not None:
+            bitmaps[listing_id][year] = int.from_bytes(nights, "little")
+
+    slices = list(year_slices(start, end))
+    result = {}
+    for listing_id, years in bitmaps.items():
+        parts = []
+        for year, first, count in slices:
+            bits = (years.get(year, 0) >> first) & ((1 << count) - 1)
+            # format() writes the highest bit first, the calendar runs earliest first
+            parts.append(format(bits, f"0{count}b")[::-1])
+        result[listing_id] = "".join(parts)
+    return result
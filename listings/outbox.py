@@ -0,0 +1,161 @@
+"""
+Transactional outbox for payment status events.
+
+Code that moves a Payment to Completed or Failed calls
+record_status_change() in the transaction that saves the payment, or
+lets save_status_change() do both. That writes an OutboxEvent row next
+to the update instead of publishing to the broker mid-request, so the
+event exists exactly when the change commits and a slow or unreachable
+broker can't hold up a webhook. The event is inserted after the payment
+row is updated, so the row lock orders the events of one payment by
+commit. The update must be conditional on the status it moves from (and
+the event recorded only when it matched a row), or a webhook and a
+verify racing on one payment would each emit the event.
+
+relay(), run in a loop by manage.py relay_outbox, publishes unpublished
+events oldest first to the handle_payment_event task and marks them
+published in the same transaction. Events for one booking reference
+always go to the same payment-events.<n> queue, and a publish error ends
+the batch there, so a later event never overtakes an earlier one.
+Delivery is at-least-once: an event published just before the relay
+dies is published again. handle() claims the event together with its
+own writes, which makes a redelivery a no-op.
+"""
+import logging
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from . import mail
+from .models import OutboxEvent, Payment
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = {
+    Payment.STATUS_COMPLETED: "payment.completed",
+    Payment.STATUS_FAILED: "payment.failed",
+}
+
+
+def status_event(payment, previous_status, email=None):
+    """The unsaved event for payment's move away from previous_status, or None."""
+    event_type = EVENT_TYPES.get(payment.status)
+    if event_type is None or payment.status == previous_status:
+        return None
+    payload = {
+        "payment_id": payment.pk,
+        "booking_reference": payment.booking_reference,
+        "tx_ref": payment.chapa_tx_ref,
+        "status": payment.status,
+        "previous_status": previous_status,
+        "amount": str(payment.amount),
+    }
+    if email:
+        payload["email"] = email
+    return OutboxEvent(key=payment.booking_reference, event_type=event_type, payload=payload)
+
+
+def record_status_change(payment, previous_status, email=None):
+    """Write the event for a status change; call inside the transaction that saves it."""
+    event = status_event(payment, previous_status, email)
+    if event is not None:
+        event.save()
+    return event
+
+
+def save_status_change(payment, previous_status, fields, email=None):
+    """
+    Write fields of payment, plus updated_at, if its row still has
+    previous_status, and record the event for the status change in the
+    same transaction. Returns whether the row was written; if not, payment
+    is reloaded with what the other writer saved.
+    """
+    with transaction.atomic():
+        payment.updated_at = timezone.now()
+        updated = Payment.objects.filter(pk=payment.pk, status=previous_status).update(
+            updated_at=payment.updated_at, **{name: getattr(payment, name) for name in fields}
+        )
+        if updated:
+            record_status_change(payment, previous_status, email)
+    if not updated:
+        payment.refresh_from_db(fields=[*fields, "updated_at"])
+    return bool(updated)
+
+
+def partition(key):
+    return f"payment-events.{zlib.crc32(key.encode()) % settings.OUTBOX_PARTITIONS}"
+
+
+def relay(limit):
+    """
+    Publish up to limit unpublished events in the order they were written.
+    Returns the number published; the first event the broker won't take
+    and everything after it are left for the next call.
+    """
+    from .tasks import handle_payment_event
+
+    published = []
+    with transaction.atomic():
+        # a second relay waits here instead of publishing the same events
+        batch = list(
+            OutboxEvent.objects.select_for_update()
+            .filter(published_at__isnull=True)
+            .order_by("pk")[:limit]
+        )
+        for event in batch:
+            try:
+                handle_payment_event.apply_async(
+                    (event.pk, event.event_type, event.payload), queue=partition(event.key)
+                )
+            except OperationalError:
+                logger.warning("couldn't publish outbox event %s, stopping the batch", event.pk, exc_info=True)
+                break
+            published.append(event.pk)
+        OutboxEvent.objects.filter(pk__in=published).update(published_at=timezone.now())
+    return len(published)
+
+
+def prune():
+    """Delete events published more than OUTBOX_RETENTION_HOURS ago."""
+    cutoff = timezone.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    return deleted
+
+
+def handle(event_id, event_type, payload):
+    """Apply one relayed event; returns False for a redelivery."""
+    with transaction.atomic():
+        if not OutboxEvent.objects.filter(pk=event_id, handled_at__isnull=True).update(handled_at=timezone.now()):
+            return False
+        if event_type == "payment.completed" and payload.get("email"):
+            mail.queue_payment_confirmation(payload["email"], payload["booking_reference"], payload["amount"])
+    return True
+
+
+def stats(window=None):
+    """
+    Relay backlog and, over the last window seconds, throughput and lag
+    (the time from an event being written to it being published).
+    """
+    window = window or settings.OUTBOX_METRICS_WINDOW
+    now = timezone.now()
+    pending = OutboxEvent.objects.filter(published_at__isnull=True).aggregate(
+        count=Count("pk"), oldest=Min("created_at")
+    )
+    recent = OutboxEvent.objects.filter(published_at__gte=now - timedelta(seconds=window)).aggregate(
+        count=Count("pk"),
+        avg_lag=Avg(F("published_at") - F("created_at")),
+        max_lag=Max(F("published_at") - F("created_at")),
+    )
+    return {
+        "pending": pending["count"],
+        "oldest_pending_seconds": (now - pending["oldest"]).total_seconds() if pending["oldest"] else 0.0,
+        "published_per_second": recent["count"] / window,
+        "lag_avg_seconds": recent["avg_lag"].total_seconds() if recent["avg_lag"] else 0.0,
+        "lag_max_seconds": recent["max_lag"].total_seconds() if recent["max_lag"] else 0.0,
+    }
@@ -0,0 +1,223 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset (seek) pagination ordered by (created_at, pk), newest first.
+
+    The cursor is an opaque token holding the (created_at, pk) of the row the
+    page starts after, so every page is a single indexed range scan instead of
+    an OFFSET scan, and rows inserted while a client is paging never shift
+    the results.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+    ordering_field = 'created_at'
+    # newest (largest) first; subclasses ordering nearest-first set this False
+    descending = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        pk_name = queryset.model._meta.pk.name
+        self.pk_name = pk_name
+        cursor = self.decode_cursor(request, queryset.model._meta.pk)
+
+        if cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = cursor
+
+        # Walking forwards reads in page order (newest-first by default);
+        # walking backwards reads the rows just before the cursor in the
+        # opposite order and flips them.
+        if reverse == self.descending:
+            ordering = (self.ordering_field, pk_name)
+            lookup = 'gt'
+        else:
+            ordering = ('-' + self.ordering_field, '-' + pk_name)
+            lookup = 'lt'
+
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__{lookup}': value})
+                | Q(**{self.ordering_field: value, f'{pk_name}__{lookup}': pk})
+            )
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def position_of(self, obj):
+        return getattr(obj, self.ordering_field), getattr(obj, self.pk_name)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.position_of(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.position_of(self.page[0]))
+
+    def decode_cursor(self, request, pk_field=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            value = self.parse_cursor_value(tokens['t'][0])
+            pk = tokens['p'][0]
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or not pk:
+            raise NotFound(self.invalid_cursor_message)
+        if pk_field is not None:
+            # a tampered pk would otherwise fail inside the ORM lookup
+            try:
+                pk = pk_field.to_python(pk)
+            except DjangoValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return reverse, (value, pk)
+
+    def parse_cursor_value(self, raw):
+        return parse_datetime(raw)
+
+    def format_cursor_value(self, value):
+        return value.isoformat()
+
+    def encode_cursor(self, reverse, position):
+        value, pk = position
+        tokens = {'t': self.format_cursor_value(value), 'p': str(pk)}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results per page (max {self.max_page_size}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class FloatKeysetCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over a computed float annotation. Values round-trip
+    through the cursor exactly because repr() of a float is lossless.
+    """
+
+    def parse_cursor_value(self, raw):
+        return float(raw)
+
+    def format_cursor_value(self, value):
+        return repr(value)
+
+
+class SearchRankCursorPagination(FloatKeysetCursorPagination):
+    """Relevance-ranked search results, best matches first."""
+
+    ordering_field = 'search_rank'
+
+
+class RatingCursorPagination(FloatKeysetCursorPagination):
+    """Listings by their denormalized average rating, best rated first."""
+
+    ordering_field = 'rating_avg'
+
+
+class LowestRatingCursorPagination(RatingCursorPagination):
+    """Listings by their denormalized average rating, lowest rated first."""
+
+    descending = False
+
+
+class DistanceCursorPagination(FloatKeysetCursorPagination):
+    """Proximity search results, nearest first."""
+
+    ordering_field = 'distance_km'
+    descending = False
+
+    def page_start(self, request):
+        """Distance the requested page starts after, or None when paging backwards."""
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            return 0.0
+        reverse, (distance, _pk) = cursor
+        return None if reverse else distance
@@ -0,0 +1,105 @@
+"""
+Linking payments to the bookings they pay for.
+
+Payment.booking_reference is free text supplied by the client; when it
+is a booking id, InitiateChapaPayment also sets the booking_id foreign
+key and holds the amount to the booking's total_price. Payments created
+before the key existed are linked by link_chunk(), one pk-ordered chunk
+at a time, from the link_payment_bookings task or management command.
+With the key in place, finance questions are indexed joins on
+payment_booking_status_idx instead of string matches.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from rest_framework import serializers
+
+from .models import Booking, Payment
+
+CHUNK_SIZE = 1000
+
+
+def parse_reference(reference):
+    """The booking id a booking_reference names, or None."""
+    try:
+        return uuid.UUID(str(reference))
+    except ValueError:
+        return None
+
+
+def booking_lookup(reference):
+    """The booking a booking_reference names, as a (possibly empty) queryset."""
+    booking_id = parse_reference(reference)
+    if booking_id is None:
+        return Booking.objects.none()
+    return Booking.objects.filter(pk=booking_id).only("booking_id", "total_price")
+
+
+def amount_field():
+    """A serializer field accepting what fits Payment.amount, from one cent up."""
+    column = Payment._meta.get_field("amount")
+    return serializers.DecimalField(
+        max_digits=column.max_digits, decimal_places=column.decimal_places, min_value=Decimal("0.01")
+    )
+
+
+def amount_error(amount, booking):
+    """Why amount can't pay for booking (None when it can); booking may be None."""
+    try:
+        amount = amount_field().run_validation(amount)
+    except serializers.ValidationError as e:
+        return f"amount: {' '.join(e.detail)}"
+    if booking is not None and amount != booking.total_price:
+        return f"amount must match the booking total of {booking.total_price}"
+    return None
+
+
+def link_chunk(after_pk=None, chunk_size=CHUNK_SIZE):
+    """
+    Link the next chunk_size unlinked payments after after_pk to the
+    bookings their references name. Returns the last pk looked at (None
+    once there are no more) and the number linked.
+    """
+    rows = Payment.objects.filter(booking_id__isnull=True).order_by("pk")
+    if after_pk is not None:
+        rows = rows.filter(pk__gt=after_pk)
+    batch = list(rows.values_list("pk", "booking_reference")[:chunk_size])
+    if not batch:
+        return None, 0
+
+    wanted = {pk: parse_reference(reference) for pk, reference in batch}
+    with transaction.atomic():
+        existing = set(
+            Booking.objects.filter(pk__in={booking_id for booking_id in wanted.values() if booking_id})
+            .values_list("pk", flat=True)
+        )
+        linked = [
+            Payment(pk=pk, booking_id_id=booking_id)
+            for pk, booking_id in wanted.items()
+            if booking_id in existing
+        ]
+        Payment.objects.bulk_update(linked, ["booking_id"])
+    return batch[-1][0], len(linked)
+
+
+def is_paid():
+    """A Booking filter expression: true when the booking has a Completed payment."""
+    return Exists(Payment.objects.filter(booking_id=OuterRef("pk"), status=Payment.STATUS_COMPLETED))
+
+
+def unpaid_bookings(bookings=None):
+    """The bookings (of the given queryset) without a Completed payment."""
+    bookings = Booking.objects.all() if bookings is None else bookings
+    return bookings.filter(~is_paid())
+
+
+def revenue_by_listing():
+    """Completed payments summed per listing, highest revenue first."""
+    return (
+        Payment.objects.filter(status=Payment.STATUS_COMPLETED, booking_id__isnull=False)
+        .values(listing_id=F("booking_id__property_id"))
+        .annotate(revenue=Sum("amount"), payments=Count("pk"))
+        .order_by("-revenue")
+    )
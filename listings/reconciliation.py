@@ -0,0 +1,111 @@
+"""
+Reconcile payments left Pending by a missed webhook or an abandoned verify.
+
+Stale rows are streamed from the database in chunks, each chunk is verified
+against Chapa on a bounded thread pool (the calls are pure network wait),
+and the results are written back with one bulk_update per chunk, in the
+same transaction as the outbox events for the payments that settled.
+A webhook may settle a payment while its verify call is in flight, so
+each chunk first locks the rows that are still Pending and only those
+are written and counted.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import requests
+from django.db import transaction
+from django.utils import timezone
+
+from . import chapa, outbox
+from .models import OutboxEvent, Payment
+
+
+def stale_pending_payments(older_than_minutes, payments=None):
+    cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+    payments = Payment.objects.all() if payments is None else payments
+    return (
+        payments.filter(status=Payment.STATUS_PENDING, created_at__lt=cutoff)
+        .order_by()
+        .only("id", "booking_reference", "amount", "status", "chapa_tx_ref", "chapa_tx_id", "metadata")
+    )
+
+
+def _verify(payment):
+    reference = payment.chapa_tx_ref or payment.chapa_tx_id
+    if not reference:
+        return payment, None, "payment has no Chapa reference"
+    try:
+        return payment, chapa.verify_transaction(reference), None
+    except requests.RequestException as e:
+        return payment, None, str(e)
+
+
+def _apply(results, stats):
+    """Write the verify results of the payments that are still Pending."""
+    pending = Payment.objects.filter(status=Payment.STATUS_PENDING)
+    now = timezone.now()
+    with transaction.atomic():
+        # a webhook that settles one of these now waits for this transaction,
+        # then finds the row no longer Pending
+        still_pending = set(
+            pending.select_for_update().filter(pk__in=[payment.pk for payment, _ in results])
+            .values_list("pk", flat=True)
+        )
+        changed, events = [], []
+        for payment, chapa_resp in results:
+            if payment.pk not in still_pending:
+                stats["settled_elsewhere"] += 1
+                continue
+            payment.status = chapa.status_from_verify_response(chapa_resp, Payment.STATUS_PENDING)
+            payment.metadata = chapa_resp
+            # bulk_update skips auto_now, so stamp it ourselves
+            payment.updated_at = now
+            changed.append(payment)
+            if payment.status == Payment.STATUS_COMPLETED:
+                stats["completed"] += 1
+            elif payment.status == Payment.STATUS_FAILED:
+                stats["failed"] += 1
+            else:
+                stats["pending"] += 1
+            event = outbox.status_event(payment, Payment.STATUS_PENDING)
+            if event is not None:
+                events.append(event)
+        # still conditional on Pending, for databases without row locks
+        pending.bulk_update(changed, ["status", "metadata", "updated_at"])
+        OutboxEvent.objects.bulk_create(events)
+
+
+def reconcile_pending_payments(older_than_minutes=15, chunk_size=200, concurrency=8, limit=None, payments=None):
+    """
+    Verify every stale Pending payment (of the payments queryset, if
+    given) and apply the results.
+    Returns a dict of counters plus elapsed seconds and payments/sec.
+    """
+    stats = {"checked": 0, "completed": 0, "failed": 0, "pending": 0, "errors": 0, "settled_elsewhere": 0}
+    started = time.perf_counter()
+
+    payments = stale_pending_payments(older_than_minutes, payments).iterator(chunk_size=chunk_size)
+    if limit is not None:
+        payments = islice(payments, limit)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            chunk = list(islice(payments, chunk_size))
+            if not chunk:
+                break
+
+            results = []
+            for payment, chapa_resp, error in pool.map(_verify, chunk):
+                stats["checked"] += 1
+                if error is not None:
+                    stats["errors"] += 1
+                    continue
+                results.append((payment, chapa_resp))
+            if results:
+                _apply(results, stats)
+
+    stats["elapsed"] = time.perf_counter() - started
+    stats["per_second"] = stats["checked"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    return stats
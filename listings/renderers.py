@@ -0,0 +1,46 @@
+"""
+JSON rendering with orjson.
+
+ORJSONRenderer produces the same documents as DRF's JSONRenderer (Decimal
+as its string, datetimes as ISO 8601, lazy translation strings as text)
+in a fraction of the time: orjson encodes the dicts, lists, strings and
+numbers that make up a serialized page natively, and only the rare other
+types go through DRF's JSONEncoder.default. Output is compact UTF-8,
+indented when the client asks for it (the browsable API does).
+"""
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback = JSONEncoder().default
+
+
+def dumps(data, option=0):
+    """data as JSON bytes; option takes orjson.OPT_* flags."""
+    # datetimes go through DRF's encoder too, which writes UTC as "Z"
+    return orjson.dumps(data, default=_fallback, option=option | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return dumps(data, orjson.OPT_INDENT_2)
+        return dumps(data)
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        if accepted_media_type:
+            # the same "; indent=4" media type parameter JSONRenderer honours
+            for part in accepted_media_type.split(";")[1:]:
+                key, _, value = part.partition("=")
+                if key.strip() == "indent":
+                    try:
+                        return max(min(int(value), 8), 0)
+                    except ValueError:
+                        pass
+        return renderer_context.get("indent", None)
@@ -0,0 +1,116 @@
+"""
+Primary/replica database routing.
+
+"default" is the primary and the aliases in DATABASE_REPLICAS (built from
+DATABASE_REPLICA_URLS) are read replicas. Every query goes to the primary
+except reads made inside replica_reads(), which go to one replica chosen
+at random as the block is entered, unless the model is listed in
+PRIMARY_ONLY_MODELS/APPS. Replicas lag by different amounts, so every
+read of a request (its page, related rows, cursor) uses the same one. The
+listing and review viewsets enter replica_reads() for safe requests (see
+ReplicaReadMixin); payment and booking code never does.
+
+Replicas lag the primary, so a client reading right after its own write
+could miss it. ReplicaPinMiddleware sets a signed cookie on the response
+to every successful unsafe request, and while that cookie is younger than
+REPLICA_PIN_SECONDS the client's reads stay on the primary. Response
+cache misses for data written within that window are built from the
+primary too (see listings.cache), so other clients can't cache a stale
+replica read under the new generation.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = "db_pin"
+PIN_SALT = "listings.replicas.pin"
+# payment state is never read stale; auth and sessions are read on every request
+PRIMARY_ONLY_MODELS = {"listings.payment", "listings.webhookevent", "listings.outboxevent", "listings.outgoingemail"}
+PRIMARY_ONLY_APPS = {"auth", "sessions", "contenttypes", "admin"}
+
+# the replica alias reads in the current block go to, or None for the primary
+_replica = ContextVar("replica", default=None)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Send reads in this block to one replica (with enabled=False, back to the primary)."""
+    alias = random.choice(settings.DATABASE_REPLICAS) if enabled and settings.DATABASE_REPLICAS else None
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def reading_from_replicas():
+    return _replica.get() is not None
+
+
+def is_pinned(request):
+    """Whether the client wrote within the last REPLICA_PIN_SECONDS."""
+    value = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_SALT, max_age=settings.REPLICA_PIN_SECONDS)
+    return value is not None
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None:
+            return "default"
+        if model._meta.label_lower in PRIMARY_ONLY_MODELS or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return "default"
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    """View mixin serving safe requests from the replicas, unless the client is pinned."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS or is_pinned(request):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins a client that just wrote to the primary for REPLICA_PIN_SECONDS.
+    Runs natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_signed_cookie(
+                PIN_COOKIE, "1", salt=PIN_SALT, max_age=settings.REPLICA_PIN_SECONDS,
+                secure=request.is_secure(), httponly=True, samesite="Lax",
+            )
+        return response
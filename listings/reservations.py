@@ -0,0 +1,68 @@
+"""
+Double-booking prevention for every path that writes bookings.
+
+reserve() must run inside transaction.atomic(). It locks the listings
+involved, checks the candidate bookings against stored bookings and each
+other, and prices them from Listing.price, all in the same transaction as
+the write that follows. Listings are locked in pk order so concurrent
+batches touching several listings can't deadlock.
+"""
+from django.db import connection
+from django.db.models import F
+
+from .models import Listing, Booking
+
+OVERLAP_MESSAGE = "Listing is already booked for some of these dates."
+
+
+def lock_listings(listing_ids):
+    """Lock the listing rows until the surrounding transaction ends; returns {pk: Listing}."""
+    listing_ids = sorted(set(listing_ids))
+    if connection.features.has_select_for_update:
+        queryset = Listing.objects.select_for_update().filter(pk__in=listing_ids).order_by("pk")
+        return {listing.pk: listing for listing in queryset}
+
+    # SQLite has no row locks: a no-op UPDATE takes the database write lock
+    # up front, so a concurrent booking waits here instead of racing the check
+    Listing.objects.filter(pk__in=listing_ids).update(price=F("price"))
+    return Listing.objects.in_bulk(listing_ids)
+
+
+def reserve(bookings):
+    """
+    Validate and price unsaved or edited Booking objects.
+    Returns {index: message} for the ones that can't be booked.
+    """
+    errors = {}
+    if not bookings:
+        return errors
+    listings = lock_listings(booking.property_id_id for booking in bookings)
+
+    # one query for every stored stay that could clash with the batch
+    window_start = min(booking.start_date for booking in bookings)
+    window_end = max(booking.end_date for booking in bookings)
+    own_ids = [booking.pk for booking in bookings if not booking._state.adding]
+    taken = {}
+    stored = (
+        Booking.objects.filter(
+            property_id__in=listings.keys(), start_date__lt=window_end, end_date__gt=window_start
+        )
+        .exclude(pk__in=own_ids)
+        .values_list("property_id", "start_date", "end_date")
+    )
+    for listing_id, start, end in stored:
+        taken.setdefault(listing_id, []).append((start, end))
+
+    for index, booking in enumerate(bookings):
+        listing = listings.get(booking.property_id_id)
+        if listing is None:
+            errors[index] = "Listing does not exist."
+            continue
+        stays = taken.setdefault(listing.pk, [])
+        if any(start < booking.end_date and end > booking.start_date for start, end in stays):
+            errors[index] = OVERLAP_MESSAGE
+            continue
+        # later rows in the same batch must not overlap this one either
+        stays.append((booking.start_date, booking.end_date))
+        booking.total_price = listing.price * (booking.end_date - booking.start_date).days
+    return errors
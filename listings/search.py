@@ -0,0 +1,145 @@
+"""
+Full-text listing search.
+
+On PostgreSQL, Listing.search_vector holds a weighted tsvector that a
+trigger keeps current on every insert and on updates touching the text
+columns (migration 0007), backed by a GIN index. On SQLite an FTS5
+external-content table (listings_listing_fts) mirrors the same columns
+through triggers, installed by migration 0007 and re-installed by
+ensure_sqlite_index(). Both paths match every term as a prefix and rank by
+relevance with the title weighted highest, so bulk_create/bulk_update and
+raw SQL writes stay indexed without going through model signals.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "listings_listing_fts"
+# column order of the FTS5 table; bm25() weights follow the same order
+FTS_COLUMNS = ("title", "city", "state", "address", "description")
+FTS_WEIGHTS = (10.0, 4.0, 4.0, 2.0, 1.0)
+
+# Postgres weight classes: A title, B city/state, C address, D description
+SEARCH_CONFIG = "simple"
+
+MAX_TERMS = 8
+
+SQLITE_TRIGGERS = ("listings_listing_fts_insert", "listings_listing_fts_delete", "listings_listing_fts_update")
+SQLITE_SCHEMA = [
+    # external content: the FTS table indexes listings_listing's rows by rowid
+    # without storing a second copy of the text
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {", ".join(FTS_COLUMNS)},
+        content='listings_listing', content_rowid='rowid', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_insert AFTER INSERT ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.rowid, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_delete AFTER DELETE ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.rowid, {", ".join("old." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_update
+    AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON listings_listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', old.rowid, {", ".join("old." + c for c in FTS_COLUMNS)});
+        INSERT INTO {FTS_TABLE}(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (new.rowid, {", ".join("new." + c for c in FTS_COLUMNS)});
+    END
+    """,
+]
+
+
+def parse_terms(query):
+    """Split free text into lowercase word terms; punctuation never reaches the engine."""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+def search_listings(queryset, query):
+    """
+    Filter a Listing queryset to rows matching every term of query (as a
+    prefix) and annotate search_rank, higher meaning more relevant.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        tsquery = SearchQuery(" & ".join(f"{term}:*" for term in terms), config=SEARCH_CONFIG, search_type="raw")
+        return queryset.filter(search_vector=tsquery).annotate(
+            search_rank=SearchRank(F("search_vector"), tsquery)
+        )
+    if vendor == "sqlite":
+        return _search_fts5(queryset, terms)
+
+    # no full-text index on this backend; fall back to substring matching
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(address__icontains=term)
+            | Q(city__icontains=term) | Q(state__icontains=term)
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _search_fts5(queryset, terms):
+    table = queryset.model._meta.db_table
+    match = " ".join(f'"{term}"*' for term in terms)
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    # The rowid IN (...) filter lets FTS5 find the matches from its doclists,
+    # so only matching rows are ranked. bm25() is lower-is-better; negate it
+    # so every backend ranks descending.
+    matches = RawSQL(
+        f'"{table}".rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+        (match,), output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{table}".rowid',
+        (match,), output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank)
+
+
+def ensure_sqlite_index(connection):
+    """
+    Install the FTS5 table and triggers if any are missing and rebuild the
+    index from listings_listing. SQLite drops a table's triggers (and may
+    renumber its rowids) whenever Django remakes it for an ALTER, so this
+    also runs after every migrate. Returns True if it had to rebuild.
+    """
+    if connection.vendor != "sqlite" or "listings_listing" not in connection.introspection.table_names():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'listings_listing'"
+        )
+        if set(SQLITE_TRIGGERS) <= {row[0] for row in cursor.fetchall()}:
+            return False
+        for sql in SQLITE_SCHEMA:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def rebuild_index(using="default"):
+    """Recompute the search index for every listing, e.g. after a SQLite VACUUM renumbers rowids."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # a no-op write to a watched column fires the search_vector trigger
+            cursor.execute("UPDATE listings_listing SET title = title")
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
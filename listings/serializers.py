@@ -1,23 +1,485 @@
-from rest_framework import serializers
+import decimal
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from . import images, occupancy, reservations
 from .models import Listing, Review, Booking , Payment
 
-class ListingSerializer(serializers.ModelSerializer):
+
+def requested_fields(request):
+    """The names in a GET request's ?fields=a,b,c sparse fieldset, or None for every field."""
+    if request is None or request.method != "GET":
+        return None
+    raw = request.query_params.get("fields")
+    names = {name.strip() for name in (raw or "").split(",") if name.strip()}
+    # ?fields=, or ?fields=%20 names nothing; treat it like no ?fields at all.
+    return names or None
+
+
+class SparseFieldsMixin:
+    """Serializer mixin that drops the fields a GET request's ?fields= leaves out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get("request"))
+        if wanted is None:
+            return
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({"fields": [f"unknown field(s): {', '.join(sorted(unknown))}"]})
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or not coerce_to_string or field.localize or field.normalize_output:
+        return None
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return "{:f}".format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if not isinstance(output_format, str) or output_format.lower() != ISO_8601:
+        return None
+    tz = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+
+    def convert(value):
+        if tz is None or not isinstance(value, datetime) or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def _date_converter(field):
+    output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+    if not isinstance(output_format, str) or output_format.lower() != ISO_8601:
+        return None
+
+    def convert(value):
+        if type(value) is not date:
+            return field.to_representation(value)
+        return value.isoformat()
+    return convert
+
+
+def _fast_converter(field):
+    """A cheaper equivalent of field.to_representation for a plain column value, or None."""
+    if isinstance(field, serializers.UUIDField):
+        return str if field.uuid_format == "hex_verbose" else None
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        return _date_converter(field)
+    return None
+
+
+def _identity(value):
+    return value
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _foreign_key_column(model, name):
+    field = _model_field(model, name)
+    if field is None or not field.concrete or not (field.many_to_one or field.one_to_one):
+        return None
+    return field.attname
+
+
+def media_url_builder(request, storage=default_storage):
+    """
+    name -> URL of a stored file, absolute when there is a request: what
+    request.build_absolute_uri(storage.url(name)) returns. For files on
+    the local filesystem the prefix is resolved once instead of per URL.
+    """
+    if isinstance(storage, FileSystemStorage) and storage.base_url is not None:
+        prefix = request.build_absolute_uri(storage.base_url) if request else storage.base_url
+        return lambda name: prefix + filepath_to_uri(name).lstrip("/")
+
+    def build_url(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+    return build_url
+
+
+def _file_converter(field, model_field):
+    if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+        return None
+    build_url = media_url_builder(field.context.get("request"), model_field.storage)
+    return lambda value: build_url(value.name) if value else None
+
+
+def read_steps(serializer):
+    """
+    (name, getter, converter) for each readable field of serializer:
+    a plain attribute read and a fast converter where the field is a
+    column of a common type, else the field's own methods.
+    """
+    model = serializer.Meta.model
+    steps = []
+    for field in serializer._readable_fields:
+        getter, convert = field.get_attribute, field.to_representation
+        if field.source != "*" and len(field.source_attrs) == 1:
+            source = field.source_attrs[0]
+            model_field = _model_field(model, source)
+            column = _foreign_key_column(model, source)
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None and column:
+                # the raw foreign key column, without loading the related row
+                getter, convert = attrgetter(column), _identity
+            elif isinstance(field, serializers.FileField) and isinstance(model_field, models.FileField):
+                fast = _file_converter(field, model_field)
+                if fast is not None:
+                    getter, convert = attrgetter(source), fast
+            else:
+                fast = _fast_converter(field)
+                if fast is not None:
+                    getter, convert = attrgetter(source), fast
+        steps.append((field.field_name, getter, convert))
+    return steps
+
+
+class ReadOptimizedListSerializer(serializers.ListSerializer):
+    """
+    many=True serializer with a cheaper read path for large pages: the
+    child's fields are compiled once per serializer by read_steps(), then
+    each row is one dict comprehension instead of DRF's per-field
+    get_attribute/to_representation dispatch. The output is the same.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        steps = read_steps(self.child)
+        return [
+            {name: None if (value := get(item)) is None else convert(value) for name, get, convert in steps}
+            for item in iterable
+        ]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves pks from the objects BulkListSerializer fetched for the whole
+    batch, so validating N rows costs one query per related model, not N.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = getattr(self.parent, "prefetched_related", {}).get(self.field_name)
+        if prefetched is not None and str(data) in prefetched:
+            return prefetched[str(data)]
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(ReadOptimizedListSerializer):
+    """
+    many=True serializer that writes a validated batch with bulk_create, or
+    with bulk_update when constructed with a {str(pk): instance} mapping.
+    """
+
+    def to_internal_value(self, data):
+        self.child.prefetched_related = self.prefetch_related_objects(data)
+        self.validated_instances = []
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.prefetched_related = {}
+
+    def prefetch_related_objects(self, data):
+        if not isinstance(data, list):
+            return {}
+        related = {}
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pk_field = queryset.model._meta.pk
+            ids = set()
+            for item in data:
+                if not isinstance(item, Mapping) or item.get(name) in (None, ""):
+                    continue
+                try:
+                    ids.add(pk_field.to_python(item[name]))
+                except (DjangoValidationError, TypeError, ValueError):
+                    # left for the field itself to report
+                    continue
+            related[name] = {str(pk): obj for pk, obj in queryset.in_bulk(ids).items()}
+        return related
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+
+        pk_field = self.child.Meta.model._meta.pk
+        pk_name = pk_field.name
+        instance = None
+        if isinstance(data, Mapping):
+            # the mapping is keyed by the canonical str(pk), e.g. lower-case hyphenated UUIDs
+            try:
+                instance = self.instance.get(str(pk_field.to_python(data.get(pk_name))))
+            except (DjangoValidationError, TypeError, ValueError):
+                pass
+        if instance is None:
+            raise serializers.ValidationError({pk_name: ["Object does not exist."]})
+        self.child.instance = instance
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        self.validated_instances.append(instance)
+        return validated
+
+    # extra columns prepare_objects() may change, written by bulk_update
+    prepared_fields = ()
+
+    def prepare_objects(self, objs):
+        """Hook run inside the write transaction before the bulk write."""
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = [model(**attrs) for attrs in validated_data]
+        self.prepare_objects(objs)
+        return model.objects.bulk_create(objs, batch_size=500)
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        fields = set()
+        objs = []
+        for obj, attrs in zip(self.validated_instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+            fields.update(attrs)
+            objs.append(obj)
+        # bulk_update skips auto_now, so refresh those columns explicitly
+        for field in model._meta.concrete_fields:
+            if getattr(field, "auto_now", False):
+                for obj in objs:
+                    setattr(obj, field.attname, field.pre_save(obj, add=False))
+                fields.add(field.name)
+        if objs:
+            self.prepare_objects(objs)
+            fields.update(self.prepared_fields)
+        if objs and fields:
+            model.objects.bulk_update(objs, sorted(fields), batch_size=500)
+        return objs
+
+
+class ListingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    # resized WebP/JPEG copies of listing_image, empty until they are rendered
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Listing
-        fields = '__all__'
+        exclude = ('search_vector', 'geo_cell', 'image_variants')
+        read_only_fields = ('review_count', 'rating_sum', 'rating_avg')
+        list_serializer_class = BulkListSerializer
+
+    _build_url = None
+
+    def get_image_srcset(self, obj):
+        # one builder per serializer, so a page resolves the media prefix once
+        if self._build_url is None:
+            self._build_url = media_url_builder(self.context.get('request'))
+        return images.srcset(obj.image_variants, self._build_url)
+
+
+class ListingImportSerializer(ListingSerializer):
+    # bulk imports are JSON, so images are referenced by their storage path
+    listing_image = serializers.CharField(max_length=100)
+
+
+class ListingQuerySerializer(serializers.Serializer):
+    """Validates the rating filter and ordering query params of the listing endpoints."""
+    # rejects nan and inf, which would otherwise filter out every row
+    min_rating = serializers.FloatField(min_value=0, max_value=5, required=False)
+    ordering = serializers.ChoiceField(choices=("-rating", "rating"), required=False)
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    """Validates query params for the listing availability search."""
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    city = serializers.CharField(required=False)
+    state = serializers.CharField(required=False)
+    property_type = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    min_bedrooms = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if attrs["end_date"] <= attrs["start_date"]:
+            raise serializers.ValidationError("end_date must be after start_date")
+        return attrs
+
+
+class NearbySearchSerializer(serializers.Serializer):
+    """Validates query params for the nearby listings search."""
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0.01, default=10)
+
+    def validate_radius_km(self, value):
+        if value > settings.NEARBY_MAX_RADIUS_KM:
+            raise serializers.ValidationError(f"radius_km can be at most {settings.NEARBY_MAX_RADIUS_KM:g}")
+        return value
+
+
+class CalendarRangeSerializer(serializers.Serializer):
+    """Validates the [start_date, end_date) range of a booking calendar; defaults to the current month."""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
 
-class ReviewSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        start = attrs.setdefault("start_date", timezone.localdate().replace(day=1))
+        if "end_date" not in attrs:
+            attrs["end_date"] = (start.replace(day=1) + timedelta(days=31)).replace(day=1)
+        days = (attrs["end_date"] - start).days
+        if days <= 0:
+            raise serializers.ValidationError("end_date must be after start_date")
+        if days > settings.CALENDAR_MAX_DAYS:
+            raise serializers.ValidationError(f"the calendar can span at most {settings.CALENDAR_MAX_DAYS} days")
+        return attrs
+
+
+class CalendarBatchSerializer(CalendarRangeSerializer):
+    """A calendar range for many listings at once."""
+    listings = serializers.ListField(
+        child=serializers.UUIDField(), min_length=1, max_length=settings.CALENDAR_MAX_LISTINGS,
+    )
+
+
+class PaymentStatusQuerySerializer(serializers.Serializer):
+    """Query params of the payment status long-poll."""
+    wait = serializers.FloatField(min_value=0, required=False, default=0)
+    # naive timestamps are read in the current timezone, like every other API datetime
+    updated_after = serializers.DateTimeField(required=False)
+
+
+class ExportFilterSerializer(serializers.Serializer):
+    """Validates the filters of a booking/payment export; pass statuses= the kind allows."""
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    status = serializers.CharField(required=False)
+
+    def validate_status(self, value):
+        statuses = self.context.get("statuses", ())
+        if value not in statuses:
+            allowed = ", ".join(statuses) or "none for this export"
+            raise serializers.ValidationError(f"status must be one of: {allowed}")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get("since") and attrs.get("until") and attrs["until"] <= attrs["since"]:
+            raise serializers.ValidationError("until must be after since")
+        return attrs
+
+
+class NearbyListingSerializer(ListingSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
+        list_serializer_class = ReadOptimizedListSerializer
+
+class BookingBulkListSerializer(BulkListSerializer):
+    prepared_fields = ("total_price",)
+
+    def prepare_objects(self, objs):
+        errors = reservations.reserve(objs)
+        if errors:
+            raise serializers.ValidationError({index: [message] for index, message in errors.items()})
+
+    # bulk writes skip the model signals that keep the occupancy bitmaps current
+    def create(self, validated_data):
+        objs = super().create(validated_data)
+        occupancy.refresh(occupancy.spans(objs), locked=True)
+        return objs
+
+    def update(self, instances, validated_data):
+        # the nights the bookings held before this edit
+        previous = occupancy.spans(self.validated_instances)
+        objs = super().update(instances, validated_data)
+        occupancy.refresh(previous | occupancy.spans(objs), locked=True)
+        return objs
+
+
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    total_price is always computed from Listing.price x nights, under a lock
+    on the listing that also rules out overlapping bookings.
+    """
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
-class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
+        read_only_fields = ('total_price',)
+        list_serializer_class = BookingBulkListSerializer
+
+    def validate(self, attrs):
+        start_date = attrs.get("start_date", getattr(self.instance, "start_date", None))
+        end_date = attrs.get("end_date", getattr(self.instance, "end_date", None))
+        if start_date and end_date and end_date <= start_date:
+            raise serializers.ValidationError("end_date must be after start_date")
+        return attrs
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            booking = Booking(**validated_data)
+            self.reserve(booking)
+            booking.save(force_insert=True)
+        return booking
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            self.reserve(instance)
+            instance.save()
+        return instance
+
+    def reserve(self, booking):
+        errors = reservations.reserve([booking])
+        if errors:
+            raise serializers.ValidationError({"non_field_errors": list(errors.values())})
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = "__all__"
-        read_only_fields = ("chapa_tx_id", "chapa_tx_ref", "status", "created_at", "updated_at")
\ No newline at end of file
+        read_only_fields = ("booking_id", "chapa_tx_id", "chapa_tx_ref", "status", "created_at", "updated_at")
\ No newline at end of file
@@ -0,0 +1,107 @@
+from django.db import connections, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import cache, occupancy, search
+from .models import Listing, Review, Booking
+from .tasks import generate_listing_image_variants
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    # stash what the row looked like before an edit so post_save can apply a delta
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list("property_id", "rating").first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if created or previous is None:
+        Listing.objects.filter(pk=instance.property_id_id).apply_rating_delta(1, instance.rating)
+        return
+
+    old_listing_id, old_rating = previous
+    if old_listing_id != instance.property_id_id:
+        Listing.objects.filter(pk=old_listing_id).apply_rating_delta(-1, -old_rating)
+        Listing.objects.filter(pk=instance.property_id_id).apply_rating_delta(1, instance.rating)
+    elif old_rating != instance.rating:
+        Listing.objects.filter(pk=instance.property_id_id).apply_rating_delta(0, instance.rating - old_rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    Listing.objects.filter(pk=instance.property_id_id).apply_rating_delta(-1, -instance.rating)
+
+
+@receiver(pre_save, sender=Listing)
+def detect_image_upload(sender, instance, **kwargs):
+    # a freshly uploaded file is still uncommitted until FileField.pre_save stores it;
+    # assigning an existing storage path (bulk import, fixtures) doesn't count
+    image = instance.listing_image
+    instance._image_uploaded = bool(image) and not image._committed
+    if instance._image_uploaded:
+        # variants of the previous image must not be served for the new one
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=Listing)
+def queue_image_variants(sender, instance, **kwargs):
+    if getattr(instance, "_image_uploaded", False):
+        instance._image_uploaded = False
+        listing_id = str(instance.pk)
+        transaction.on_commit(lambda: generate_listing_image_variants.delay(listing_id))
+
+
+# cached listing responses include the rating aggregates, so review writes count too
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_listing_cache(sender, **kwargs):
+    cache.invalidate_on_commit("listings")
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_availability_cache(sender, **kwargs):
+    cache.invalidate_on_commit("bookings")
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_stay(sender, instance, **kwargs):
+    # nights a moved booking gives up have to be cleared from its old bitmaps
+    instance._previous_stay = set()
+    if not instance._state.adding:
+        previous = Booking.objects.filter(pk=instance.pk).only("property_id", "start_date", "end_date").first()
+        if previous is not None:
+            instance._previous_stay = occupancy.spans([previous])
+
+
+@receiver(post_save, sender=Booking)
+def update_occupancy_on_save(sender, instance, **kwargs):
+    occupancy.refresh(occupancy.spans([instance]) | getattr(instance, "_previous_stay", set()))
+
+
+@receiver(post_delete, sender=Booking)
+def update_occupancy_on_delete(sender, instance, origin=None, **kwargs):
+    # a deleted listing's occupancy rows go with it
+    if isinstance(origin, Listing) or getattr(origin, "model", None) is Listing:
+        return
+    pairs = occupancy.spans([instance])
+    if origin is not None and origin is not instance:
+        # a cascade or queryset delete removes every row before the first
+        # post_delete, so each listing-year only needs recomputing once
+        done = getattr(origin, "_occupancy_refreshed", set())
+        pairs -= done
+        done |= pairs
+        origin._occupancy_refreshed = done
+    occupancy.refresh(pairs)
+
+
+def ensure_search_index(sender, using="default", **kwargs):
+    # connected to post_migrate in ListingsConfig.ready()
+    search.ensure_sqlite_index(connections[using])
@@ -1,11 +1,94 @@
 from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
+import requests
+
+from . import cache, chapa, images, mail, outbox, payment_links, reconciliation, webhooks
+from .models import Listing, Payment
 
 @shared_task
 def send_payment_confirmation_email(to_email, booking_reference, amount):
-    subject = f"Payment received for booking {booking_reference}"
-    message = f"Thank you. We received your payment of {amount} for booking {booking_reference}."
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [to_email])
-    return True
\ No newline at end of file
+    """Queue the confirmation; drain_email_queue sends it with the rest of its batch."""
+    mail.queue_payment_confirmation(to_email, booking_reference, amount)
+    return True
+
+
+@shared_task(ignore_result=True)
+def drain_email_queue(queue):
+    """Send a batch of one email queue over a single SMTP connection (routed to the "email" queue)."""
+    _, _, next_in = mail.drain(queue)
+    if next_in == 0:
+        # a full batch went out and more are due; retries later on are picked up by beat
+        drain_email_queue.apply_async((queue,))
+
+
+@shared_task(ignore_result=True)
+def handle_payment_event(event_id, event_type, payload):
+    """Consume a payment event from the outbox (published by manage.py relay_outbox to payment-events.<n>)."""
+    outbox.handle(event_id, event_type, payload)
+
+
+@shared_task(ignore_result=True)
+def initialize_chapa_payment(payment_id, payload):
+    """Call Chapa initialize for a Pending payment created by InitiateChapaPayment."""
+    try:
+        payment = Payment.objects.get(pk=payment_id)
+    except Payment.DoesNotExist:
+        return
+    try:
+        chapa.initialize_payment(payment, payload)
+    except requests.RequestException:
+        # already recorded on the payment as Failed; the client sees it when polling
+        pass
+
+
+@shared_task(ignore_result=True)
+def verify_chapa_payment(payment_id):
+    """Verify a payment against Chapa and store the result on the row."""
+    try:
+        payment = Payment.objects.get(pk=payment_id)
+    except Payment.DoesNotExist:
+        return
+    reference = payment.chapa_tx_ref or payment.chapa_tx_id
+    try:
+        chapa_resp = chapa.verify_transaction(reference)
+    except requests.RequestException as e:
+        payment.metadata = {**(payment.metadata or {}), "verify_error": str(e)}
+        payment.save(update_fields=["metadata", "updated_at"])
+        return
+    chapa.apply_verify_response(payment, chapa_resp)
+
+
+@shared_task(ignore_result=True)
+def reconcile_pending_payments():
+    """Periodic (celery beat) sweep of payments stuck in Pending."""
+    return reconciliation.reconcile_pending_payments(
+        older_than_minutes=settings.PAYMENT_RECONCILE_AFTER_MINUTES,
+        chunk_size=settings.PAYMENT_RECONCILE_CHUNK_SIZE,
+        concurrency=settings.PAYMENT_RECONCILE_CONCURRENCY,
+    )
+
+
+@shared_task(ignore_result=True)
+def prune_webhook_events():
+    """Periodic (celery beat) sweep of webhook deliveries past their retention."""
+    return webhooks.prune()
+
+
+@shared_task(ignore_result=True)
+def link_payment_bookings(after_pk=None):
+    """Backfill Payment.booking_id one chunk at a time, each chunk queuing the next."""
+    last_pk, _ = payment_links.link_chunk(after_pk)
+    if last_pk is not None:
+        link_payment_bookings.delay(last_pk)
+
+
+@shared_task(ignore_result=True)
+def generate_listing_image_variants(listing_id):
+    """Render the resized WebP/JPEG variants of a listing's uploaded image."""
+    name = Listing.objects.filter(pk=listing_id).values_list("listing_image", flat=True).first()
+    if not name:
+        return
+    variants = images.build_variants(name)
+    # only record them if the image wasn't replaced while we were rendering
+    if Listing.objects.filter(pk=listing_id, listing_image=name).update(image_variants=variants):
+        cache.invalidate("listings")
@@ -1,3 +1,2115 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import gzip
+import json
+import os
+import smtplib
+import sqlite3
+import tempfile
+import time
+import uuid
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from django.db.models.signals import post_delete
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from rest_framework import serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, force_authenticate
+
+from . import chapa, exports, geo, images, mail, metrics, occupancy, outbox, payment_links, reconciliation, replicas, views, webhooks
+from .chapa import AsyncChapaClient, ChapaClient, ChapaUnavailable, CircuitBreaker, latency_snapshot
+from .fake_chapa import FakeChapaServer
+from .fake_smtp import FakeSMTPServer
+from .management.commands import bench_api
+from .models import Listing, ListingOccupancy, OutboxEvent, OutgoingEmail, Review, Booking, Payment, WebhookEvent
+from .pagination import KeysetCursorPagination
+from .renderers import ORJSONRenderer
+from .reconciliation import reconcile_pending_payments
+from .search import ensure_sqlite_index, search_listings
+from .serializers import BookingSerializer, ListingSerializer, ReviewSerializer
+from .tasks import drain_email_queue, generate_listing_image_variants, handle_payment_event, initialize_chapa_payment, link_payment_bookings, verify_chapa_payment
+
+
+def make_listing_obj(host, **kwargs):
+    defaults = {
+        "listing_image": "listing_images/test.jpg",
+        "host_id": host,
+        "title": "Test Listing",
+        "description": "A place to stay.",
+        "price": Decimal("100.00"),
+        "address": "1 Test Street",
+        "city": "Lagos",
+        "state": "Lagos",
+        "pricetag": "per night",
+        "bedrooms": 2,
+        "bathrooms": Decimal("1.00"),
+        "property_type": "Apartment",
+    }
+    defaults.update(kwargs)
+    return Listing(**defaults)
+
+
+def make_listing(host, **kwargs):
+    listing = make_listing_obj(host, **kwargs)
+    listing.save()
+    return listing
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listings = [make_listing(self.host, title=f"Listing {i}") for i in range(25)]
+        # give half the rows an identical timestamp so the pk tie-breaker is exercised
+        now = timezone.now()
+        for i, listing in enumerate(self.listings):
+            created_at = now if i % 2 else now - timedelta(minutes=i)
+            Listing.objects.filter(pk=listing.pk).update(created_at=created_at)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item["property_id"] for item in response.data["results"])
+            url = response.data["next"]
+        return seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen = self.walk("/api/listings/?page_size=7")
+        expected = [
+            str(pk) for pk in Listing.objects.order_by("-created_at", "-property_id").values_list("pk", flat=True)
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get("/api/listings/?page_size=5").data
+        second = self.client.get(first["next"]).data
+        self.assertIsNone(first["previous"])
+        back = self.client.get(second["previous"]).data
+        self.assertEqual(
+            [item["property_id"] for item in back["results"]],
+            [item["property_id"] for item in first["results"]],
+        )
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetCursorPagination, "max_page_size", 10):
+            response = self.client.get("/api/listings/?page_size=1000")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get("/api/listings/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_pk_is_404(self):
+        for url, params, position in (
+            ("/api/listings/", {}, "t=2026-01-01T00%3A00%3A00%2B00%3A00"),
+            ("/api/listings/", {"ordering": "-rating"}, "t=4.5"),
+            ("/api/bookings/", {}, "t=2026-01-01T00%3A00%3A00%2B00%3A00"),
+            ("/api/reviews/", {}, "t=2026-01-01T00%3A00%3A00%2B00%3A00"),
+        ):
+            cursor = b64encode(f"{position}&p=notauuid".encode()).decode()
+            with self.subTest(url=url, **params):
+                response = self.client.get(url, {**params, "cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class AvailabilitySearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.booked = make_listing(self.host, title="Booked")
+        self.free = make_listing(self.host, title="Free")
+        self.elsewhere = make_listing(self.host, title="Elsewhere", city="Abuja")
+        Booking.objects.create(
+            property_id=self.booked,
+            user_id=self.host,
+            start_date=date(2026, 3, 10),
+            end_date=date(2026, 3, 15),
+            total_price=Decimal("500.00"),
+        )
+
+    def search(self, **params):
+        response = self.client.get("/api/listings/available/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {item["title"] for item in response.data["results"]}
+
+    def test_overlapping_booking_excludes_listing(self):
+        self.assertEqual(self.search(city="Lagos", start_date="2026-03-12", end_date="2026-03-20"), {"Free"})
+
+    def test_back_to_back_stays_do_not_overlap(self):
+        found = self.search(city="Lagos", start_date="2026-03-15", end_date="2026-03-18")
+        self.assertEqual(found, {"Free", "Booked"})
+
+    def test_attribute_filters(self):
+        found = self.search(start_date="2026-04-01", end_date="2026-04-02", max_price="50")
+        self.assertEqual(found, set())
+        found = self.search(start_date="2026-04-01", end_date="2026-04-02", city="Abuja")
+        self.assertEqual(found, {"Elsewhere"})
+
+    def test_rejects_inverted_range(self):
+        response = self.client.get("/api/listings/available/", {"start_date": "2026-03-15", "end_date": "2026-03-10"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user("host", password="pass")
+        self.guest = User.objects.create_user("guest", password="pass")
+        self.listing = make_listing(self.host)
+
+    def review(self, rating, listing=None):
+        return Review.objects.create(
+            property_id=listing or self.listing, user_id=self.guest, rating=rating, comment="ok"
+        )
+
+    def assertAggregates(self, listing, count, total, avg):
+        listing.refresh_from_db()
+        self.assertEqual((listing.review_count, listing.rating_sum), (count, total))
+        self.assertAlmostEqual(listing.rating_avg, avg)
+
+    def test_create_edit_delete_are_applied_incrementally(self):
+        first = self.review(4)
+        self.review(5)
+        self.assertAggregates(self.listing, 2, 9, 4.5)
+
+        first.rating = 2
+        first.save()
+        self.assertAggregates(self.listing, 2, 7, 3.5)
+
+        first.delete()
+        self.assertAggregates(self.listing, 1, 5, 5.0)
+
+    def test_moving_a_review_updates_both_listings(self):
+        other = make_listing(self.host, title="Other")
+        review = self.review(3)
+        review.property_id = other
+        review.save()
+        self.assertAggregates(self.listing, 0, 0, 0.0)
+        self.assertAggregates(other, 1, 3, 3.0)
+
+    def test_rebuild_command_matches_reviews(self):
+        self.review(1)
+        self.review(4)
+        Listing.objects.update(review_count=0, rating_sum=0, rating_avg=0)
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+        self.assertAggregates(self.listing, 2, 5, 2.5)
+
+    def test_listing_api_exposes_and_filters_by_rating(self):
+        make_listing(self.host, title="Unrated")
+        self.review(5)
+        response = APIClient().get("/api/listings/", {"min_rating": "4"})
+        self.assertEqual([item["title"] for item in response.data["results"]], ["Test Listing"])
+        self.assertEqual(response.data["results"][0]["review_count"], 1)
+
+    def test_listing_api_orders_by_rating_across_pages(self):
+        cache.clear()
+        for title, rating in (("B", 4.5), ("C", 2.0), ("D", 4.5), ("E", 0.0)):
+            make_listing(self.host, title=title, rating_avg=rating)
+        Listing.objects.filter(pk=self.listing.pk).update(rating_avg=3.0)
+        by_rating = list(Listing.objects.order_by("-rating_avg", "-property_id").values_list("title", flat=True))
+
+        client = APIClient()
+        for ordering, expected in (("-rating", by_rating), ("rating", by_rating[::-1])):
+            titles, url, params = [], "/api/listings/", {"ordering": ordering, "page_size": 2}
+            while url:
+                data = client.get(url, params).json()
+                titles += [item["title"] for item in data["results"]]
+                url, params = data["next"], None
+            self.assertEqual(titles, expected)
+
+        response = client.get("/api/listings/", {"ordering": "price"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"ordering": ['"price" is not a valid choice.']})
+
+    def test_bad_min_rating_is_400(self):
+        for bad in ("abc", "nan", "inf", "-1", "6"):
+            with self.subTest(min_rating=bad):
+                response = APIClient().get("/api/listings/", {"min_rating": bad})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("min_rating", response.json())
+
+    def test_rebuild_command_invalidates_cached_listings(self):
+        cache.clear()
+        self.review(4)
+        client = APIClient()
+        self.assertEqual(client.get("/api/listings/", {"ordering": "-rating"})["X-Cache"], "MISS")
+        self.assertEqual(client.get("/api/listings/", {"ordering": "-rating"})["X-Cache"], "HIT")
+        Listing.objects.update(rating_avg=0)
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+        response = client.get("/api/listings/", {"ordering": "-rating"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["rating_avg"], 4.0)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list endpoint and admin changelist must run a fixed number of
+    queries no matter how many rows it renders, so an N+1 fails here.
+    """
+
+    SIZES = (1, 10, 500)
+    # a page read is a single SELECT; related objects are rendered as pks
+    API_BUDGET = 1
+    # session, user, paginator count, result rows, plus filter-sidebar lookups
+    ADMIN_BUDGETS = {
+        "listing": 8,
+        "review": 6,
+        "booking": 7,
+        "payment": 6,
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pass")
+
+    def seed(self, n):
+        host = User.objects.create_user(f"host{n}", password="pass")
+        guests = User.objects.bulk_create(User(username=f"guest{n}-{i}") for i in range(n))
+        listings = Listing.objects.bulk_create(
+            make_listing_obj(host, title=f"Listing {i}", city=f"City {i % 3}") for i in range(n)
+        )
+        Review.objects.bulk_create(
+            Review(property_id=listing, user_id=guest, rating=4, comment="ok")
+            for listing, guest in zip(listings, guests)
+        )
+        Booking.objects.bulk_create(
+            Booking(
+                property_id=listing,
+                user_id=guest,
+                start_date=date(2026, 1, 1),
+                end_date=date(2026, 1, 3),
+                total_price=Decimal("200.00"),
+            )
+            for listing, guest in zip(listings, guests)
+        )
+        Payment.objects.bulk_create(
+            Payment(booking_reference=f"BK{i}", amount=Decimal("200.00"), chapa_tx_ref=f"BK{n}-{i}-ref")
+            for i in range(n)
+        )
+
+    # raise the page-size cap so the largest size really renders on one page
+    @mock.patch.object(KeysetCursorPagination, "max_page_size", max(SIZES))
+    def test_api_list_endpoints(self):
+        client = APIClient()
+        total = 0
+        for n in self.SIZES:
+            self.seed(n)
+            total += n
+            for endpoint in ("listings", "bookings", "reviews"):
+                with self.subTest(endpoint=endpoint, rows=n):
+                    # budget the uncached path; bulk_create doesn't invalidate the listing cache
+                    cache.clear()
+                    with self.assertNumQueries(self.API_BUDGET):
+                        response = client.get(f"/api/{endpoint}/", {"page_size": max(self.SIZES)})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.json()["results"]), min(total, max(self.SIZES)))
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for n in self.SIZES:
+            self.seed(n)
+            for model, budget in self.ADMIN_BUDGETS.items():
+                with self.subTest(model=model, rows=n):
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(f"/admin/listings/{model}/")
+                    self.assertEqual(response.status_code, 200)
+
+
+INITIALIZE_OK = {"status": "success", "data": {"checkout_url": "https://checkout.chapa.co/abc", "id": "CH-1"}}
+
+
+@override_settings(CHAPA_ASYNC=True, CHAPA_STATUS_MAX_WAIT=1)
+class AsyncChapaPaymentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.body = {"booking_reference": "BK1", "amount": "150.00", "email": "guest@example.com"}
+
+    def test_initiate_returns_202_and_enqueues_task(self):
+        with mock.patch("listings.views.initialize_chapa_payment.delay") as delay, \
+                mock.patch("listings.chapa.ChapaClient.initialize") as initialize:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/chapa/initiate/", self.body, format="json")
+        self.assertEqual(response.status_code, 202)
+        initialize.assert_not_called()
+        payment = Payment.objects.get(pk=response.data["payment_id"])
+        self.assertEqual(payment.status, Payment.STATUS_PENDING)
+        delay.assert_called_once()
+        self.assertEqual(delay.call_args.args[0], payment.id)
+
+    def test_task_records_checkout_url_for_status_polling(self):
+        with mock.patch("listings.views.initialize_chapa_payment.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                initiated = self.client.post("/api/chapa/initiate/", self.body, format="json").data
+        with mock.patch("listings.chapa.ChapaClient.initialize", return_value=INITIALIZE_OK):
+            initialize_chapa_payment(*delay.call_args.args)
+
+        self.assertTrue(initiated["status_url"].endswith(f"/chapa/status/{initiated['tx_ref']}/"))
+        response = self.client.get(initiated["status_url"])
+        self.assertEqual(response.data["checkout_url"], "https://checkout.chapa.co/abc")
+        self.assertEqual(response.data["status"], Payment.STATUS_PENDING)
+
+    def test_gateway_error_marks_payment_failed(self):
+        payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        with mock.patch("listings.chapa.ChapaClient.initialize", side_effect=requests.ConnectionError("down")):
+            initialize_chapa_payment(payment.id, {})
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_FAILED)
+
+    def test_verify_is_queued_and_applied(self):
+        payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        with mock.patch("listings.views.verify_chapa_payment.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/chapa/verify/", {"tx_ref": "BK1-x"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with(payment.id)
+
+        verified = {"status": "success", "data": {"status": "success"}}
+        with mock.patch("listings.chapa.ChapaClient.verify", return_value=verified):
+            verify_chapa_payment(payment.id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+
+    def test_long_poll_returns_current_state_after_wait(self):
+        payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        with mock.patch("listings.views.time.sleep"):
+            response = self.client.get("/api/chapa/status/BK1-x/", {"wait": "0.5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], Payment.STATUS_PENDING)
+
+    @override_settings(CHAPA_STATUS_SYNC_MAX_WAIT=0.2)
+    def test_long_poll_validates_params_and_caps_the_sync_wait(self):
+        payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        path = "/api/chapa/status/BK1-x/"
+        for bad in ({"updated_after": "2026-13-01T00:00:00"}, {"updated_after": "yesterday"}, {"wait": "-1"}):
+            self.assertEqual(self.client.get(path, bad).status_code, 400, bad)
+        # a naive timestamp is read in the current timezone
+        response = self.client.get(path, {"updated_after": "2000-01-01T00:00:00", "wait": "5"})
+        self.assertEqual(response.status_code, 200)
+        with mock.patch("listings.views.time.sleep") as sleep:
+            started = time.monotonic()
+            self.client.get(path, {"wait": "5"})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(sleep.called)
+
+    async def test_async_long_poll_returns_on_change(self):
+        payment = await Payment.objects.acreate(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        view = views.AsyncChapaPaymentStatus.as_view()
+        path = "/api/chapa/status/BK1-x/"
+
+        async def settle():
+            await asyncio.sleep(0.3)
+            await Payment.objects.filter(pk=payment.pk).aupdate(status=Payment.STATUS_COMPLETED, updated_at=timezone.now())
+
+        started = time.monotonic()
+        response, _ = await asyncio.gather(view(AsyncRequestFactory().get(path, {"wait": "5"}), tx_ref="BK1-x"), settle())
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(json.loads(response.content)["status"], Payment.STATUS_COMPLETED)
+        response = await view(AsyncRequestFactory().get(path, {"updated_after": "2026-13-01"}), tx_ref="BK1-x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_payment_is_404(self):
+        payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        self.assertEqual(self.client.get("/api/chapa/status/BK1-y/").status_code, 404)
+        # the sequential id is not a lookup key
+        self.assertEqual(self.client.get(f"/api/chapa/status/{payment.id}/").status_code, 404)
+
+
+class ChapaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeChapaServer().start()
+        self.addCleanup(self.server.stop)
+
+    def client_for(self, **kwargs):
+        kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        client = ChapaClient(self.server.base_url, "test-key", timeout=5, backoff_base=0, **kwargs)
+        self.addCleanup(client.session.close)
+        return client
+
+    def test_connections_are_reused(self):
+        client = self.client_for()
+        for i in range(20):
+            self.assertEqual(client.verify(f"tx-{i}")["data"]["status"], "success")
+        client.initialize({"tx_ref": "tx-init"})
+        self.assertEqual(len(self.server.requests), 21)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_verify_retries_then_breaker_fails_fast(self):
+        self.server.fail_status = 503
+        client = self.client_for(max_retries=2)
+        with self.assertRaises(requests.HTTPError):
+            client.verify("tx-1")
+        # one call plus two retries reached the server, which tripped the breaker
+        self.assertEqual(len(self.server.requests), 3)
+        with self.assertRaises(ChapaUnavailable):
+            client.verify("tx-2")
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_initialize_is_not_retried(self):
+        self.server.fail_status = 502
+        client = self.client_for(max_retries=3)
+        with self.assertRaises(requests.HTTPError):
+            client.initialize({"tx_ref": "tx-1"})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_half_open_breaker_closes_after_a_good_call(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        client = self.client_for(breaker=breaker, max_retries=0)
+        self.server.fail_status = 500
+        with self.assertRaises(requests.HTTPError):
+            client.verify("tx-1")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        now[0] = 11
+        self.server.fail_status = None
+        client.verify("tx-2")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_error_during_trial_frees_the_breaker(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        client = self.client_for(breaker=breaker, max_retries=0)
+        self.server.fail_status = 500
+        with self.assertRaises(requests.HTTPError):
+            client.verify("tx-1")
+
+        now[0] = 11
+        self.server.fail_status = None
+        with mock.patch.object(client.session, "request", side_effect=requests.exceptions.ChunkedEncodingError("cut")), \
+                self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            client.verify("tx-2")
+        # the next call is let through as the trial instead of being refused forever
+        client.verify("tx-3")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_latency_is_recorded_per_endpoint(self):
+        before = latency_snapshot().get("verify", {}).get("count", 0)
+        self.client_for().verify("tx-1")
+        self.assertEqual(latency_snapshot()["verify"]["count"], before + 1)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        statuses = {"tx-ok": "success", "tx-bad": "failed"}
+        self.server = FakeChapaServer(verify_status=lambda ref: statuses.get(ref, "pending")).start()
+        self.addCleanup(self.server.stop)
+        overrides = override_settings(CHAPA_BASE_URL=self.server.base_url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        chapa.reset_client()
+        self.addCleanup(chapa.reset_client)
+
+    def payment(self, tx_ref, minutes_old):
+        payment = Payment.objects.create(booking_reference="BK", amount=Decimal("10.00"), chapa_tx_ref=tx_ref)
+        Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - timedelta(minutes=minutes_old))
+        return payment
+
+    def test_stale_pending_payments_are_verified_in_bulk(self):
+        ok = self.payment("tx-ok", 60)
+        bad = self.payment("tx-bad", 60)
+        unknown = self.payment("tx-unknown", 60)
+        fresh = self.payment("tx-ok-fresh", 1)
+
+        stats = reconcile_pending_payments(older_than_minutes=15, chunk_size=2, concurrency=4)
+
+        self.assertEqual((stats["checked"], stats["completed"], stats["failed"], stats["pending"]), (3, 1, 1, 1))
+        statuses = dict(Payment.objects.values_list("chapa_tx_ref", "status"))
+        self.assertEqual(statuses[ok.chapa_tx_ref], Payment.STATUS_COMPLETED)
+        self.assertEqual(statuses[bad.chapa_tx_ref], Payment.STATUS_FAILED)
+        self.assertEqual(statuses[unknown.chapa_tx_ref], Payment.STATUS_PENDING)
+        self.assertEqual(statuses[fresh.chapa_tx_ref], Payment.STATUS_PENDING)
+        self.assertNotIn(("GET", "/v1/transaction/verify/tx-ok-fresh"), self.server.requests)
+        self.assertEqual(
+            sorted(OutboxEvent.objects.values_list("event_type", "payload__tx_ref")),
+            [("payment.completed", "tx-ok"), ("payment.failed", "tx-bad")],
+        )
+
+    def test_payment_settled_during_verify_is_left_alone(self):
+        payment = self.payment("tx-unknown", 60)
+        stale = Payment.objects.get(pk=payment.pk)
+        # the webhook lands while the verify call is in flight
+        Payment.objects.filter(pk=payment.pk).update(status=Payment.STATUS_COMPLETED)
+        stats = {"completed": 0, "failed": 0, "pending": 0, "settled_elsewhere": 0}
+        reconciliation._apply([(stale, {"data": {"status": "pending"}})], stats)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+        self.assertEqual((stats["pending"], stats["settled_elsewhere"]), (0, 1))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_gateway_errors_leave_rows_pending(self):
+        self.server.fail_status = 400
+        payment = self.payment("tx-ok", 60)
+        stats = reconcile_pending_payments(older_than_minutes=15)
+        self.assertEqual(stats["errors"], 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_PENDING)
+
+    def test_bench_command_only_touches_its_own_rows(self):
+        real = self.payment("tx-ok", 60)
+        out = StringIO()
+        call_command("bench_reconcile", "--payments", "5", "--latency", "0", stdout=out)
+        self.assertIn("checked=5 completed=5", out.getvalue())
+        real.refresh_from_db()
+        self.assertEqual(real.status, Payment.STATUS_PENDING)
+        self.assertEqual(list(Payment.objects.values_list("pk", flat=True)), [real.pk])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class ChapaCallbackTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.payment = Payment.objects.create(booking_reference="BK1", amount=Decimal("10.00"), chapa_tx_ref="BK1-ref")
+
+    def callback(self, **body):
+        return self.client.post("/api/chapa/callback/", {"tx_ref": "BK1-ref", **body}, format="json")
+
+    def test_success_completes_pending_payment_in_four_queries(self):
+        with mock.patch("listings.tasks.handle_payment_event.apply_async") as apply_async, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.callback(status="success", id="CH-9")
+        statements = [q["sql"] for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # dedup insert, conditional update, then the outbox event's read and insert
+        self.assertEqual(len(statements), 4, statements)
+        apply_async.assert_not_called()
+        self.assertEqual(OutboxEvent.objects.get().event_type, "payment.completed")
+        self.assertEqual(response.data["payment_status"], Payment.STATUS_COMPLETED)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.chapa_tx_id), (Payment.STATUS_COMPLETED, "CH-9"))
+
+    def test_chapa_id_of_another_payment_still_applies_the_status(self):
+        Payment.objects.create(booking_reference="BK2", amount=Decimal("10.00"), chapa_tx_ref="BK2-ref", chapa_tx_id="CH-9")
+        with self.assertLogs("listings.views", "WARNING"):
+            response = self.callback(status="success", id="CH-9")
+        self.assertEqual(response.status_code, 200)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.chapa_tx_id), (Payment.STATUS_COMPLETED, None))
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_replayed_webhook_is_dropped(self):
+        self.callback(status="success")
+        response = self.callback(status="success")
+        self.assertEqual(response.data["message"], "Duplicate webhook ignored")
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_settled_payment_is_not_overwritten(self):
+        self.callback(status="success")
+        response = self.callback(status="failed")
+        self.assertEqual(response.data["payment_status"], Payment.STATUS_COMPLETED)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.STATUS_COMPLETED)
+
+    def test_unknown_payment_is_404_and_not_logged(self):
+        response = self.client.post("/api/chapa/callback/", {"tx_ref": "nope", "status": "success"}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    @override_settings(WEBHOOK_EVENT_RETENTION_HOURS=24)
+    def test_prune_drops_deliveries_past_retention(self):
+        self.callback(status="pending")
+        WebhookEvent.objects.update(received_at=timezone.now() - timedelta(hours=25))
+        self.callback(status="success")
+        self.assertEqual(webhooks.prune(), 1)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        # a replay of the pruned delivery can't move the settled payment back
+        self.callback(status="pending")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.STATUS_COMPLETED)
+
+
+class PaymentBookingLinkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host, title="Paid")
+        self.other = make_listing(self.host, title="Other")
+        self.booking = self.book(self.listing, "300.00")
+
+    def book(self, listing, total):
+        return Booking.objects.create(property_id=listing, user_id=self.host, start_date=date(2026, 3, 1),
+                                      end_date=date(2026, 3, 3), total_price=Decimal(total))
+
+    def initiate(self, reference, amount):
+        with mock.patch("listings.chapa.ChapaClient.initialize", return_value=INITIALIZE_OK):
+            return self.client.post("/api/chapa/initiate/", {
+                "booking_reference": reference, "amount": amount, "email": "guest@example.com",
+            }, format="json")
+
+    def test_initiate_links_booking_and_checks_total(self):
+        response = self.initiate(str(self.booking.pk), "250.00")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("300.00", response.data["detail"])
+        self.assertFalse(Payment.objects.exists())
+
+        response = self.initiate(str(self.booking.pk), "300")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Payment.objects.get(pk=response.data["payment_id"]).booking_id, self.booking)
+
+    def test_free_text_reference_stays_unlinked(self):
+        for bad in ("abc", "0", "-5", "NaN", "1e12", "9.999"):
+            response = self.initiate("BK123", bad)
+            self.assertEqual(response.status_code, 400, bad)
+            self.assertTrue(response.data["detail"].startswith("amount: "), response.data)
+        response = self.initiate("BK123", "99.00")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Payment.objects.get().booking_id)
+
+    def test_backfill_links_existing_payments_in_chunks(self):
+        second = self.book(self.other, "80.00")
+        for reference in [str(self.booking.pk), "BK-legacy", str(second.pk).upper(), str(uuid.uuid4())]:
+            Payment.objects.create(booking_reference=reference, amount=Decimal("1.00"))
+        out = StringIO()
+        call_command("link_payment_bookings", "--batch-size", "2", stdout=out)
+        self.assertIn("Linked 2 payments", out.getvalue())
+        self.assertEqual(
+            dict(Payment.objects.filter(booking_id__isnull=False).values_list("booking_reference", "booking_id")),
+            {str(self.booking.pk): self.booking.pk, str(second.pk).upper(): second.pk},
+        )
+
+    def test_background_backfill_chains_chunks(self):
+        Payment.objects.create(booking_reference=str(self.booking.pk), amount=Decimal("1.00"))
+        with mock.patch("listings.tasks.link_payment_bookings.delay") as delay:
+            link_payment_bookings()
+        last_pk = Payment.objects.get().pk
+        delay.assert_called_once_with(last_pk)
+        with mock.patch("listings.tasks.link_payment_bookings.delay") as delay:
+            link_payment_bookings(last_pk)
+        delay.assert_not_called()
+        self.assertEqual(Payment.objects.get().booking_id, self.booking)
+
+    def test_unpaid_bookings_and_revenue_by_listing(self):
+        second = self.book(self.listing, "120.00")
+        unpaid = self.book(self.other, "60.00")
+        for booking, status in [(self.booking, Payment.STATUS_COMPLETED), (second, Payment.STATUS_COMPLETED),
+                                (unpaid, Payment.STATUS_FAILED)]:
+            Payment.objects.create(booking_reference=str(booking.pk), booking_id=booking,
+                                   amount=booking.total_price, status=status)
+        self.assertEqual(list(payment_links.unpaid_bookings()), [unpaid])
+        self.assertEqual(list(payment_links.revenue_by_listing()), [
+            {"listing_id": self.listing.pk, "revenue": Decimal("420.00"), "payments": 2},
+        ])
+
+        staff = User.objects.create_superuser("admin", password="pass")
+        self.client.force_login(staff)
+        response = self.client.get("/admin/listings/booking/?paid=no")
+        self.assertEqual(list(response.context["cl"].result_list), [unpaid])
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.smtp = FakeSMTPServer().start()
+        self.addCleanup(self.smtp.stop)
+        overrides = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=self.smtp.host, EMAIL_PORT=self.smtp.port, EMAIL_TIMEOUT=5,
+            EMAIL_QUEUES={"transactional": {"rate": 0, "batch_size": 100}},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def queue(self, count, to="guest{}@example.com"):
+        for i in range(count):
+            mail.queue_payment_confirmation(to.format(i), f"BK{i}", Decimal("10.00"))
+
+    def test_batch_shares_one_connection(self):
+        self.smtp.connect_latency = 0.05
+        count = 20
+        started = time.perf_counter()
+        for i in range(count):
+            send_mail("one by one", "body", "from@example.com", [f"guest{i}@example.com"])
+        one_by_one = time.perf_counter() - started
+        self.assertEqual(self.smtp.connections, count)
+
+        self.queue(count)
+        mail._templates.cache_clear()
+        started = time.perf_counter()
+        sent, failed, next_in = mail.drain("transactional")
+        batched = time.perf_counter() - started
+
+        self.assertEqual((sent, failed, next_in), (count, 0, None))
+        self.assertEqual(self.smtp.connections, count + 1)
+        self.assertLess(batched * 5, one_by_one)
+        self.assertEqual(mail._templates.cache_info().misses, 1)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_SENT).count(), count)
+        recipients, message = self.smtp.messages[-1]
+        self.assertEqual(recipients, [f"guest{count - 1}@example.com"])
+        self.assertEqual(message["Subject"], f"Payment received for booking BK{count - 1}")
+        self.assertIn("payment of 10.00", message.get_payload())
+
+    def test_queue_rate_limit_paces_sends(self):
+        self.queue(6)
+        with override_settings(EMAIL_QUEUES={"transactional": {"rate": 50, "batch_size": 100}}):
+            started = time.perf_counter()
+            mail.drain("transactional")
+        self.assertGreaterEqual(time.perf_counter() - started, 5 / 50)
+        self.assertEqual(len(self.smtp.messages), 6)
+
+    def test_refused_message_backs_off_then_fails(self):
+        self.smtp.refuse.add("bad@example.com")
+        self.queue(2)
+        mail.queue_payment_confirmation("bad@example.com", "BK-bad", "5.00")
+
+        sent, failed, next_in = mail.drain("transactional")
+        self.assertEqual((sent, failed), (2, 1))
+        self.assertGreater(next_in, 0)
+        bad = OutgoingEmail.objects.get(to="bad@example.com")
+        self.assertEqual((bad.status, bad.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+        self.assertIn("SMTPRecipientsRefused", bad.last_error)
+        # not due yet
+        self.assertEqual(mail.drain("transactional")[:2], (0, 0))
+
+        with override_settings(EMAIL_MAX_ATTEMPTS=2), self.assertLogs("listings.mail", "ERROR"):
+            OutgoingEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(mail.drain("transactional"), (0, 1, None))
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutgoingEmail.STATUS_FAILED)
+
+    def test_dropped_connection_is_reopened_once_for_the_rest(self):
+        self.queue(5)
+        sendmail = smtplib.SMTP.sendmail
+        calls = []
+
+        def drop_second(smtp, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise smtplib.SMTPServerDisconnected("connection dropped")
+            return sendmail(smtp, *args, **kwargs)
+
+        with mock.patch.object(smtplib.SMTP, "sendmail", drop_second):
+            sent, failed, _next_in = mail.drain("transactional")
+        self.assertEqual((sent, failed), (4, 1))
+        self.assertEqual(self.smtp.connections, 2)
+
+    def test_unreachable_server_backs_off_the_batch(self):
+        self.queue(3)
+        self.smtp.stop()
+        sent, failed, next_in = mail.drain("transactional")
+        self.assertEqual((sent, failed), (0, 3))
+        self.assertGreater(next_in, 0)
+        self.assertEqual(set(OutgoingEmail.objects.values_list("attempts", flat=True)), {1})
+
+    def test_enqueue_schedules_one_drain_per_window(self):
+        with mock.patch("listings.tasks.drain_email_queue.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.queue(3)
+        apply_async.assert_called_once_with(("transactional",), countdown=settings.EMAIL_BATCH_WINDOW)
+
+        with mock.patch("listings.tasks.drain_email_queue.apply_async") as apply_async:
+            with override_settings(EMAIL_QUEUES={"transactional": {"rate": 0, "batch_size": 2}}):
+                drain_email_queue("transactional")
+        # the batch was full, so the task chains another drain
+        apply_async.assert_called_once_with(("transactional",))
+        self.assertEqual(len(self.smtp.messages), 2)
+
+    def test_broker_outage_leaves_message_for_the_sweep(self):
+        with mock.patch("listings.tasks.drain_email_queue.apply_async", side_effect=OperationalError("down")), \
+                self.assertLogs("listings.mail", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.queue(1)
+        self.assertEqual(mail.drain("transactional")[0], 1)
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def pay(self, reference, status="success", **body):
+        Payment.objects.get_or_create(
+            chapa_tx_ref=f"{reference}-ref", defaults={"booking_reference": reference, "amount": Decimal("25.00")}
+        )
+        return self.client.post("/api/chapa/callback/", {"tx_ref": f"{reference}-ref", "status": status, **body},
+                                format="json")
+
+    def test_webhook_writes_event_without_touching_the_broker(self):
+        with mock.patch("listings.tasks.handle_payment_event.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.pay("BK7", email="payer@example.com").status_code, 200)
+        apply_async.assert_not_called()
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.key, event.event_type, event.published_at), ("BK7", "payment.completed", None))
+        self.assertEqual((event.payload["amount"], event.payload["email"], event.payload["previous_status"]),
+                         ("25.00", "payer@example.com", Payment.STATUS_PENDING))
+
+    def test_event_rolls_back_with_the_status_change(self):
+        payment = Payment.objects.create(booking_reference="BK8", amount=Decimal("5.00"), chapa_tx_ref="BK8-ref")
+        with mock.patch.object(OutboxEvent, "save", side_effect=RuntimeError("disk full")), \
+                self.assertRaises(RuntimeError):
+            chapa.apply_verify_response(payment, {"data": {"status": "success"}})
+        self.assertFalse(OutboxEvent.objects.exists())
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_PENDING)
+
+    def test_verify_never_moves_a_settled_payment(self):
+        payment = Payment.objects.create(booking_reference="BK8", amount=Decimal("5.00"), chapa_tx_ref="BK8-ref")
+        self.pay("BK8")
+        self.assertFalse(chapa.apply_verify_response(payment, {"data": {"status": "pending"}}))
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+        self.assertFalse(chapa.apply_verify_response(payment, {"data": {"status": "failed"}}))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_verify_records_only_actual_changes(self):
+        payment = Payment.objects.create(booking_reference="BK9", amount=Decimal("5.00"), chapa_tx_ref="BK9-ref")
+        chapa.apply_verify_response(payment, {"data": {"status": "pending"}})
+        self.assertFalse(OutboxEvent.objects.exists())
+        chapa.apply_verify_response(payment, {"data": {"status": "success"}})
+        chapa.apply_verify_response(payment, {"data": {"status": "success"}})
+        self.assertEqual(list(OutboxEvent.objects.values_list("event_type", flat=True)), ["payment.completed"])
+
+    def test_racing_writers_record_one_event(self):
+        payment = Payment.objects.create(booking_reference="BK6", amount=Decimal("5.00"), chapa_tx_ref="BK6-ref")
+        stale = Payment.objects.get(pk=payment.pk)
+        self.assertTrue(chapa.apply_verify_response(payment, {"data": {"status": "success"}}))
+        self.assertEqual(self.pay("BK6", email="payer@example.com").status_code, 200)
+        # a second verify that read the row while it was still Pending
+        self.assertFalse(chapa.apply_verify_response(stale, {"data": {"status": "success"}}))
+        self.assertEqual(stale.status, Payment.STATUS_COMPLETED)
+        self.assertEqual(list(OutboxEvent.objects.values_list("event_type", flat=True)), ["payment.completed"])
+
+    def test_initialize_failure_does_not_override_a_settled_payment(self):
+        payment = Payment.objects.create(booking_reference="BK5", amount=Decimal("5.00"), chapa_tx_ref="BK5-ref")
+        self.pay("BK5")
+        with mock.patch.object(chapa.ChapaClient, "initialize", side_effect=requests.ConnectionError("down")), \
+                self.assertRaises(requests.ConnectionError):
+            chapa.initialize_payment(payment, {})
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    @override_settings(OUTBOX_PARTITIONS=4)
+    def test_relay_publishes_in_order_and_stops_at_a_broker_error(self):
+        for reference, status in [("BK1", "success"), ("BK2", "failed"), ("BK3", "success")]:
+            self.pay(reference, status)
+        events = list(OutboxEvent.objects.order_by("pk"))
+
+        with mock.patch("listings.tasks.handle_payment_event.apply_async",
+                        side_effect=[None, OperationalError("down")]) as apply_async, \
+                self.assertLogs("listings.outbox", "WARNING"):
+            self.assertEqual(outbox.relay(10), 1)
+        self.assertEqual(apply_async.call_args_list[0], mock.call(
+            (events[0].pk, "payment.completed", events[0].payload), queue=outbox.partition("BK1"),
+        ))
+        self.assertEqual(list(OutboxEvent.objects.filter(published_at__isnull=True).order_by("pk")), events[1:])
+
+        with mock.patch("listings.tasks.handle_payment_event.apply_async") as apply_async:
+            self.assertEqual(outbox.relay(10), 2)
+        self.assertEqual([c.args[0][0] for c in apply_async.call_args_list], [events[1].pk, events[2].pk])
+        self.assertEqual(outbox.relay(10), 0)
+
+    def test_partition_is_stable_per_booking(self):
+        with override_settings(OUTBOX_PARTITIONS=8):
+            self.assertEqual(outbox.partition("BK1"), outbox.partition("BK1"))
+            self.assertEqual(len({outbox.partition(f"BK{i}") for i in range(100)}), 8)
+
+    def test_consumer_queues_confirmation_once(self):
+        self.pay("BK7", email="payer@example.com")
+        event = OutboxEvent.objects.get()
+        with mock.patch("listings.tasks.drain_email_queue.apply_async"):
+            with self.captureOnCommitCallbacks(execute=True):
+                handle_payment_event(event.pk, event.event_type, event.payload)
+            # a redelivery of the same event
+            handle_payment_event(event.pk, event.event_type, event.payload)
+        message = OutgoingEmail.objects.get()
+        self.assertEqual((message.to, message.context["booking_reference"], message.context["amount"]),
+                         ("payer@example.com", "BK7", "25.00"))
+
+    def test_relay_command_and_metrics(self):
+        self.pay("BK1")
+        self.pay("BK2", "failed")
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(seconds=2))
+        with mock.patch("listings.tasks.handle_payment_event.apply_async"):
+            call_command("relay_outbox", "--once", "--batch-size", "1", stdout=StringIO())
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+        self.pay("BK3")
+        stats = outbox.stats(window=60)
+        self.assertEqual(stats["pending"], 1)
+        self.assertAlmostEqual(stats["published_per_second"], 2 / 60)
+        self.assertGreaterEqual(stats["lag_max_seconds"], 2)
+        text = metrics.render(outbox=stats)
+        self.assertIn("outbox_pending_events 1\n", text)
+        self.assertIn('outbox_relay_lag_seconds{stat="max"}', text)
+
+    def test_prune_keeps_recent_and_unpublished_events(self):
+        self.pay("BK1")
+        self.pay("BK2")
+        self.pay("BK3")
+        old, recent, _ = OutboxEvent.objects.order_by("pk")
+        OutboxEvent.objects.filter(pk=old.pk).update(published_at=timezone.now() - timedelta(days=30))
+        OutboxEvent.objects.filter(pk=recent.pk).update(published_at=timezone.now())
+        self.assertEqual(outbox.prune(), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+
+def shares_in_memory_sqlite():
+    return connection.vendor == "sqlite" and connection.is_in_memory_db()
+
+
+class ChapaCallbackStressTests(TransactionTestCase):
+    WEBHOOKS = 1000
+    THREADS = 16
+
+    def setUp(self):
+        if shares_in_memory_sqlite():
+            self.skipTest("threads can't write concurrently to a shared in-memory SQLite database")
+
+    def test_concurrent_webhooks_settle_each_payment_once(self):
+        payments = Payment.objects.bulk_create(
+            Payment(booking_reference=f"BK{i}", amount=Decimal("10.00"), chapa_tx_ref=f"BK{i}-ref")
+            for i in range(50)
+        )
+        # every payment gets a burst of conflicting and replayed deliveries
+        bodies = [
+            {"tx_ref": payments[i % len(payments)].chapa_tx_ref,
+             "status": "success" if (i // len(payments)) % 2 else "failed",
+             "attempt": i // (2 * len(payments))}
+            for i in range(self.WEBHOOKS)
+        ]
+
+        def deliver(body):
+            try:
+                return APIClient().post("/api/chapa/callback/", body, format="json").status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            codes = list(pool.map(deliver, bodies))
+
+        self.assertEqual(set(codes), {200})
+        unique_bodies = {json.dumps(body, sort_keys=True) for body in bodies}
+        self.assertEqual(WebhookEvent.objects.count(), len(unique_bodies))
+        self.assertFalse(Payment.objects.filter(status=Payment.STATUS_PENDING).exists())
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host)
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get("/api/listings/")
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/listings/")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get("/api/listings/")
+        self.assertEqual(self.client.get("/api/listings/", {"page_size": 5})["X-Cache"], "MISS")
+
+    def test_conditional_get_returns_304(self):
+        etag = self.client.get(f"/api/listings/{self.listing.pk}/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/listings/{self.listing.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_listing_writes_invalidate(self):
+        etag = self.client.get("/api/listings/")["ETag"]
+        self.listing.title = "Renamed"
+        self.listing.save()
+        response = self.client.get("/api/listings/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["title"], "Renamed")
+
+        self.listing.delete()
+        self.assertEqual(self.client.get("/api/listings/").data["results"], [])
+
+    def test_bookings_invalidate_availability_only(self):
+        params = {"start_date": "2026-05-01", "end_date": "2026-05-03"}
+        self.client.get("/api/listings/available/", params)
+        self.client.get("/api/listings/")
+        Booking.objects.create(
+            property_id=self.listing, user_id=self.host, start_date=date(2026, 5, 1),
+            end_date=date(2026, 5, 2), total_price=Decimal("100.00"),
+        )
+        self.assertEqual(self.client.get("/api/listings/")["X-Cache"], "HIT")
+        response = self.client.get("/api/listings/available/", params)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"], [])
+
+
+class BulkWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host)
+
+    def booking(self, day, **overrides):
+        item = {
+            "property_id": str(self.listing.pk),
+            "user_id": self.host.pk,
+            "start_date": str(date(2026, 6, day)),
+            "end_date": str(date(2026, 6, day + 1)),
+            "total_price": "100.00",
+        }
+        item.update(overrides)
+        return item
+
+    def test_bulk_create_validates_with_one_query_per_related_model(self):
+        items = [self.booking(day) for day in range(1, 21)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/bookings/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["count"], 20)
+        self.assertEqual(Booking.objects.count(), 20)
+        selects = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        # listing + user for validation, then the locked listing re-read, one overlap
+        # check and one booking scan for the occupancy bitmaps
+        self.assertEqual(len(selects), 5, selects)
+
+    def test_invalid_item_reports_per_item_errors_and_writes_nothing(self):
+        items = [self.booking(1), self.booking(2, user_id=9999), self.booking(3, start_date="someday")]
+        response = self.client.post("/api/bookings/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["errors"]
+        self.assertEqual(set(errors), {1, 2})
+        self.assertIn("user_id", errors[1])
+        self.assertIn("start_date", errors[2])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_batch_size_limit(self):
+        with self.settings(BULK_MAX_BATCH_SIZE=2):
+            response = self.client.post("/api/bookings/bulk/", [self.booking(d) for d in (1, 2, 3)], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_bulk_update_listings_and_invalidate_cache(self):
+        other = make_listing(self.host, title="Other")
+        self.client.get("/api/listings/")
+        response = self.client.patch("/api/listings/bulk/", [
+            {"property_id": str(self.listing.pk), "price": "80.00"},
+            {"property_id": str(other.pk), "title": "Renamed"},
+        ], format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.listing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.listing.price, other.title), (Decimal("80.00"), "Renamed"))
+        self.assertEqual(self.client.get("/api/listings/")["X-Cache"], "MISS")
+
+    def test_bulk_update_unknown_pk(self):
+        response = self.client.patch("/api/listings/bulk/", [{"property_id": str(uuid.uuid4()), "title": "x"}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("property_id", response.data["errors"][0])
+
+    def test_bulk_update_accepts_non_canonical_uuids(self):
+        other = make_listing(self.host)
+        response = self.client.patch("/api/listings/bulk/", [
+            {"property_id": str(self.listing.pk).upper(), "title": "Upper"},
+            {"property_id": other.pk.hex, "title": "Hex"},
+            {"property_id": "not-a-uuid", "title": "x"},
+        ], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data["errors"]), [2])
+        response = self.client.patch("/api/listings/bulk/", [
+            {"property_id": str(self.listing.pk).upper(), "title": "Upper"},
+            {"property_id": other.pk.hex, "title": "Hex"},
+        ], format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(set(Listing.objects.values_list("title", flat=True)), {"Upper", "Hex"})
+
+    def test_bulk_create_listings_from_image_paths(self):
+        item = {
+            "listing_image": "listing_images/imported.jpg", "host_id": self.host.pk, "title": "Imported",
+            "description": "d", "price": "50.00", "address": "a", "city": "Lagos", "state": "Lagos",
+            "pricetag": "per night", "bedrooms": 1, "bathrooms": "1.00", "property_type": "Studio",
+        }
+        response = self.client.post("/api/listings/bulk/", [item, {**item, "title": "Imported 2"}], format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Listing.objects.filter(title__startswith="Imported").count(), 2)
+
+
+class SeedCommandTests(TestCase):
+    def seed(self, *args):
+        call_command("seed", "--hosts", "2", "--guests", "5", "--listings", "6", "--bookings", "40",
+                     "--reviews", "12", "--batch-size", "7", *args, stdout=StringIO())
+
+    def test_seeds_requested_counts_without_overlapping_bookings(self):
+        self.seed()
+        self.assertEqual(Listing.objects.count(), 6)
+        self.assertEqual(Booking.objects.count(), 40)
+        self.assertEqual(Review.objects.count(), 12)
+        self.assertEqual(Payment.objects.count(), 40)
+        self.assertFalse(Payment.objects.filter(booking_id__isnull=True).exists())
+        self.assertEqual(sum(row["payments"] for row in payment_links.revenue_by_listing()),
+                         Payment.objects.filter(status=Payment.STATUS_COMPLETED).count())
+        for listing in Listing.objects.all():
+            stays = list(Booking.objects.filter(property_id=listing).order_by("start_date").values_list("start_date", "end_date"))
+            for (_, previous_end), (next_start, _) in zip(stays, stays[1:]):
+                self.assertLessEqual(previous_end, next_start)
+        self.assertEqual(Listing.objects.filter(review_count__gt=0).count(), 6)
+
+    def test_same_seed_gives_same_rows(self):
+        self.seed()
+        first = list(Booking.objects.order_by("booking_id").values_list("booking_id", "start_date", "total_price"))
+        self.seed("--flush")
+        second = list(Booking.objects.order_by("booking_id").values_list("booking_id", "start_date", "total_price"))
+        self.assertEqual(first, second)
+
+    def test_flush_removes_seeded_rows_without_cascading_through_signals(self):
+        self.seed()
+        host = User.objects.create_user("host", password="pass")
+        listing = make_listing(host)
+        guest = User.objects.get(username="seed-guest-0")
+        Review.objects.create(property_id=listing, user_id=guest, rating=5, comment="ok")
+        Booking.objects.create(property_id=listing, user_id=guest, start_date=date(2026, 3, 1),
+                               end_date=date(2026, 3, 3), total_price=Decimal("200.00"))
+        deleted = []
+        post_delete.connect(lambda sender, instance, **kwargs: deleted.append(instance), sender=Booking,
+                            dispatch_uid="flush-test", weak=False)
+        self.addCleanup(post_delete.disconnect, sender=Booking, dispatch_uid="flush-test")
+        self.seed("--flush", "--listings", "0", "--bookings", "0", "--reviews", "0", "--payments", "0")
+        self.assertEqual(deleted, [])
+        self.assertEqual(list(Listing.objects.all()), [listing])
+        self.assertFalse(Booking.objects.exists() or Review.objects.exists() or Payment.objects.exists())
+        listing.refresh_from_db()
+        self.assertEqual((listing.review_count, listing.rating_avg), (0, 0))
+
+
+class BookingReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host, price=Decimal("120.00"))
+
+    def book(self, start, end, **extra):
+        body = {"property_id": str(self.listing.pk), "user_id": self.host.pk,
+                "start_date": start, "end_date": end, **extra}
+        return self.client.post("/api/bookings/", body, format="json")
+
+    def test_price_is_computed_server_side(self):
+        response = self.book("2026-07-01", "2026-07-04", total_price="1.00")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data["total_price"]), Decimal("360.00"))
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book("2026-07-01", "2026-07-04").status_code, 201)
+        response = self.book("2026-07-03", "2026-07-06")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.book("2026-07-04", "2026-07-06").status_code, 201)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_update_cannot_move_onto_another_stay(self):
+        self.book("2026-07-01", "2026-07-04")
+        second = self.book("2026-07-10", "2026-07-12").data
+        response = self.client.patch(f"/api/bookings/{second['booking_id']}/", {"start_date": "2026-07-02"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f"/api/bookings/{second['booking_id']}/", {"end_date": "2026-07-14"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Decimal(response.data["total_price"]), Decimal("480.00"))
+
+    def test_inverted_dates_are_rejected(self):
+        self.assertEqual(self.book("2026-07-04", "2026-07-01").status_code, 400)
+
+    def test_bulk_batch_is_checked_against_itself_and_stored_bookings(self):
+        self.book("2026-07-01", "2026-07-04")
+        base = {"property_id": str(self.listing.pk), "user_id": self.host.pk}
+        items = [
+            {**base, "start_date": "2026-08-01", "end_date": "2026-08-03"},
+            {**base, "start_date": "2026-08-02", "end_date": "2026-08-05"},
+            {**base, "start_date": "2026-07-03", "end_date": "2026-07-05"},
+        ]
+        response = self.client.post("/api/bookings/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["errors"]), {1, 2})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_empty_bulk_batch(self):
+        # the same answer the listings bulk endpoint gives
+        for path in ("/api/bookings/bulk/", "/api/listings/bulk/"):
+            response = self.client.post(path, [], format="json")
+            self.assertEqual((response.status_code, response.data), (201, {"count": 0, "ids": []}))
+        self.assertEqual(self.client.patch("/api/bookings/bulk/", [], format="json").status_code, 200)
+
+
+class OccupancyCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host)
+
+    def book(self, start, end, listing=None):
+        body = {"property_id": str((listing or self.listing).pk), "user_id": self.host.pk,
+                "start_date": start, "end_date": end}
+        response = self.client.post("/api/bookings/", body, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["booking_id"]
+
+    def nights(self, start, end, listing=None):
+        response = self.client.get(f"/api/listings/{(listing or self.listing).pk}/calendar/",
+                                   {"start_date": start, "end_date": end})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["nights"]
+
+    def test_bitmaps_follow_booking_writes(self):
+        booking_id = self.book("2026-07-02", "2026-07-05")
+        self.assertEqual(self.nights("2026-07-01", "2026-07-08"), "0111000")
+
+        response = self.client.patch(f"/api/bookings/{booking_id}/", {"start_date": "2026-07-04", "end_date": "2026-07-07"},
+                                     format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.nights("2026-07-01", "2026-07-08"), "0001110")
+
+        self.client.delete(f"/api/bookings/{booking_id}/")
+        self.assertEqual(self.nights("2026-07-01", "2026-07-08"), "0000000")
+        self.assertFalse(ListingOccupancy.objects.exists())
+
+    def test_stay_across_new_year(self):
+        self.book("2026-12-30", "2027-01-02")
+        self.assertEqual(
+            sorted(ListingOccupancy.objects.values_list("year", flat=True)), [2026, 2027]
+        )
+        self.assertEqual(self.nights("2026-12-29", "2027-01-03"), "01110")
+
+    def test_bulk_writes_update_bitmaps(self):
+        base = {"property_id": str(self.listing.pk), "user_id": self.host.pk}
+        response = self.client.post("/api/bookings/bulk/", [
+            {**base, "start_date": "2026-03-01", "end_date": "2026-03-03"},
+            {**base, "start_date": "2026-03-05", "end_date": "2026-03-06"},
+        ], format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.nights("2026-03-01", "2026-03-07"), "110010")
+
+        first = str(response.data["ids"][0])
+        response = self.client.patch("/api/bookings/bulk/", [{"booking_id": first, "start_date": "2026-03-02",
+                                                              "end_date": "2026-03-04"}], format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.nights("2026-03-01", "2026-03-07"), "011010")
+
+    def test_batch_calendar_is_one_query(self):
+        listings = [self.listing] + [make_listing(self.host) for _ in range(4)]
+        for i, listing in enumerate(listings):
+            self.book(f"2026-01-0{i + 1}", f"2026-01-0{i + 3}", listing=listing)
+        ids = [listing.pk for listing in listings]
+
+        with self.assertNumQueries(1):
+            nights = occupancy.calendar(Listing.objects.filter(pk__in=ids), date(2026, 1, 1), date(2027, 1, 1))
+        self.assertEqual(len(nights[ids[2]]), 365)
+        self.assertEqual(nights[ids[2]][:6], "001100")
+
+        body = {"listings": [str(pk) for pk in ids] + [str(uuid.uuid4())],
+                "start_date": "2026-01-01", "end_date": "2026-01-08"}
+        response = self.client.post("/api/listings/calendar/", body, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data["listings"]), 5)
+        self.assertEqual(response.data["listings"][str(ids[4])], "0000110")
+
+        response = self.client.get("/api/listings/calendar/", {"listings": [str(ids[0]), str(ids[1])],
+                                                                "start_date": "2026-01-01", "end_date": "2026-01-04"})
+        self.assertEqual(response.data["listings"], {str(ids[0]): "110", str(ids[1]): "011"})
+
+    def test_calendar_range_is_validated(self):
+        url = f"/api/listings/{self.listing.pk}/calendar/"
+        self.assertEqual(self.client.get(url, {"start_date": "2026-01-05", "end_date": "2026-01-05"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"start_date": "2026-01-01", "end_date": "2027-06-01"}).status_code, 400)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["start_date"].day, 1)
+        self.assertEqual(len(response.data["nights"]), (response.data["end_date"] - response.data["start_date"]).days)
+        self.assertEqual(self.client.get("/api/listings/calendar/").status_code, 400)
+
+    def test_deletes_and_rebuild(self):
+        other = make_listing(self.host)
+        self.book("2026-05-01", "2026-05-03")
+        self.book("2026-05-04", "2026-05-06")
+        self.book("2026-05-01", "2026-05-02", listing=other)
+        expected = dict(ListingOccupancy.objects.values_list("property_id", "nights"))
+
+        # bookings are inserted without signals by bulk loads; the command catches up
+        ListingOccupancy.objects.all().delete()
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.assertEqual(dict(ListingOccupancy.objects.values_list("property_id", "nights")), expected)
+
+        Booking.objects.filter(start_date="2026-05-01").delete()
+        self.assertEqual(self.nights("2026-05-01", "2026-05-07"), "000110")
+        self.assertFalse(ListingOccupancy.objects.filter(property_id=other).exists())
+
+        self.listing.delete()
+        self.assertFalse(ListingOccupancy.objects.exists())
+
+
+class BookingContentionTests(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        if shares_in_memory_sqlite():
+            self.skipTest("threads can't write concurrently to a shared in-memory SQLite database")
+
+    def test_concurrent_overlapping_requests_book_once(self):
+        host = User.objects.create_user("host", password="pass")
+        listing = make_listing(host)
+        body = {"property_id": str(listing.pk), "user_id": host.pk,
+                "start_date": "2026-09-01", "end_date": "2026-09-05"}
+
+        def attempt(_):
+            try:
+                return APIClient().post("/api/bookings/", body, format="json").status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            codes = list(pool.map(attempt, range(self.THREADS * 4)))
+
+        self.assertEqual(codes.count(201), 1)
+        self.assertEqual(codes.count(400), len(codes) - 1)
+        self.assertEqual(Booking.objects.filter(property_id=listing).count(), 1)
+
+
+class ListingSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.beach = make_listing(self.host, title="Lekki Beach House", city="Lagos")
+        self.cabin = make_listing(self.host, title="Mountain Cabin", city="Obudu", state="Cross River",
+                                  description="Short drive to the beach.")
+        self.flat = make_listing(self.host, title="City Apartment", city="Abuja", state="FCT")
+
+    def ids(self, response):
+        return [item["property_id"] for item in response.data["results"]]
+
+    def test_prefix_terms_rank_title_matches_first(self):
+        response = self.client.get("/api/listings/search/", {"q": "bea"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response), [str(self.beach.pk), str(self.cabin.pk)])
+
+    def test_every_term_must_match(self):
+        response = self.client.get("/api/listings/search/", {"q": "beach obu"})
+        self.assertEqual(self.ids(response), [str(self.cabin.pk)])
+
+    def test_index_follows_writes_including_bulk(self):
+        self.flat.title = "Garden Villa"
+        self.flat.save()
+        Listing.objects.filter(pk=self.cabin.pk).update(description="Quiet hills.")
+        Listing.objects.bulk_create([make_listing_obj(self.host, title="Villa Rosa")])
+        self.beach.delete()
+
+        titles = sorted(listing.title for listing in search_listings(Listing.objects.all(), "vill"))
+        self.assertEqual(titles, ["Garden Villa", "Villa Rosa"])
+        self.assertFalse(search_listings(Listing.objects.all(), "beach").exists())
+
+    def test_results_page_by_rank_with_a_cursor(self):
+        for i in range(5):
+            make_listing(self.host, title=f"Sunny Loft {i}", description="sunny " * i)
+        seen, url = [], "/api/listings/search/?q=sunny&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(self.ids(response))
+            url = response.data["next"]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_empty_query_is_rejected(self):
+        self.assertEqual(self.client.get("/api/listings/search/", {"q": " ?! "}).status_code, 400)
+
+    def test_sqlite_index_is_reinstalled_when_triggers_are_lost(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("FTS5 index is SQLite-only")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER listings_listing_fts_insert")
+        self.assertTrue(ensure_sqlite_index(connection))
+        self.assertFalse(ensure_sqlite_index(connection))
+        make_listing(self.host, title="Harbour View")
+        self.assertEqual(search_listings(Listing.objects.all(), "harb").count(), 1)
+
+
+class NearbySearchTests(TestCase):
+    # Lagos Island; Ikeja is ~18km north, Abuja ~530km away
+    LAT, LNG = 6.4550, 3.3941
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.island = make_listing(self.host, title="Island", latitude=6.4560, longitude=3.3950)
+        self.lekki = make_listing(self.host, title="Lekki", latitude=6.4698, longitude=3.5852)
+        self.ikeja = make_listing(self.host, title="Ikeja", latitude=6.6018, longitude=3.3515)
+        self.abuja = make_listing(self.host, title="Abuja", latitude=9.0765, longitude=7.3986)
+        make_listing(self.host, title="Not geocoded")
+
+    def nearby(self, **params):
+        return self.client.get("/api/listings/nearby/", {"lat": self.LAT, "lng": self.LNG, **params})
+
+    def test_results_within_radius_nearest_first(self):
+        response = self.nearby(radius_km=25)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["title"] for item in response.data["results"]], ["Island", "Ikeja", "Lekki"])
+        distances = [item["distance_km"] for item in response.data["results"]]
+        self.assertAlmostEqual(distances[1], geo.haversine_km(self.LAT, self.LNG, 6.6018, 3.3515), places=6)
+
+    def test_cursor_walks_every_match_once(self):
+        for i in range(6):
+            make_listing(self.host, title=f"Extra {i}", latitude=self.LAT + i * 0.001, longitude=self.LNG)
+        seen, url = [], f"/api/listings/nearby/?lat={self.LAT}&lng={self.LNG}&radius_km=25&page_size=3"
+        while url:
+            response = self.client.get(url)
+            seen.extend(item["distance_km"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_dense_pages_only_sort_the_circle_they_need(self):
+        for i in range(8):
+            make_listing(self.host, title=f"Close {i}", latitude=self.LAT, longitude=self.LNG + i * 0.0005)
+        radius = geo.page_radius(Listing.objects.all(), self.LAT, self.LNG, 50, 0.0, 4)
+        self.assertLess(radius, 50)
+        full = geo.nearby(Listing.objects.all(), self.LAT, self.LNG, 50).order_by("distance_km", "pk")[:4]
+        narrow = geo.nearby(Listing.objects.all(), self.LAT, self.LNG, radius).order_by("distance_km", "pk")[:4]
+        self.assertEqual(list(full), list(narrow))
+
+    def test_invalid_params_are_rejected(self):
+        self.assertEqual(self.nearby(lat=91).status_code, 400)
+        with self.settings(NEARBY_MAX_RADIUS_KM=50):
+            self.assertEqual(self.nearby(radius_km=51).status_code, 400)
+
+    def test_bounding_box_contains_the_circle(self):
+        for lat, lng, radius in [(self.LAT, self.LNG, 30), (60.0, 10.0, 200), (0.0, 179.9, 50), (89.9, 0.0, 50)]:
+            min_lat, max_lat, min_lng, max_lng = geo.bounding_box(lat, lng, radius)
+            # the circle's northern, southern and widest points all sit inside the box
+            self.assertLessEqual(min_lat, lat - radius / geo.KM_PER_DEGREE + 1e-9)
+            self.assertGreaterEqual(max_lat, min(90.0, lat + radius / geo.KM_PER_DEGREE - 1e-9))
+            if max_lat < 90:
+                widest = geo.haversine_km(lat, lng, lat, max_lng)
+                self.assertGreaterEqual(widest, radius * 0.99)
+
+    def test_grid_cells_match_the_generated_column(self):
+        for listing in Listing.objects.filter(latitude__isnull=False):
+            self.assertEqual(listing.geo_cell, geo.geo_cell(listing.latitude, listing.longitude))
+        cells = geo.cells_covering(*geo.bounding_box(self.LAT, self.LNG, 25))
+        self.assertIn(geo.geo_cell(6.6018, 3.3515), cells)
+
+    def test_antimeridian_wraps(self):
+        make_listing(self.host, title="Fiji east", latitude=-17.0, longitude=179.95)
+        make_listing(self.host, title="Fiji west", latitude=-17.0, longitude=-179.95)
+        make_listing(self.host, title="Fiji meridian", latitude=-17.0, longitude=180.0)
+        titles = {listing.title for listing in geo.nearby(Listing.objects.all(), -17.0, 179.99, 20)}
+        self.assertEqual(titles, {"Fiji east", "Fiji west", "Fiji meridian"})
+        titles = {listing.title for listing in geo.nearby(Listing.objects.all(), -17.0, -179.99, 20)}
+        self.assertEqual(titles, {"Fiji east", "Fiji west", "Fiji meridian"})
+
+
+class GeocodeListingsTests(TestCase):
+    def test_backfills_from_gazetteer_and_reports_misses(self):
+        host = User.objects.create_user("host", password="pass")
+        lagos = make_listing(host, city="Lagos", state="Lagos")
+        jos = make_listing(host, city=" jos ", state="plateau")
+        unknown = make_listing(host, city="Atlantis", state="Sea")
+        placed = make_listing(host, city="Lagos", state="Lagos", latitude=1.0, longitude=1.0)
+
+        out = StringIO()
+        call_command("geocode_listings", "--batch-size", "2", stdout=out)
+
+        gazetteer = geo.load_gazetteer()
+        for listing, key in [(lagos, ("lagos", "lagos")), (jos, ("jos", "plateau"))]:
+            listing.refresh_from_db()
+            self.assertEqual((listing.latitude, listing.longitude), gazetteer[key])
+        unknown.refresh_from_db()
+        placed.refresh_from_db()
+        self.assertIsNone(unknown.latitude)
+        self.assertEqual(placed.latitude, 1.0)
+        self.assertIn("Geocoded 2 listings; 1 had no gazetteer match", out.getvalue())
+
+    def test_geocoding_invalidates_cached_nearby_results(self):
+        cache.clear()
+        host = User.objects.create_user("geo-host", password="pass")
+        make_listing(host, city="Jos", state="Plateau")
+        client = APIClient()
+        params = {"lat": 9.9, "lng": 8.9, "radius_km": 50}
+        self.assertEqual(client.get("/api/listings/nearby/", params).json()["results"], [])
+        call_command("geocode_listings", stdout=StringIO())
+        response = client.get("/api/listings/nearby/", params)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("finance", password="pass", is_staff=True))
+        self.payments = []
+        for i, (day, status) in enumerate([(3, "Completed"), (10, "Pending"), (20, "Completed"), (40, "Failed")]):
+            payment = Payment.objects.create(booking_reference=f"BK{i}", amount=Decimal("10.50") * (i + 1),
+                                             status=status, chapa_tx_ref=f"export-{i}")
+            created_at = timezone.make_aware(timezone.datetime(2026, 1, 1)) + timedelta(days=day)
+            Payment.objects.filter(pk=payment.pk).update(created_at=created_at)
+            self.payments.append(payment)
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_with_date_range_and_status(self):
+        response, body = self.download("/api/exports/payments.csv?since=2026-01-02&until=2026-02-01&status=Completed")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="payments-2026-01-02-2026-02-01.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual([row["booking_reference"] for row in rows], ["BK0", "BK2"])
+        self.assertEqual(rows[1]["amount"], "31.50")
+
+    def test_gzipped_ndjson(self):
+        response, body = self.download("/api/exports/payments.ndjson.gz")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(body).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record["booking_reference"] for record in records], ["BK0", "BK1", "BK2", "BK3"])
+        self.assertEqual(records[3]["status"], "Failed")
+
+    async def test_streams_under_asgi(self):
+        request = AsyncRequestFactory().get("/api/exports/payments.csv")
+        force_authenticate(request, await User.objects.aget(username="finance"))
+        response = await sync_to_async(views.ExportView.as_view())(request, kind="payments", file_format="csv")
+        self.assertTrue(response.is_async)
+        body = b"".join([block async for block in response.streaming_content])
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual([row["booking_reference"] for row in rows], ["BK0", "BK1", "BK2", "BK3"])
+
+    def test_bookings_export_includes_listing_and_guest(self):
+        host = User.objects.create_user("host", password="pass")
+        listing = make_listing(host, title="Export Loft")
+        Booking.objects.create(property_id=listing, user_id=host, start_date=date(2026, 3, 1),
+                               end_date=date(2026, 3, 3), total_price=Decimal("200.00"))
+        _response, body = self.download("/api/exports/bookings.csv")
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual((rows[0]["listing_title"], rows[0]["username"]), ("Export Loft", "host"))
+
+    def test_rejects_bad_filters_and_non_staff(self):
+        self.assertEqual(self.client.get("/api/exports/bookings.csv?status=Completed").status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/payments.csv?since=2026-02-01&until=2026-01-01").status_code, 400)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("guest", password="pass"))
+        self.assertEqual(client.get("/api/exports/payments.csv").status_code, 403)
+
+    def test_large_export_is_split_into_blocks(self):
+        Payment.objects.bulk_create(
+            Payment(booking_reference=f"BULK{i}", amount=Decimal("1.00"), status="Completed") for i in range(3000)
+        )
+        _response, body = self.download("/api/exports/payments.csv")
+        self.assertEqual(body.count(b"\n"), 3005)
+        blocks = list(exports.export_blocks("payments", "csv"))
+        self.assertGreater(len(blocks), 2)
+        self.assertTrue(all(len(block) < exports.BLOCK_BYTES * 2 for block in blocks))
+
+    def test_command_writes_gzipped_file(self):
+        fd, path = tempfile.mkstemp(suffix=".csv.gz")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command("export_records", "payments", "--status", "Pending", "--gzip", "--output", path, stderr=StringIO())
+        with gzip.open(path, "rt") as handle:
+            rows = list(csv.DictReader(handle))
+        self.assertEqual([row["booking_reference"] for row in rows], ["BK1"])
+
+
+def image_upload(name="photo.png", size=(1000, 500), mode="RGBA"):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 80, 40, 255) if mode == "RGBA" else (200, 80, 40)).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, MEDIA_URL="/media/")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.host = User.objects.create_user("host", password="pass")
+
+    def test_upload_queues_variants_after_commit(self):
+        with mock.patch.object(generate_listing_image_variants, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                listing = make_listing(self.host, listing_image=image_upload())
+            delay.assert_called_once_with(str(listing.pk))
+            # assigning an already stored path (bulk imports, fixtures) is left to the backfill
+            with self.captureOnCommitCallbacks(execute=True):
+                make_listing(self.host)
+                listing.title = "Renamed"
+                listing.save()
+            delay.assert_called_once()
+
+    def test_task_renders_variants_and_api_serves_srcset(self):
+        with mock.patch.object(generate_listing_image_variants, "delay"):
+            listing = make_listing(self.host, listing_image=image_upload(size=(1000, 500)))
+        generate_listing_image_variants(str(listing.pk))
+
+        listing.refresh_from_db()
+        # 1280 would be an upscale of the 1000px original
+        self.assertEqual(sorted(listing.image_variants["webp"], key=int), ["320", "640"])
+        with default_storage.open(listing.image_variants["jpeg"]["640"]) as handle:
+            self.assertEqual(Image.open(handle).size, (640, 320))
+
+        client = APIClient()
+        data = client.get(f"/api/listings/{listing.pk}/", HTTP_HOST="localhost").json()
+        self.assertNotIn("image_variants", data)
+        webp = data["image_srcset"]["webp"]
+        self.assertTrue(webp["urls"]["320"].startswith("http://localhost/media/listing_images/variants/"))
+        self.assertEqual(webp["srcset"], f'{webp["urls"]["320"]} 320w, {webp["urls"]["640"]} 640w')
+
+    def test_variant_names_are_deterministic_and_reused(self):
+        name = default_storage.save("listing_images/tiny.png", image_upload(size=(200, 100)))
+        first = images.build_variants(name)
+        self.assertEqual(first["webp"], {"200": images.variant_name(name, 200, "webp")})
+        with mock.patch("listings.images.ContentFile") as content_file:
+            self.assertEqual(images.build_variants(name), first)
+        content_file.assert_not_called()
+
+    def test_backfill_command(self):
+        name = default_storage.save("listing_images/existing.png", image_upload(mode="RGB"))
+        listings = [make_listing(self.host, listing_image=name) for _ in range(3)]
+        make_listing(self.host, listing_image="listing_images/missing.png")
+
+        out, err = StringIO(), StringIO()
+        call_command("build_image_variants", "--workers", "1", "--batch-size", "2", stdout=out, stderr=err)
+
+        for listing in listings:
+            listing.refresh_from_db()
+            self.assertEqual(sorted(listing.image_variants), ["jpeg", "webp"])
+        self.assertIn("for 3 listings", out.getvalue())
+        self.assertIn("1 failed", out.getvalue())
+        self.assertIn("missing.png", err.getvalue())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client = APIClient()
+        make_listing(User.objects.create_user("host", password="pass"))
+
+    def test_server_timing_and_route_stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/listings/")
+        query_count = len(queries)
+        self.assertRegex(response["Server-Timing"], rf'^app;dur=[\d.]+, db;dur=[\d.]+;desc="{query_count} queries"$')
+
+        self.client.get("/api/listings/")
+        stats = metrics.routes_snapshot()[("listing-list", "GET")]
+        self.assertEqual(stats["count"], 2)
+        # the second response came from the listing cache
+        self.assertEqual(stats["queries"], query_count)
+        self.assertIsNotNone(stats["quantiles"]["0.99"])
+        self.client.get("/no-such-page/")
+        self.assertIn(("unmatched", "GET"), metrics.routes_snapshot())
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs("listings.performance", "WARNING") as logs:
+            self.client.get("/api/listings/")
+        self.assertIn("GET /api/listings/ (listing-list)", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+    def test_chapa_time_is_charged_to_the_request(self):
+        def view(request):
+            chapa.record_latency("verify", 0.25)
+            return HttpResponse()
+
+        response = metrics.PerformanceMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn("chapa;dur=250.0", response["Server-Timing"])
+        self.assertEqual(metrics.routes_snapshot()[("unmatched", "GET")]["chapa_seconds"], 0.25)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_prometheus_endpoint(self):
+        self.client.get("/api/listings/")
+        chapa.record_latency("verify", 0.07)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.assertEqual(self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="listing-list",method="GET"} 1', body)
+        self.assertIn('http_request_duration_recent_seconds{view="listing-list",method="GET",quantile="0.95"}', body)
+        self.assertRegex(body, r'chapa_request_duration_seconds_bucket\{endpoint="verify",le="0.1"\} [1-9]')
+
+        staff = APIClient()
+        staff.force_authenticate(User.objects.create_user("ops", password="pass", is_staff=True))
+        self.assertEqual(staff.get("/api/metrics/").status_code, 200)
+
+
+class ApiBenchmarkTests(SimpleTestCase):
+    RESULT = {"p50_ms": 10.0, "p95_ms": 40.0, "throughput_rps": 200.0, "queries_per_request": 3.0}
+
+    def test_summarize(self):
+        samples = [(float(ms), 200, 2) for ms in range(1, 101)] + [(500.0, 500, 4)]
+        result = bench_api.summarize(samples, elapsed=2.0)
+        self.assertEqual((result["requests"], result["errors"]), (101, 1))
+        self.assertEqual(result["throughput_rps"], 50.5)
+        self.assertEqual(result["p50_ms"], 51.0)
+        self.assertGreater(result["p99_ms"], result["p95_ms"])
+        self.assertEqual(result["queries_per_request"], 2.02)
+
+    def test_compare_flags_only_real_regressions(self):
+        baseline = {"listing_list": self.RESULT, "booking_create": self.RESULT}
+        results = {
+            # +30% p50 but only 3ms, and one extra query in ten requests: noise
+            "listing_list": dict(self.RESULT, p50_ms=13.0, queries_per_request=3.1),
+            "booking_create": dict(self.RESULT, p95_ms=60.0, throughput_rps=150.0, queries_per_request=4.0),
+            "new_scenario": self.RESULT,
+        }
+        regressions = bench_api.compare(baseline, results, max_regression=20, min_delta_ms=5)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(message.startswith("booking_create") for message in regressions))
+        self.assertIn("booking_create p95_ms: 40.0 -> 60.0 (+50.0%)", regressions)
+
+
+class ApiBenchmarkCommandTests(TransactionTestCase):
+    def setUp(self):
+        if shares_in_memory_sqlite():
+            self.skipTest("threads can't write concurrently to a shared in-memory SQLite database")
+
+    def test_records_baseline_then_detects_regression(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = os.path.join(directory.name, "baseline.json")
+        args = ["bench_api", "--listings", "20", "--bookings", "40", "--guests", "5", "--hosts", "2",
+                "--requests", "6", "--warmup", "2", "--repeat", "1", "--concurrency", "2",
+                "--chapa-latency", "0", "--baseline", baseline]
+
+        call_command(*args, stdout=StringIO(), stderr=StringIO())
+        with open(baseline) as handle:
+            recorded = json.load(handle)
+        self.assertEqual(set(recorded["scenarios"]), set(bench_api.Command.SCENARIOS))
+        self.assertFalse(Payment.objects.filter(booking_reference__startswith="bench-api-").exists())
+
+        # pretend the previous run needed far fewer queries
+        for result in recorded["scenarios"].values():
+            result["queries_per_request"] /= 10
+        with open(baseline, "w") as handle:
+            json.dump(recorded, handle)
+        with self.assertRaisesMessage(CommandError, "queries_per_request"):
+            call_command(*args, "--skip-seed", stdout=StringIO(), stderr=StringIO())
+
+
+class AsyncChapaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeChapaServer().start()
+        self.addCleanup(self.server.stop)
+
+    def client_for(self, **kwargs):
+        kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        return AsyncChapaClient(self.server.base_url, "test-key", timeout=5, backoff_base=0, **kwargs)
+
+    async def test_calls_overlap_on_pooled_connections(self):
+        self.server.latency = 0.2
+        client = self.client_for()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(client.verify(f"tx-{i}") for i in range(20)))
+        elapsed = time.perf_counter() - started
+        await client.session.aclose()
+        self.assertTrue(all(result["data"]["status"] == "success" for result in results))
+        # sequential calls would take 20 x 0.2s
+        self.assertLess(elapsed, 2.0)
+        self.assertLessEqual(self.server.connections, 20)
+
+    async def test_verify_retries_then_breaker_fails_fast(self):
+        self.server.fail_status = 503
+        client = self.client_for(max_retries=2)
+        with self.assertRaises(requests.HTTPError):
+            await client.verify("tx-1")
+        self.assertEqual(len(self.server.requests), 3)
+        with self.assertRaises(ChapaUnavailable):
+            await client.verify("tx-2")
+        await client.session.aclose()
+
+    async def test_cancelled_trial_frees_the_breaker(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        client = self.client_for(breaker=breaker, max_retries=0)
+        breaker.record_failure()
+        now[0] = 11
+        self.server.latency = 1
+        # the ASGI client disconnects while the half-open trial is in flight
+        call = asyncio.ensure_future(client.verify("tx-1"))
+        await asyncio.sleep(0.2)
+        call.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await call
+        self.assertTrue(breaker.allow())
+        await client.session.aclose()
+
+    async def test_connection_errors_surface_as_requests_exceptions(self):
+        client = AsyncChapaClient("http://127.0.0.1:1/v1", "test-key", timeout=1, max_retries=0)
+        with self.assertRaises(requests.ConnectionError):
+            await client.initialize({"tx_ref": "tx-1"})
+        await client.session.aclose()
+
+
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        self.server = FakeChapaServer().start()
+        self.addCleanup(self.server.stop)
+        settings_override = override_settings(CHAPA_BASE_URL=self.server.base_url, CHAPA_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        chapa.reset_client()
+        self.addCleanup(chapa.reset_client)
+        self.factory = AsyncRequestFactory()
+        self.body = {"booking_reference": "BK1", "amount": "150.00", "email": "guest@example.com"}
+
+    async def post(self, view, path, body, **kwargs):
+        request = self.factory.post(path, body, content_type="application/json", **kwargs)
+        response = await view.as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_initiate_then_verify(self):
+        code, data = await self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", self.body)
+        self.assertEqual(code, 200)
+        self.assertEqual(data["checkout_url"], f"https://checkout.chapa.test/{data['tx_ref']}")
+        payment = await Payment.objects.aget(pk=data["payment_id"])
+        self.assertEqual(payment.chapa_tx_id, f"CH-{data['tx_ref']}")
+
+        code, data = await self.post(views.AsyncVerifyChapaPayment, "/api/chapa/verify/", {"tx_ref": payment.chapa_tx_ref})
+        self.assertEqual(code, 200)
+        self.assertEqual(data["updated_payment"]["status"], Payment.STATUS_COMPLETED)
+
+    async def test_concurrent_initiates_wait_on_chapa_together(self):
+        self.server.latency = 0.3
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", dict(self.body, booking_reference=f"BK{i}"))
+            for i in range(10)
+        ))
+        self.assertEqual({code for code, _data in results}, {200})
+        self.assertLess(time.perf_counter() - started, 1.5)
+
+    async def test_gateway_error_marks_payment_failed(self):
+        self.server.fail_status = 502
+        code, data = await self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", self.body)
+        self.assertEqual(code, 500)
+        self.assertEqual(await Payment.objects.filter(status=Payment.STATUS_FAILED).acount(), 1)
+
+    async def test_initiate_checks_booking_total(self):
+        host = await User.objects.acreate(username="host")
+        listing = await sync_to_async(make_listing)(host)
+        booking = await Booking.objects.acreate(property_id=listing, user_id=host, start_date=date(2026, 3, 1),
+                                                end_date=date(2026, 3, 2), total_price=Decimal("100.00"))
+        body = dict(self.body, booking_reference=str(booking.pk))
+        code, _data = await self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", body)
+        self.assertEqual(code, 400)
+        code, data = await self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", dict(body, amount="100"))
+        self.assertEqual(code, 200)
+        self.assertEqual((await Payment.objects.aget(pk=data["payment_id"])).booking_id_id, booking.pk)
+
+    async def test_bad_requests(self):
+        code, _data = await self.post(views.AsyncInitiateChapaPayment, "/api/chapa/initiate/", {"amount": "1"})
+        self.assertEqual(code, 400)
+        request = self.factory.post("/api/chapa/verify/", "[1, 2", content_type="application/json")
+        response = await views.AsyncVerifyChapaPayment.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_callback_is_applied_once(self):
+        await Payment.objects.acreate(booking_reference="BK1", amount=Decimal("1.00"), chapa_tx_ref="BK1-x")
+        body = {"tx_ref": "BK1-x", "status": "success"}
+        code, data = await self.post(views.AsyncChapaCallback, "/api/chapa/callback/", body)
+        self.assertEqual((code, data["payment_status"]), (200, Payment.STATUS_COMPLETED))
+        code, data = await self.post(views.AsyncChapaCallback, "/api/chapa/callback/", body)
+        self.assertEqual(data["message"], "Duplicate webhook ignored")
+
+    async def test_performance_middleware_runs_async(self):
+        async def view(request):
+            chapa.record_latency("verify", 0.1)
+            # the ORM runs in a sync_to_async thread, on that thread's connection
+            await Payment.objects.filter(chapa_tx_ref="missing").afirst()
+            return HttpResponse()
+
+        middleware = metrics.PerformanceMiddleware(view)
+        response = await middleware(self.factory.get("/"))
+        self.assertIn("chapa;dur=100.0", response["Server-Timing"])
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+
+@skipUnless(connection.vendor == "sqlite", "replicates by copying the SQLite test database")
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Runs with a second SQLite file as replica1, which only catches up with
+    the primary when replicate() copies it over, so every write after that
+    is replication lag. The alias is only added once the test databases
+    exist, so the runner doesn't try to create it like a configured one.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.tempdir.name, "replica.sqlite3")
+        replica = copy.deepcopy(connections["default"].settings_dict)
+        replica.update(NAME=cls.replica_path, TEST={**replica["TEST"], "NAME": cls.replica_path, "MIRROR": None})
+        settings.DATABASES["replica1"] = replica
+        cls.databases = {*cls.databases, "replica1"}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica1"].close()
+        del connections["replica1"]
+        del settings.DATABASES["replica1"]
+        cls.tempdir.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listing = make_listing(self.host, title="Replicated")
+        self.replicate()
+
+    def replicate(self):
+        connections["replica1"].close()
+        connections["default"].ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connections["default"].connection.backup(replica)
+        replica.close()
+
+    def titles(self, client):
+        response = client.get("/api/listings/")
+        self.assertEqual(response.status_code, 200)
+        return {row["title"] for row in response.data["results"]}
+
+    def test_listing_reads_come_from_the_replica(self):
+        make_listing(self.host, title="Lagging")
+        # forget the write, as the replicas' lag window has passed without them catching up
+        cache.clear()
+        self.assertEqual(self.titles(APIClient()), {"Replicated"})
+        self.replicate()
+        cache.clear()
+        self.assertEqual(self.titles(APIClient()), {"Replicated", "Lagging"})
+
+    def test_cache_misses_right_after_a_write_read_the_primary(self):
+        make_listing(self.host, title="Lagging")
+        self.assertEqual(self.titles(APIClient()), {"Replicated", "Lagging"})
+
+    def test_writer_reads_its_own_writes(self):
+        writer = APIClient()
+        response = writer.post("/api/reviews/", {
+            "property_id": str(self.listing.pk), "user_id": self.host.pk, "rating": 4, "comment": "Nice",
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+        self.assertEqual(len(writer.get("/api/reviews/").data["results"]), 1)
+        self.assertEqual(APIClient().get("/api/reviews/").data["results"], [])
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.assertEqual(writer.get("/api/reviews/").data["results"], [])
+
+    def test_payments_and_writes_stay_on_the_primary(self):
+        with replicas.replica_reads():
+            self.assertEqual(Listing.objects.all().db, "replica1")
+            self.assertEqual(Payment.objects.all().db, "default")
+            self.assertEqual(OutboxEvent.objects.all().db, "default")
+            self.assertEqual(User.objects.all().db, "default")
+            self.assertEqual(router.db_for_write(Listing), "default")
+            self.assertEqual(router.db_for_write(Booking), "default")
+        self.assertEqual(Listing.objects.all().db, "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica1", "replica2", "replica3"])
+    def test_one_replica_per_block(self):
+        chosen = set()
+        for _ in range(30):
+            with replicas.replica_reads():
+                aliases = {Listing.objects.all().db, Review.objects.all().db, Booking.objects.all().db}
+                self.assertEqual(len(aliases), 1)
+                chosen |= aliases
+        self.assertGreater(len(chosen), 1)
+
+
+class JsonRenderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user("host", password="pass")
+        self.listings = [
+            make_listing(self.host, title="Imaged", latitude=6.5, longitude=3.4,
+                         image_variants={"webp": {"320": "listing_images/variants/a 320.webp"}}),
+            make_listing(self.host, title="Plain", price=Decimal("99.5"), bathrooms=Decimal("2")),
+        ]
+        Booking.objects.create(property_id=self.listings[0], user_id=self.host, start_date=date(2026, 3, 1),
+                               end_date=date(2026, 3, 3), total_price=Decimal("200.00"))
+        Review.objects.create(property_id=self.listings[0], user_id=self.host, rating=4, comment="ok")
+
+    def drf_default(self, serializer_class, instances, request):
+        context = {"request": request}
+        return drf_serializers.ListSerializer(instances, child=serializer_class(context=context), context=context).data
+
+    def test_fast_list_path_matches_drf(self):
+        request = Request(RequestFactory().get("/api/listings/"))
+        for serializer_class, model in ((ListingSerializer, Listing), (BookingSerializer, Booking),
+                                        (ReviewSerializer, Review)):
+            instances = list(model.objects.all())
+            fast = serializer_class(instances, many=True, context={"request": request}).data
+            self.assertEqual(json.loads(ORJSONRenderer().render(fast)),
+                             json.loads(JSONRenderer().render(self.drf_default(serializer_class, instances, request))))
+        self.assertEqual(fast[0]["rating"], 4)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {"price": Decimal("10.50"), "when": timezone.now(), "id": uuid.uuid4(), "items": [1, None, "é"]}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+        self.assertIn(b'\n  "a"', ORJSONRenderer().render({"a": 1}, renderer_context={"indent": 4}))
+        self.assertIn(b'\n  "a"', ORJSONRenderer().render({"a": 1}, "application/json; indent=2"))
+
+    def test_api_parses_and_renders_json(self):
+        response = self.client.get("/api/listings/")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["results"][0]["title"], "Plain")
+
+        response = self.client.post("/api/bookings/", b'{"start_date": ', content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.json()["detail"])
+
+    def test_sparse_fieldsets(self):
+        data = self.client.get("/api/listings/", {"fields": "title, price,city"}).json()
+        self.assertEqual(data["results"][0], {"title": "Plain", "price": "99.50", "city": "Lagos"})
+
+        data = self.client.get(f"/api/listings/{self.listings[0].pk}/", {"fields": "image_srcset"}).json()
+        self.assertEqual(list(data), ["image_srcset"])
+        self.assertEqual(data["image_srcset"]["webp"]["urls"]["320"],
+                         "http://testserver/media/listing_images/variants/a%20320.webp")
+        self.assertEqual(list(self.client.get("/api/reviews/", {"fields": "rating"}).json()["results"][0]), ["rating"])
+
+        response = self.client.get("/api/bookings/", {"fields": "total_price,nope"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"fields": ["unknown field(s): nope"]})
+
+        full = self.client.get("/api/listings/").json()["results"]
+        for blank in (",", " ", ""):
+            self.assertEqual(self.client.get("/api/listings/", {"fields": blank}).json()["results"], full)
+
+    def test_bench_command(self):
+        out = StringIO()
+        call_command("bench_serializers", "--listings", "20", "--repeat", "2", stdout=out)
+        self.assertIn("per 1000 listings", out.getvalue())
+        self.assertIn("faster than DRF's defaults", out.getvalue())
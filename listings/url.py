@@ -1,16 +1,34 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet, BookingViewSet, ReviewViewSet, InitiateChapaPayment, VerifyChapaPayment, ChapaCallback
+from .views import ListingViewSet, BookingViewSet, ReviewViewSet, InitiateChapaPayment, VerifyChapaPayment, ChapaCallback, ChapaPaymentStatus, ExportView, MetricsView
+from .views import AsyncInitiateChapaPayment, AsyncVerifyChapaPayment, AsyncChapaCallback, AsyncChapaPaymentStatus
 
 router = DefaultRouter()
 # example: register a viewset later
 # router.register(r'properties', views.PropertyViewSet)
 router.register(r'listings', ListingViewSet)
 router.register(r'bookings', BookingViewSet)
+router.register(r'reviews', ReviewViewSet)
+
+# under an ASGI server the gateway-bound payment views run as coroutines
+if settings.ASGI_PAYMENT_VIEWS:
+    initiate_view, verify_view, callback_view = AsyncInitiateChapaPayment, AsyncVerifyChapaPayment, AsyncChapaCallback
+    status_view = AsyncChapaPaymentStatus
+else:
+    initiate_view, verify_view, callback_view = InitiateChapaPayment, VerifyChapaPayment, ChapaCallback
+    status_view = ChapaPaymentStatus
 
 urlpatterns = [
     path('', include(router.urls)),
-    path("chapa/initiate/", InitiateChapaPayment.as_view(), name="chapa-initiate"),
-    path("chapa/verify/", VerifyChapaPayment.as_view(), name="chapa-verify"),
-    path("chapa/callback/", ChapaCallback.as_view(), name="chapa-callback"),
+    path("chapa/initiate/", initiate_view.as_view(), name="chapa-initiate"),
+    path("chapa/verify/", verify_view.as_view(), name="chapa-verify"),
+    path("chapa/callback/", callback_view.as_view(), name="chapa-callback"),
+    path("chapa/status/<path:tx_ref>/", status_view.as_view(), name="chapa-status"),
+    re_path(
+        r"^exports/(?P<kind>bookings|payments)\.(?P<file_format>csv|ndjson)(?P<gzip>\.gz)?$",
+        ExportView.as_view(),
+        name="export",
+    ),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
\ No newline at end of file
@@ -3,33 +3,312 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.reverse import reverse
+from rest_framework.utils.encoders import JSONEncoder
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import asyncio
+import hashlib
+import hmac
+import logging
+import json
+import time
 import uuid
 import requests
 
-from .models import Listing, Review, Booking, Payment
-from .serializers import ListingSerializer, ReviewSerializer, BookingSerializer, PaymentSerializer
+from . import chapa, exports, geo, metrics, occupancy, outbox, payment_links, search
+from . import cache as response_cache
+from .cache import CachedResponseMixin
+from .pagination import DistanceCursorPagination, LowestRatingCursorPagination, RatingCursorPagination, SearchRankCursorPagination
+from .replicas import ReplicaReadMixin
+
+from .models import Listing, Review, Booking, Payment, WebhookEvent
+from .serializers import ListingSerializer, ListingImportSerializer, ReviewSerializer, BookingSerializer, PaymentSerializer, AvailabilitySearchSerializer, NearbySearchSerializer, NearbyListingSerializer, ExportFilterSerializer
+from .serializers import CalendarRangeSerializer, CalendarBatchSerializer, ListingQuerySerializer, PaymentStatusQuerySerializer
+from .tasks import initialize_chapa_payment, verify_chapa_payment
+
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
 
 
-class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.all()
+class BulkWriteMixin:
+    """
+    POST <prefix>/bulk/ with a JSON list creates every row; PATCH with a list
+    of partial objects (each carrying its pk) updates them. The batch is
+    validated in one pass and written in a single transaction, so either
+    every row lands or the per-item errors come back and nothing is written.
+    """
+
+    bulk_serializer_class = None
+    # cache scope the written rows belong to (see listings.cache)
+    bulk_cache_scope = None
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        serializer_class = self.bulk_serializer_class or self.get_serializer_class()
+        kwargs["context"] = self.get_serializer_context()
+        return serializer_class(*args, many=True, max_length=settings.BULK_MAX_BATCH_SIZE, **kwargs)
+
+    @action(detail=False, methods=["post", "patch"], url_path="bulk")
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            return Response({"detail": "expected a JSON list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == "POST":
+            serializer = self.get_bulk_serializer(data=request.data)
+        else:
+            model = self.get_queryset().model
+            pk_field = model._meta.pk
+            ids = set()
+            for item in request.data:
+                try:
+                    ids.add(pk_field.to_python(item.get(pk_field.name)))
+                except (AttributeError, DjangoValidationError, TypeError, ValueError):
+                    continue
+            ids.discard(None)
+            instances = {str(pk): obj for pk, obj in self.get_queryset().in_bulk(ids).items()}
+            serializer = self.get_bulk_serializer(instances, data=request.data, partial=True)
+
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                objs = serializer.save()
+                if self.bulk_cache_scope:
+                    # bulk writes skip model signals, so invalidate by hand
+                    response_cache.invalidate_on_commit(self.bulk_cache_scope)
+        except ValidationError as e:
+            # checks that need the write lock (e.g. booking overlaps) run during save
+            return Response({"errors": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"count": len(objs), "ids": [obj.pk for obj in objs]},
+            status=status.HTTP_201_CREATED if request.method == "POST" else status.HTTP_200_OK,
+        )
+
+
+class ListingViewSet(ReplicaReadMixin, BulkWriteMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    # the tsvector is only read inside search queries, never serialized
+    queryset = Listing.objects.defer("search_vector")
     serializer_class = ListingSerializer
+    bulk_serializer_class = ListingImportSerializer
+    bulk_cache_scope = "listings"
+    cached_actions = ("list", "retrieve", "available", "search", "nearby", "calendar", "calendar_batch")
+    # availability also changes whenever a booking is written
+    cache_scopes = {
+        "available": ("listings", "bookings"),
+        "calendar": ("listings", "bookings"),
+        "calendar_batch": ("listings", "bookings"),
+    }
+
+    # query param -> ORM lookup for the availability search filters
+    AVAILABILITY_FILTERS = {
+        "city": "city",
+        "state": "state",
+        "property_type": "property_type",
+        "min_price": "price__gte",
+        "max_price": "price__lte",
+        "min_bedrooms": "bedrooms__gte",
+    }
+
+    # ?ordering= -> keyset pagination over that order; newest first when absent
+    ORDERINGS = {
+        "-rating": RatingCursorPagination,
+        "rating": LowestRatingCursorPagination,
+    }
+
+    def query_params(self):
+        """The validated ?min_rating= and ?ordering= params; a bad value is a 400."""
+        if not hasattr(self, "_query_params"):
+            query = ListingQuerySerializer(data=self.request.query_params)
+            query.is_valid(raise_exception=True)
+            self._query_params = query.validated_data
+        return self._query_params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.action == "list" and getattr(self, "request", None) is not None:
+            ordering = self.query_params().get("ordering")
+            if ordering:
+                self._paginator = self.ORDERINGS[ordering]()
+        return super().paginator
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # filter on the denormalized average instead of aggregating reviews
+        min_rating = self.query_params().get("min_rating")
+        if min_rating is not None:
+            queryset = queryset.filter(rating_avg__gte=min_rating)
+        return queryset
+
+    @action(detail=False, methods=["get"], url_path="available")
+    def available(self, request):
+        """
+        List listings free for the whole [start_date, end_date) range.
+        e.g. /api/listings/available/?city=Lagos&start_date=2026-01-10&end_date=2026-01-14
+        """
+        return self.dispatch_cached(request, lambda: self.search_available(request))
+
+    @action(detail=False, methods=["get"], url_path="search", pagination_class=SearchRankCursorPagination)
+    def search(self, request):
+        """
+        Relevance-ranked full-text search over title, location and description.
+        Every word matches as a prefix, e.g. /api/listings/search/?q=lek beach
+        """
+        return self.dispatch_cached(request, lambda: self.search_text(request))
+
+    def search_text(self, request):
+        query = request.query_params.get("q", "")
+        if not search.parse_terms(query):
+            return Response({"q": ["Enter at least one search term."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = search.search_listings(self.get_queryset(), query)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False, methods=["get"], url_path="nearby",
+        pagination_class=DistanceCursorPagination, serializer_class=NearbyListingSerializer,
+    )
+    def nearby(self, request):
+        """
+        Listings within radius_km of a point, nearest first.
+        e.g. /api/listings/nearby/?lat=6.45&lng=3.39&radius_km=5
+        """
+        return self.dispatch_cached(request, lambda: self.search_nearby(request))
+
+    def search_nearby(self, request):
+        params = NearbySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        radius_km = data["radius_km"]
+        start_km = self.paginator.page_start(request)
+        if start_km is not None:
+            # only sort as much of the circle as this page can reach
+            needed = self.paginator.get_page_size(request) + 1
+            radius_km = geo.page_radius(self.get_queryset(), data["lat"], data["lng"], radius_km, start_km, needed)
+
+        queryset = geo.nearby(self.get_queryset(), data["lat"], data["lng"], radius_km)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=["get"], url_path="calendar")
+    def calendar(self, request, pk=None):
+        """
+        Booked nights of one listing, one character per night ("1" = booked).
+        e.g. /api/listings/<id>/calendar/?start_date=2026-05-01&end_date=2026-06-01
+        """
+        return self.dispatch_cached(request, lambda: self.listing_calendar(request))
+
+    @action(detail=False, methods=["get", "post"], url_path="calendar", url_name="calendar-batch")
+    def calendar_batch(self, request):
+        """
+        Booked nights of many listings over one range, from a single query.
+        GET ?listings=<id>&listings=<id>&start_date=...&end_date=..., or POST
+        the same fields as JSON when the id list is too long for a URL.
+        """
+        return self.dispatch_cached(request, lambda: self.batch_calendar(request))
+
+    def listing_calendar(self, request):
+        params = CalendarRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end = params.validated_data["start_date"], params.validated_data["end_date"]
+
+        listing = self.get_object()
+        nights = occupancy.calendar(self.get_queryset().filter(pk=listing.pk), start, end)
+        return Response({"listing": listing.pk, "start_date": start, "end_date": end, "nights": nights[listing.pk]})
+
+    def batch_calendar(self, request):
+        params = CalendarBatchSerializer(data=request.data if request.method == "POST" else request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        start, end = data["start_date"], data["end_date"]
+
+        # unknown ids are simply absent from the result
+        nights = occupancy.calendar(self.get_queryset().filter(pk__in=data["listings"]), start, end)
+        return Response({
+            "start_date": start,
+            "end_date": end,
+            "listings": {str(listing_id): value for listing_id, value in nights.items()},
+        })
+
+    def search_available(self, request):
+        params = AvailabilitySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        filters = {
+            lookup: data[param]
+            for param, lookup in self.AVAILABILITY_FILTERS.items()
+            if param in data
+        }
+        queryset = self.get_queryset().filter(**filters).available_between(data["start_date"], data["end_date"])
 
-class BookingViewSet(viewsets.ModelViewSet):
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class BookingViewSet(BulkWriteMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+    bulk_cache_scope = "bookings"
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
 
 
+def new_tx_ref(booking_ref):
+    # the status endpoint is keyed by tx_ref, so the suffix must be unguessable
+    return f"{booking_ref}-{uuid.uuid4().hex}"
+
+
+def status_url(payment, request):
+    if not payment.chapa_tx_ref:
+        return None
+    return reverse("chapa-status", args=[payment.chapa_tx_ref], request=request)
+
+
+def initialize_payload(request, data, tx_ref):
+    """The body for Chapa's initialize endpoint."""
+    return {
+        "amount": str(data.get("amount")),  # Chapa expects numeric, but some sdks accept string
+        "currency": "ETB",
+        "tx_ref": tx_ref,
+        "first_name": data.get("first_name", ""),
+        "last_name": data.get("last_name", ""),
+        "email": data.get("email"),
+        # optional
+        "callback_url": request.build_absolute_uri("/api/listings/chapa/callback/"),
+        "return_url": request.build_absolute_uri("/payment/success/"),
+        "description": f"Payment for booking {data.get('booking_reference')}"
+    }
+
+
 class InitiateChapaPayment(APIView):
     """
     Initiate a payment with Chapa and return the payment URL or data to client.
+
+    With CHAPA_ASYNC enabled the gateway call runs in a Celery task and this
+    returns 202 straight away; poll ChapaPaymentStatus for the checkout_url.
     """
 
     def post(self, request):
@@ -38,18 +317,23 @@ class InitiateChapaPayment(APIView):
         booking_ref = data.get("booking_reference")
         amount = data.get("amount")
         email = data.get("email")
-        first_name = data.get("first_name", "")
-        last_name = data.get("last_name", "")
 
         if not booking_ref or not amount or not email:
             return Response({"detail": "booking_reference, amount and email required"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # a reference naming a booking must pay exactly its total
+        booking = payment_links.booking_lookup(booking_ref).first()
+        error = payment_links.amount_error(amount, booking)
+        if error:
+            return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
+
         # create tx_ref: unique reference for merchant (use booking_ref + uuid)
-        tx_ref = f"{booking_ref}-{uuid.uuid4().hex[:8]}"
+        tx_ref = new_tx_ref(booking_ref)
 
         # create Payment record in our DB with status Pending
         payment = Payment.objects.create(
             booking_reference=booking_ref,
+            booking_id=booking,
             amount=amount,
             currency="ETB",
             status=Payment.STATUS_PENDING,
@@ -57,51 +341,25 @@ class InitiateChapaPayment(APIView):
         )
 
         # prepare payload for Chapa initialize endpoint
-        chapa_url = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/initialize"
-        payload = {
-            "amount": str(amount),  # Chapa expects numeric, but some sdks accept string
-            "currency": "ETB",
-            "tx_ref": tx_ref,
-            "first_name": first_name,
-            "last_name": last_name,
-            "email": email,
-            # optional
-            "callback_url": request.build_absolute_uri("/api/listings/chapa/callback/"),
-            "return_url": request.build_absolute_uri("/payment/success/"),
-            "description": f"Payment for booking {booking_ref}"
-        }
+        payload = initialize_payload(request, data, tx_ref)
 
-        headers = {
-            "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}",
-            "Content-Type": "application/json"
-        }
+        if settings.CHAPA_ASYNC:
+            transaction.on_commit(lambda: initialize_chapa_payment.delay(payment.id, payload))
+            return Response({
+                "payment_id": payment.id,
+                "tx_ref": tx_ref,
+                "status_url": status_url(payment, request),
+            }, status=status.HTTP_202_ACCEPTED)
 
         try:
-            resp = requests.post(chapa_url, json=payload, headers=headers, timeout=15)
-            resp.raise_for_status()
+            chapa_resp = chapa.initialize_payment(payment, payload)
         except requests.RequestException as e:
-            # update payment as failed and return error
-            payment.status = Payment.STATUS_FAILED
-            payment.metadata = {"error": str(e)}
-            payment.save()
             return Response({"detail": "error initialising payment", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        chapa_resp = resp.json()
-        # typical chapa initialize response contains data and checkout_url
-        data = chapa_resp.get("data", {})
-        checkout_url = data.get("checkout_url") or data.get("authorization_url") or data.get("payment_url")
-
-        # store chapa transaction id if present (many responses include 'id' or 'transaction_id')
-        chapa_tx_id = data.get("id") or data.get("transaction_id")
-        if chapa_tx_id:
-            payment.chapa_tx_id = chapa_tx_id
-        payment.metadata = chapa_resp
-        payment.save()
-
         return Response({
             "payment_id": payment.id,
             "tx_ref": tx_ref,
-            "checkout_url": checkout_url,
+            "checkout_url": chapa.checkout_url_from(chapa_resp),
             "chapa_response": chapa_resp
         }, status=status.HTTP_200_OK)
 
@@ -109,6 +367,8 @@ class InitiateChapaPayment(APIView):
 class VerifyChapaPayment(APIView):
     """
     Verify a Chapa transaction using tx_ref or transaction id.
+
+    With CHAPA_ASYNC enabled verification is queued and this returns 202.
     """
 
     def post(self, request):
@@ -116,112 +376,378 @@ class VerifyChapaPayment(APIView):
         tx_ref = request.data.get("tx_ref")
         chapa_tx_id = request.data.get("chapa_tx_id")
 
+        if not tx_ref and not chapa_tx_id:
+            return Response({"detail": "tx_ref or chapa_tx_id required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # find our Payment
         if tx_ref:
-            url = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/verify/{tx_ref}"
-            # Note: some Chapa docs use /transaction/verify?tx_ref= or path-based; check your docs.
-        elif chapa_tx_id:
-            url = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/verify/{chapa_tx_id}"
+            payment = Payment.objects.filter(chapa_tx_ref=tx_ref).first()
         else:
-            return Response({"detail": "tx_ref or chapa_tx_id required"}, status=status.HTTP_400_BAD_REQUEST)
+            payment = Payment.objects.filter(chapa_tx_id=chapa_tx_id).first()
+
+        if settings.CHAPA_ASYNC:
+            if payment is None:
+                return Response({"detail": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+            transaction.on_commit(lambda: verify_chapa_payment.delay(payment.id))
+            return Response({
+                "payment_id": payment.id,
+                "status_url": status_url(payment, request),
+            }, status=status.HTTP_202_ACCEPTED)
 
-        headers = {"Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}"}
         try:
-            resp = requests.get(url, headers=headers, timeout=15)
-            resp.raise_for_status()
+            chapa_resp = chapa.verify_transaction(tx_ref or chapa_tx_id)
         except requests.RequestException as e:
             return Response({"detail": "error verifying payment", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        chapa_resp = resp.json()
-        # typical success: chapa_resp['status'] or chapa_resp['data']['status'] etc.
-        # Normalize reading:
-        data = chapa_resp.get("data") or {}
-        payment_status = data.get("status") or chapa_resp.get("status") or None
-        tx_ref_resp = data.get("tx_ref") or data.get("reference") or None
-
-        # find our Payment
-        payment = None
-        if tx_ref:
-            try:
-                payment = Payment.objects.get(chapa_tx_ref=tx_ref)
-            except Payment.DoesNotExist:
-                payment = None
-        elif chapa_tx_id:
-            try:
-                payment = Payment.objects.get(chapa_tx_id=chapa_tx_id)
-            except Payment.DoesNotExist:
-                payment = None
-
-
         # update payment record based on status
         if payment:
-            if payment_status and payment_status.lower() == "success":
-                payment.status = Payment.STATUS_COMPLETED
-            else:
-                # some status values may be 'failed' or 'cancelled'
-                if payment_status and payment_status.lower() in ("failed","cancelled"):
-                    payment.status = Payment.STATUS_FAILED
-                else:
-                    # if uncertain, keep pending but record response
-                    payment.status = payment.status or Payment.STATUS_PENDING
-            payment.metadata = chapa_resp
-            payment.save()
+            chapa.apply_verify_response(payment, chapa_resp)
 
         return Response({"chapa_response": chapa_resp, "updated_payment": PaymentSerializer(payment).data if payment else None})
 
 
+PAYMENT_STATUS_FIELDS = ("id", "status", "chapa_tx_ref", "metadata", "updated_at")
+
+
+def payment_status_body(payment):
+    return {
+        "payment_id": payment["id"],
+        "status": payment["status"],
+        "tx_ref": payment["chapa_tx_ref"],
+        "checkout_url": chapa.checkout_url_from(payment["metadata"]),
+        "error": (payment["metadata"] or {}).get("error"),
+        "updated_at": payment["updated_at"],
+    }
+
+
+class ChapaPaymentStatus(APIView):
+    """
+    Lightweight payment status for clients polling after a 202, looked up
+    by the payment's tx_ref rather than its sequential id so the endpoint
+    can't be walked to read other payments.
+
+    Pass ?wait=<seconds> to long-poll: the request returns as soon as the
+    payment changes (or is already newer than ?updated_after=<iso timestamp>),
+    or with the current state once the wait runs out. A waiting request
+    holds a sync worker, so the wait here is capped at
+    CHAPA_STATUS_SYNC_MAX_WAIT; AsyncChapaPaymentStatus, served under ASGI,
+    waits on the event loop for up to CHAPA_STATUS_MAX_WAIT.
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def get(self, request, tx_ref):
+        payment = Payment.objects.filter(chapa_tx_ref=tx_ref).values(*PAYMENT_STATUS_FIELDS).first()
+        if payment is None:
+            return Response({"detail": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        query = PaymentStatusQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        wait = min(query.validated_data["wait"], settings.CHAPA_STATUS_SYNC_MAX_WAIT)
+        updated_after = query.validated_data.get("updated_after") or payment["updated_at"]
+
+        deadline = time.monotonic() + wait
+        while payment["updated_at"] <= updated_after and time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            metrics.record_wait(self.POLL_INTERVAL)
+            payment = Payment.objects.filter(chapa_tx_ref=tx_ref).values(*PAYMENT_STATUS_FIELDS).first()
+
+        return Response(payment_status_body(payment))
+
+
+def process_chapa_webhook(data):
+    """
+    Apply a Chapa webhook payload and return (response body, status code).
+    Deliveries are deduplicated through WebhookEvent and applied with a
+    single conditional UPDATE that only moves Pending payments, so replays
+    and concurrent deliveries can't overwrite each other. A status change
+    is recorded in the payment event outbox (see listings.outbox), whose
+    consumer queues the confirmation email of a completed payment.
+    """
+    # Common fields from Chapa webhooks
+    tx_ref = data.get("tx_ref") or data.get("reference")
+    status_from_webhook = (data.get("status") or "").lower()
+    chapa_tx_id = data.get("id") or data.get("transaction_id")
+
+    if not tx_ref:
+        return {"detail": "tx_ref required in webhook"}, status.HTTP_400_BAD_REQUEST
+
+    event_hash = hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()
+
+    with transaction.atomic():
+        # query 1: primary-key insert; a replayed delivery collides here
+        try:
+            with transaction.atomic():
+                WebhookEvent.objects.create(event_hash=event_hash, tx_ref=tx_ref)
+        except IntegrityError:
+            return {"message": "Duplicate webhook ignored"}, status.HTTP_200_OK
+
+        changes = {"metadata": data, "updated_at": timezone.now()}
+        if status_from_webhook == "success":
+            changes["status"] = Payment.STATUS_COMPLETED
+        elif status_from_webhook in ("failed", "cancelled"):
+            changes["status"] = Payment.STATUS_FAILED
+        if chapa_tx_id:
+            changes["chapa_tx_id"] = Coalesce(NullIf(F("chapa_tx_id"), Value("")), Value(str(chapa_tx_id)))
+
+        # query 2: only a Pending payment can transition, whoever gets there first wins
+        pending = Payment.objects.filter(chapa_tx_ref=tx_ref, status=Payment.STATUS_PENDING)
+        try:
+            with transaction.atomic():
+                updated = pending.update(**changes)
+        except IntegrityError:
+            # the Chapa id is already stored on another payment; apply the
+            # status anyway rather than fail and have Chapa redeliver forever
+            logger.warning("webhook for %s carries chapa_tx_id %s of another payment", tx_ref, chapa_tx_id)
+            del changes["chapa_tx_id"]
+            updated = pending.update(**changes)
+        if updated:
+            if "status" in changes:
+                # queries 3 and 4: the outbox event commits with the update; the
+                # relay hands it to Celery, so this request never waits on the broker
+                payment = Payment.objects.only(
+                    "booking_reference", "chapa_tx_ref", "amount", "status"
+                ).get(chapa_tx_ref=tx_ref)
+                outbox.record_status_change(payment, Payment.STATUS_PENDING, email=data.get("email"))
+            return {
+                "message": "Webhook received",
+                "payment_status": changes.get("status", Payment.STATUS_PENDING)
+            }, status.HTTP_200_OK
+
+        # the payment is unknown or already settled
+        current = Payment.objects.filter(chapa_tx_ref=tx_ref).values_list("status", flat=True).first()
+        if current is None:
+            # forget the event so a redelivery after the payment exists is processed
+            transaction.set_rollback(True)
+            return {"detail": "Payment not found"}, status.HTTP_404_NOT_FOUND
+
+    # Return 200 OK to acknowledge receipt of webhook
+    return {
+        "message": "Webhook received",
+        "payment_status": current
+    }, status.HTTP_200_OK
+
+
 class ChapaCallback(APIView):
     """
     Handle Chapa payment webhook callbacks.
     Chapa will POST to this endpoint when a payment status changes.
+    See process_chapa_webhook() for how deliveries are applied.
     """
 
     def post(self, request):
         # Chapa typically sends webhook data in request body
         # The exact structure depends on Chapa's webhook documentation
+        data = request.data.dict() if hasattr(request.data, "dict") else request.data
+        body, code = process_chapa_webhook(data)
+        return Response(body, status=code)
+
+
+class AsyncPaymentView(View):
+    """
+    Base for the async payment views used under ASGI (ASGI_PAYMENT_VIEWS).
+    DRF's APIView can't run coroutines, so these are plain Django views that
+    take JSON or form bodies and answer JSON. While one request waits on
+    Chapa, the event loop serves the others.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # same as APIView: token-less gateway callers can't send a CSRF token
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def parse(self, request):
+        if request.content_type == "application/json":
+            data = json.loads(request.body or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+            return data
+        return request.POST.dict()
+
+    def respond(self, body, code=status.HTTP_200_OK):
+        return JsonResponse(body, status=code, encoder=JSONEncoder)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method == "POST":
+            # handlers read request.data, as they would on a DRF request
+            try:
+                request.data = self.parse(request)
+            except ValueError as e:
+                return self.respond({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncInitiateChapaPayment(AsyncPaymentView):
+    """InitiateChapaPayment on the async gateway client and the async ORM."""
+
+    async def post(self, request):
         data = request.data
-        
-        # Common fields from Chapa webhooks
-        tx_ref = data.get("tx_ref") or data.get("reference")
-        status_from_webhook = data.get("status")
-        chapa_tx_id = data.get("id") or data.get("transaction_id")
-        
-        if not tx_ref:
-            return Response({"detail": "tx_ref required in webhook"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Find the payment record
+        booking_ref = data.get("booking_reference")
+        amount = data.get("amount")
+        email = data.get("email")
+
+        if not booking_ref or not amount or not email:
+            return self.respond({"detail": "booking_reference, amount and email required"}, status.HTTP_400_BAD_REQUEST)
+
+        booking = await payment_links.booking_lookup(booking_ref).afirst()
+        error = payment_links.amount_error(amount, booking)
+        if error:
+            return self.respond({"detail": error}, status.HTTP_400_BAD_REQUEST)
+
+        tx_ref = new_tx_ref(booking_ref)
+        payment = await Payment.objects.acreate(
+            booking_reference=booking_ref,
+            booking_id=booking,
+            amount=amount,
+            currency="ETB",
+            status=Payment.STATUS_PENDING,
+            chapa_tx_ref=tx_ref
+        )
+        payload = initialize_payload(request, data, tx_ref)
+
+        if settings.CHAPA_ASYNC:
+            # autocommit: the payment row is already visible to the worker
+            await sync_to_async(initialize_chapa_payment.delay)(payment.id, payload)
+            return self.respond({
+                "payment_id": payment.id,
+                "tx_ref": tx_ref,
+                "status_url": status_url(payment, request),
+            }, status.HTTP_202_ACCEPTED)
+
         try:
-            payment = Payment.objects.get(chapa_tx_ref=tx_ref)
-        except Payment.DoesNotExist:
-            return Response({"detail": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Update payment status based on webhook
-        if status_from_webhook:
-            if status_from_webhook.lower() == "success":
-                payment.status = Payment.STATUS_COMPLETED
-                
-                # Optional: Trigger email notification using Celery
-                # Uncomment if you want to send confirmation emails
-                # from .tasks import send_payment_confirmation_email
-                # send_payment_confirmation_email.delay(
-                #     to_email="customer@example.com",  # Get from booking/user data
-                #     booking_reference=payment.booking_reference,
-                #     amount=str(payment.amount)
-                # )
-                
-            elif status_from_webhook.lower() in ("failed", "cancelled"):
-                payment.status = Payment.STATUS_FAILED
-            else:
-                # Keep current status but log the webhook
-                pass
-        
-        # Store webhook data in metadata
-        payment.metadata = data
-        if chapa_tx_id and not payment.chapa_tx_id:
-            payment.chapa_tx_id = chapa_tx_id
-        payment.save()
-        
-        # Return 200 OK to acknowledge receipt of webhook
-        return Response({
-            "message": "Webhook received",
-            "payment_status": payment.status
-        }, status=status.HTTP_200_OK)
+            chapa_resp = await chapa.ainitialize_payment(payment, payload)
+        except requests.RequestException as e:
+            return self.respond({"detail": "error initialising payment", "error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return self.respond({
+            "payment_id": payment.id,
+            "tx_ref": tx_ref,
+            "checkout_url": chapa.checkout_url_from(chapa_resp),
+            "chapa_response": chapa_resp
+        })
+
+
+class AsyncVerifyChapaPayment(AsyncPaymentView):
+    """VerifyChapaPayment on the async gateway client and the async ORM."""
+
+    async def post(self, request):
+        tx_ref = request.data.get("tx_ref")
+        chapa_tx_id = request.data.get("chapa_tx_id")
+
+        if not tx_ref and not chapa_tx_id:
+            return self.respond({"detail": "tx_ref or chapa_tx_id required"}, status.HTTP_400_BAD_REQUEST)
+
+        if tx_ref:
+            payment = await Payment.objects.filter(chapa_tx_ref=tx_ref).afirst()
+        else:
+            payment = await Payment.objects.filter(chapa_tx_id=chapa_tx_id).afirst()
+
+        if settings.CHAPA_ASYNC:
+            if payment is None:
+                return self.respond({"detail": "Payment not found"}, status.HTTP_404_NOT_FOUND)
+            await sync_to_async(verify_chapa_payment.delay)(payment.id)
+            return self.respond({
+                "payment_id": payment.id,
+                "status_url": status_url(payment, request),
+            }, status.HTTP_202_ACCEPTED)
+
+        try:
+            chapa_resp = await chapa.averify_transaction(tx_ref or chapa_tx_id)
+        except requests.RequestException as e:
+            return self.respond({"detail": "error verifying payment", "error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if payment:
+            await chapa.aapply_verify_response(payment, chapa_resp)
+
+        return self.respond({"chapa_response": chapa_resp, "updated_payment": PaymentSerializer(payment).data if payment else None})
+
+
+class AsyncChapaPaymentStatus(AsyncPaymentView):
+    """ChapaPaymentStatus for ASGI: a long-poll sleeps on the event loop, not in a worker."""
+
+    POLL_INTERVAL = ChapaPaymentStatus.POLL_INTERVAL
+
+    async def get(self, request, tx_ref):
+        payments = Payment.objects.filter(chapa_tx_ref=tx_ref).values(*PAYMENT_STATUS_FIELDS)
+        payment = await payments.afirst()
+        if payment is None:
+            return self.respond({"detail": "Payment not found"}, status.HTTP_404_NOT_FOUND)
+
+        query = PaymentStatusQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return self.respond(query.errors, status.HTTP_400_BAD_REQUEST)
+        wait = min(query.validated_data["wait"], settings.CHAPA_STATUS_MAX_WAIT)
+        updated_after = query.validated_data.get("updated_after") or payment["updated_at"]
+
+        deadline = time.monotonic() + wait
+        while payment["updated_at"] <= updated_after and time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            metrics.record_wait(self.POLL_INTERVAL)
+            payment = await payments.afirst()
+
+        return self.respond(payment_status_body(payment))
+
+
+class AsyncChapaCallback(AsyncPaymentView):
+    """
+    ChapaCallback for ASGI. The webhook never calls Chapa; its short
+    transaction runs in the sync thread, as the async ORM has no transactions.
+    """
+
+    async def post(self, request):
+        body, code = await sync_to_async(process_chapa_webhook)(request.data)
+        return self.respond(body, code)
+
+
+class ExportView(APIView):
+    """
+    Stream bookings or payments for finance, oldest first.
+    e.g. /api/exports/payments.csv.gz?since=2026-01-01&until=2026-02-01&status=Completed
+
+    Rows are encoded straight off a server-side cursor (see listings.exports),
+    so memory stays flat and bytes start flowing before the query finishes.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind, file_format, gzip=None):
+        params = ExportFilterSerializer(data=request.query_params, context={"statuses": exports.EXPORTS[kind]["statuses"]})
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        compress = bool(gzip)
+
+        # an ASGI server needs an async iterator to stream (see listings.exports)
+        blocks = exports.aexport_blocks if isinstance(request._request, ASGIRequest) else exports.export_blocks
+        response = StreamingHttpResponse(
+            blocks(kind, file_format, gzip=compress, **filters),
+            content_type="application/gzip" if compress else exports.FORMATS[file_format],
+        )
+        filename = exports.export_filename(kind, file_format, gzip=compress, **filters)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        # proxies must not buffer or re-compress the stream
+        response["X-Accel-Buffering"] = "no"
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+class HasMetricsToken(BasePermission):
+    """Lets a scraper in with `Authorization: Bearer <METRICS_TOKEN>`."""
+
+    def has_permission(self, request, view):
+        expected = settings.METRICS_TOKEN
+        scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        return bool(expected) and scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), expected.encode())
+
+
+class MetricsView(APIView):
+    """Per-route request, Chapa gateway latency and outbox relay stats in Prometheus text format."""
+
+    permission_classes = [IsAdminUser | HasMetricsToken]
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(gateway=chapa.latency_snapshot(), outbox=outbox.stats()),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -0,0 +1,24 @@
+"""
+Retention for the Chapa webhook dedupe table.
+
+process_chapa_webhook() (listings.views) records every delivery in
+WebhookEvent so a replayed delivery is rejected by the primary key alone.
+Chapa only retries a delivery for a limited time, and a replay that
+arrives after its row is gone is still harmless, since the payment update
+only moves Pending payments. So prune(), run by the prune_webhook_events
+beat task, deletes rows older than WEBHOOK_EVENT_RETENTION_HOURS and the
+table stays the size of the recent delivery window.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+
+def prune():
+    """Delete webhook deliveries received more than WEBHOOK_EVENT_RETENTION_HOURS ago."""
+    cutoff = timezone.now() - timedelta(hours=settings.WEBHOOK_EVENT_RETENTION_HOURS)
+    deleted, _ = WebhookEvent.objects.filter(received_at__lt=cutoff).delete()
+    return deleted